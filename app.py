@@ -1,96 +1,42 @@
 # app.py
-# app.py
 import os
 import csv
-import smtplib
-import sqlite3
 import io
+import base64
+import json
+import binascii
+import tempfile
 
-# Force matplotlib to use a non-Tkinter backend
-import matplotlib
-matplotlib.use("Agg")  # prevents Tkinter errors in Flask
-
-import matplotlib.pyplot as plt
-from flask import Response
-import pandas as pd
-from email.message import EmailMessage
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-from werkzeug.utils import secure_filename
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, abort, Response, stream_with_context, session
 from dotenv import load_dotenv
 from pathlib import Path
-from flask_sqlalchemy import SQLAlchemy
+from werkzeug.utils import secure_filename
+from database import Database
+from charts import ChartCache
+from storage import LocalStorage, create_storage
+from upload_jobs import UploadJobs
+from deletions import DeletionQueue
+from mail_outbox import MailOutbox, SmtpSender
+from dedup import PHASH_DISTANCE, hamming
+import metrics
+from derivatives import Derivatives, DERIVED_DIRNAME
+from search import SearchIndex
+from roster import DEPARTMENTS, FACETS, CsvRosterSource, DbRosterSource, RosterIndex, RosterStore, facet_key
+from roster_io import import_roster
+from scores import ScoreAnalytics, ingest_scores
+from export import department_tasks, stream_zip
+from biographies import BiographyCache, upsert_biographies
+from response_cache import DatabasePageStore, MemoryPageStore, ResponseCache
+from migrations import DEFAULT_LOCK_PATH, run_startup
+from batch import ROSTER_FIELDS, fetch_uploads, in_chunks, normalize_adm_nos, parse_fields
+from static_snapshot import BUILD_ENVIRON_KEY, StaticSnapshot, digest, files_digest
+from direct_uploads import CLOUDINARY_DELIVERY_URL, CLOUDINARY_UPLOAD_URL, DirectUploadError, DirectUploads
 
 # =====================================================
 # Load environment variables
 # =====================================================
 load_dotenv()  # local .env; on Render, env vars are injected automatically
 
-# =====================================================
-# Core configuration
-# =====================================================
-SECRET_KEY = os.getenv("SECRET_KEY", "fallback_secret_key")
-MAX_CONTENT_MB = int(os.getenv("MAX_CONTENT_MB", "16"))
-
-# On Render, only /opt/render/project/src and /tmp are writable
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.getenv("DB_PATH", os.path.join(BASE_DIR, "students.db"))
-
-# Ensure DB directory exists (for local dev)
-Path(os.path.dirname(DB_PATH) or ".").mkdir(parents=True, exist_ok=True)
-
-# CSV roster (read-only)
-STUDENTS_CSV = os.getenv("STUDENTS_CSV", "students.csv")
-RESULTS_CSV = os.getenv("RESULTS_CSV", "results.csv")  # legacy migration only
-
-# Email (optional)
-EMAIL_FROM = os.getenv("EMAIL_FROM", "")
-EMAIL_PASS = os.getenv("EMAIL_PASS", "")
-EMAIL_TO = os.getenv("EMAIL_TO", "")
-
-# Cloudinary (REQUIRED for uploads)
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET"),
-    secure=True,
-)
-
-# =====================================================
-# Flask app setup
-# =====================================================
-app = Flask(__name__)
-app.config["SECRET_KEY"] = SECRET_KEY
-app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_MB * 1024 * 1024
-
-# Database config: prefer Postgres (Render), fallback to SQLite (local)
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv(
-    "DATABASE_URL",
-    f"sqlite:///{DB_PATH}"
-)
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db = SQLAlchemy(app)
-
-
-# ----------------------------
-# Define your models here
-# ----------------------------
-class Student(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    adm_no = db.Column(db.String(50), unique=True, nullable=False)
-    full_name = db.Column(db.String(100), nullable=False)
-    bio = db.Column(db.Text)
-    # add more fields as needed
-
-# ----------------------------
-# Routes
-# ----------------------------
-@app.route("/")
-def index():
-    return "Student Portfolio running!"
 # =====================================================
 # Configuration (use environment variables in production)
 # =====================================================
@@ -103,26 +49,118 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # Prefer environment variable (if you attach a Render Disk later),
 # otherwise default to a safe project-local path.
 DB_PATH = os.getenv("DB_PATH", os.path.join(BASE_DIR, "students.db"))
+# Postgres on Render, SQLite locally
+DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{DB_PATH}")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+# Rendered department charts, shared by all workers on this machine
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", os.path.join(tempfile.gettempdir(), "daisy_charts"))
+# Max results from the student search (page and JSON API)
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", "20"))
+# Uploads shown per page on gallery/results/letter ("load more" fetches the rest)
+UPLOADS_PAGE_SIZE = int(os.getenv("UPLOADS_PAGE_SIZE", "24"))
+# Most admission numbers one /api/students/batch or /api/biographies call takes
+BATCH_MAX_STUDENTS = int(os.getenv("BATCH_MAX_STUDENTS", "2000"))
+# Held while one process migrates and seeds; the other workers wait, then skip
+STARTUP_LOCK = os.getenv("STARTUP_LOCK", DEFAULT_LOCK_PATH)
 
 # Make sure the directory exists (only if not using /var/data without a disk)
 Path(os.path.dirname(DB_PATH) or ".").mkdir(parents=True, exist_ok=True)
 
-# CSV roster (unchanged – read-only)
+# Roster lives in the `roster` table ("db"); "csv" reads STUDENTS_CSV directly.
+# With "db", STUDENTS_CSV seeds an empty table and feeds /admin/import_roster.
+ROSTER_SOURCE = os.getenv("ROSTER_SOURCE", "db").lower()
 STUDENTS_CSV = os.getenv("STUDENTS_CSV", "students.csv")
+# Seconds between roster change checks (0 disables hot reload)
+ROSTER_CHECK_INTERVAL = float(os.getenv("ROSTER_CHECK_INTERVAL", "5"))
+# Seconds between checks for biographies edited in other workers
+BIO_CHECK_INTERVAL = float(os.getenv("BIO_CHECK_INTERVAL", "2"))
+# Required in X-Admin-Token for /admin/* endpoints; unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
 RESULTS_CSV = os.getenv("RESULTS_CSV", "results.csv")  # legacy, used only for one-time migration
 
 # Email (optional)
 EMAIL_FROM = os.getenv("EMAIL_FROM", "")
 EMAIL_PASS = os.getenv("EMAIL_PASS", "")
 EMAIL_TO = os.getenv("EMAIL_TO", "")
-
-# Cloudinary (REQUIRED for uploads)
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET"),
-    secure=True,
+# Contact-form mail goes out through the outbox (see mail_outbox.py); point
+# these at a local stand-in with SMTP_SSL=0 SMTP_AUTH=0 to test without Gmail
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_SSL = os.getenv("SMTP_SSL", "1") == "1"
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "0") == "1"
+SMTP_AUTH = os.getenv("SMTP_AUTH", "1") == "1"  # log in as EMAIL_FROM with EMAIL_PASS
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "8"))
+
+# "cloudinary" in production; "local" keeps files on disk (e.g. the Render
+# /data disk) and serves them from /files/; "memory" is a stand-in for tests
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "cloudinary")
+STORAGE_ROOT = os.getenv("STORAGE_ROOT", os.path.join(os.getenv("DATA_DIR", BASE_DIR), "uploads"))
+STORAGE_OPTIONS = {
+    "cloudinary": {
+        "cloud_name": os.getenv("CLOUDINARY_CLOUD_NAME"),
+        "api_key": os.getenv("CLOUDINARY_API_KEY"),
+        "api_secret": os.getenv("CLOUDINARY_API_SECRET"),
+    },
+    "local": {"root": STORAGE_ROOT, "base_url": "/files/"},
+}
+
+# Browsers upload straight to Cloudinary with parameters signed here, so file
+# bytes skip the workers (see direct_uploads.py); the URLs can point at the
+# local stand-in (`python direct_uploads.py serve`).  Seconds a signature lasts.
+DIRECT_UPLOADS = os.getenv("DIRECT_UPLOADS", "1" if STORAGE_BACKEND == "cloudinary" else "0") == "1"
+DIRECT_UPLOAD_URL = os.getenv(
+    "DIRECT_UPLOAD_URL", CLOUDINARY_UPLOAD_URL.format(cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME", ""))
 )
+DIRECT_UPLOAD_DELIVERY_URL = os.getenv(
+    "DIRECT_UPLOAD_DELIVERY_URL", CLOUDINARY_DELIVERY_URL.format(cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME", ""))
+)
+# Where storage posts upload notifications (default: this app's /direct_uploads/notify)
+DIRECT_UPLOAD_NOTIFY_URL = os.getenv("DIRECT_UPLOAD_NOTIFY_URL", "")
+DIRECT_UPLOAD_TTL = float(os.getenv("DIRECT_UPLOAD_TTL", "600"))
+
+# Resized WebP/AVIF roster photos (build ahead with `python derivatives.py build`);
+# on demand, a photo not built yet is queued for a background thread
+DERIVATIVES_ON_DEMAND = os.getenv("DERIVATIVES_ON_DEMAND", "1") == "1"
+
+# Background upload pipeline
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "daisy_upload_spool"))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+UPLOAD_RETRIES = int(os.getenv("UPLOAD_RETRIES", "3"))
+# For these upload kinds, also skip re-encoded copies of a photo the student
+# already has (perceptual hash within this many bits).  Not for result slips
+# or letters: two scans of the same form look alike to a dHash.  Exact byte
+# duplicates are always skipped
+UPLOAD_PHASH_KINDS = [kind.strip() for kind in os.getenv("UPLOAD_PHASH_KINDS", "gallery").split(",") if kind.strip()]
+UPLOAD_PHASH_DISTANCE = int(os.getenv("UPLOAD_PHASH_DISTANCE", str(PHASH_DISTANCE)))
+
+# Log requests slower than this (ms; 0 = off) and profile this share of
+# requests with cProfile so a slow one logs where its time went
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Bearer token /metrics scrapers must send; unset keeps the endpoint off
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Render processes for department report exports (ZIP of per-student packs)
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+
+# Deferred storage deletes: seconds between queue sweeps, destroys per call
+DELETE_INTERVAL = float(os.getenv("DELETE_INTERVAL", "30"))
+DELETE_BATCH_SIZE = int(os.getenv("DELETE_BATCH_SIZE", "100"))
+# Seconds between uploads-vs-storage reconciliations (0 disables); repair
+# queues orphaned assets and drops rows whose asset is gone
+STORAGE_RECONCILE_INTERVAL = float(os.getenv("STORAGE_RECONCILE_INTERVAL", "21600"))
+STORAGE_RECONCILE_REPAIR = os.getenv("STORAGE_RECONCILE_REPAIR", "0") == "1"
+
+# Rendered student/department pages: "memory" (per worker; each hit checks
+# the shared invalidation stamps), "database" (one shared copy) or "off";
+# entries, seconds
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "memory").lower()
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
+# Pre-rendered public pages (`python static_snapshot.py build --out ...`)
+# served from this directory when set; a missing page renders live
+STATIC_SNAPSHOT_DIR = os.getenv("STATIC_SNAPSHOT_DIR", "")
 
 # =====================================================
 # Flask app
@@ -131,114 +169,244 @@ app = Flask(__name__)
 app.secret_key = SECRET_KEY
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_MB * 1024 * 1024
 
-# In-memory cache of student roster
+database = Database(DATABASE_URL, pool_size=DB_POOL_SIZE)
+database.init_app(app)
+
+# Per-route latency, SQL/storage/chart timings and cache hit rates at /metrics
+metrics.init_app(app, slow_ms=SLOW_REQUEST_MS, profile_rate=PROFILE_SAMPLE_RATE, token=METRICS_TOKEN)
+
+# In-memory cache of student roster; replaced wholesale (never cleared and
+# refilled) whenever the roster store swaps in a new snapshot
 students_data = {}
+roster = RosterStore(
+    CsvRosterSource(STUDENTS_CSV) if ROSTER_SOURCE == "csv" else DbRosterSource(database),
+    check_interval=ROSTER_CHECK_INTERVAL,
+)
 
-# =====================================================
-# SQLite helpers
-# =====================================================
+# Department chart, re-rendered only when load_students() sees a new roster
+chart_cache = ChartCache(CHART_CACHE_DIR)
+
+# Name/parent/residence/school/career/bio search, rebuilt by load_students()
+search_index = SearchIndex()
+
+# Students by department/class/school/sex, swapped in with each roster snapshot
+roster_index = RosterIndex()
+
+# Biographies table, cached per worker and caught up from its version feed
+bios = BiographyCache(database, check_interval=BIO_CHECK_INTERVAL)
 
-def get_conn():
-    return sqlite3.connect(DB_PATH, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
-
-
-def init_db():
-    conn = get_conn()
-    c = conn.cursor()
-    # Biography table (adm_no unique)
-    c.execute(
-        """
-        CREATE TABLE IF NOT EXISTS biographies (
-            adm_no TEXT PRIMARY KEY,
-            biography TEXT
-        );
-        """
+# Class means/ranks/deltas over the scores table, recomputed once per ingest
+score_analytics = ScoreAnalytics(
+    database,
+    lambda: {adm_no: row.get('Class') or '' for adm_no, row in students_data.items()},
+    check_interval=ROSTER_CHECK_INTERVAL,
+)
+
+storage = metrics.instrument_storage(create_storage(STORAGE_BACKEND, **STORAGE_OPTIONS.get(STORAGE_BACKEND, {})))
+
+# Storage folder per upload kind, as the upload routes below use them
+UPLOAD_FOLDERS = {"gallery": "gallery/{adm_no}/", "result": "results/{adm_no}", "letter": "letters/{adm_no}/"}
+
+if DIRECT_UPLOADS and os.getenv("CLOUDINARY_API_KEY") and os.getenv("CLOUDINARY_API_SECRET"):
+    direct_uploads = DirectUploads(
+        os.getenv("CLOUDINARY_API_KEY"), os.getenv("CLOUDINARY_API_SECRET"), SECRET_KEY, UPLOAD_FOLDERS,
+        DIRECT_UPLOAD_URL, DIRECT_UPLOAD_DELIVERY_URL, ttl=DIRECT_UPLOAD_TTL,
     )
-    # Unified uploads table for gallery/results/letters
-    c.execute(
-        """
-        CREATE TABLE IF NOT EXISTS uploads (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            adm_no TEXT NOT NULL,
-            kind TEXT NOT NULL CHECK(kind IN ('gallery','result','letter')),
-            url TEXT NOT NULL,
-            public_id TEXT NOT NULL UNIQUE,
-            note TEXT,
-            filename TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        """
+else:
+    direct_uploads = None
+
+derivatives = Derivatives(os.path.join(BASE_DIR, "static"), on_demand=DERIVATIVES_ON_DEMAND)
+
+# Profile/gallery/results/letter pages by adm_no, department pages by slug
+if RESPONSE_CACHE == "database":
+    page_cache = ResponseCache(DatabasePageStore(database, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL))
+elif RESPONSE_CACHE == "memory":
+    page_cache = ResponseCache(
+        MemoryPageStore(max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, database=database)
     )
-    conn.commit()
-    conn.close()
+else:
+    page_cache = ResponseCache(None)
+
+static_snapshot = StaticSnapshot(STATIC_SNAPSHOT_DIR) if STATIC_SNAPSHOT_DIR else None
+
+
+@app.template_global()
+def responsive_photo(photo, alt="", sizes="100vw", **attrs):
+    """<picture> with resized WebP/AVIF variants of a roster photo path."""
+    return derivatives.picture(photo, url_for, alt=alt, sizes=sizes, **attrs)
 
 
+@app.after_request
+def cache_derived_static(resp):
+    # Derived file names embed a content hash, so their URLs never change meaning
+    if request.endpoint == 'static' and (request.view_args or {}).get('filename', '').startswith(DERIVED_DIRNAME + '/'):
+        resp.cache_control.no_cache = None
+        resp.cache_control.public = True
+        resp.cache_control.max_age = 31536000
+        resp.cache_control.immutable = True
+    return resp
+
+# =====================================================
+# Database helpers (pooled SQLite / Postgres, see database.py)
+# =====================================================
+
 def get_bio(adm_no: str):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("SELECT biography FROM biographies WHERE adm_no=?", (adm_no,))
-    row = c.fetchone()
-    conn.close()
-    return row[0] if row else None
+    return bios.get(adm_no)
+
+
+def get_all_bios():
+    return bios.all()
 
 
 def save_bio(adm_no: str, biography: str):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute(
-        """
-        INSERT INTO biographies (adm_no, biography)
-        VALUES (?, ?)
-        ON CONFLICT(adm_no) DO UPDATE SET biography=excluded.biography
-        """,
-        (adm_no, biography),
-    )
-    conn.commit()
-    conn.close()
-
-
-def add_upload(adm_no: str, kind: str, url: str, public_id: str, note: str = None, filename: str = None):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute(
-        """
-        INSERT OR IGNORE INTO uploads (adm_no, kind, url, public_id, note, filename)
-        VALUES (?, ?, ?, ?, ?, ?)
-        """,
-        (adm_no, kind, url, public_id, note, filename),
-    )
-    conn.commit()
-    conn.close()
+    bios.save(adm_no, biography)
+    page_cache.invalidate(adm_no)
+
+
+@bios.subscribe
+def install_bios(changed):
+    # Runs in every worker as it catches up, not just the one that took the
+    # edit, so it only drops local pages: the writer stamped the shared ones
+    for adm_no, bio in changed.items():
+        if adm_no in students_data:
+            search_index.update(adm_no, students_data[adm_no], bio)
+    page_cache.forget(changed)
+
+
+def add_upload(adm_no: str, kind: str, url: str, public_id: str, note: str = None, filename: str = None,
+               resource_type: str = None, content_hash: str = None, phash: str = None) -> bool:
+    """Record an upload; False if a live row already has this public_id.
+
+    Content-addressed backends give a re-upload of a deleted file its old
+    public_id, so a soft-deleted row is revived (and its queued destroy
+    dropped) in the same transaction instead of being left to the deletion
+    worker, which would remove the file just uploaded.
+    """
+    with database.transaction() as c:
+        changed = c.execute(
+            """
+            INSERT INTO uploads (adm_no, kind, url, public_id, note, filename, resource_type, content_hash, phash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(public_id) DO UPDATE SET
+                adm_no=excluded.adm_no, kind=excluded.kind, url=excluded.url, note=excluded.note,
+                filename=excluded.filename, resource_type=excluded.resource_type,
+                content_hash=excluded.content_hash, phash=excluded.phash,
+                created_at=CURRENT_TIMESTAMP, deleted_at=NULL
+            WHERE uploads.deleted_at IS NOT NULL
+            """,
+            (adm_no, kind, url, public_id, note, filename, resource_type, content_hash, phash),
+        ).rowcount
+        if changed:
+            c.execute("DELETE FROM storage_deletions WHERE public_id=?", (public_id,))
+    if changed:
+        page_cache.invalidate(adm_no)
+    return bool(changed)
+
+
+def find_duplicate_upload(adm_no: str, kind: str, content_hash: str = None, phash: str = None):
+    """public_id of a live upload of the same file (or, by phash, the same picture) for this student."""
+    if content_hash:
+        row = database.query_one(
+            "SELECT public_id FROM uploads WHERE adm_no=? AND kind=? AND content_hash=? AND deleted_at IS NULL",
+            (adm_no, kind, content_hash),
+        )
+        if row:
+            return row[0]
+    if phash:
+        rows = database.query(
+            "SELECT public_id, phash FROM uploads "
+            "WHERE adm_no=? AND kind=? AND phash IS NOT NULL AND deleted_at IS NULL",
+            (adm_no, kind),
+        )
+        for public_id, other in rows:
+            if hamming(phash, other) <= UPLOAD_PHASH_DISTANCE:
+                return public_id
+    return None
+
+
+def _upload_dict(r):
+    return {
+        "id": r[0],
+        "url": r[1],
+        "public_id": r[2],
+        "note": r[3] or "",
+        "filename": r[4] or "",
+        "created_at": r[5],
+    }
 
 
-def get_uploads(adm_no: str, kind: str):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute(
-        "SELECT id, url, public_id, note, filename, created_at FROM uploads WHERE adm_no=? AND kind=? ORDER BY created_at DESC",
-        (adm_no, kind),
+def encode_upload_cursor(upload: dict) -> str:
+    raw = f"{upload['created_at']}|{upload['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_upload_cursor(cursor: str):
+    """Return (created_at, id) from an opaque cursor; ValueError if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, _, upload_id = base64.urlsafe_b64decode(padded).decode().rpartition("|")
+        return created_at, int(upload_id)
+    except (binascii.Error, UnicodeDecodeError) as ex:
+        raise ValueError("Invalid cursor") from ex
+
+
+def get_uploads(adm_no: str, kind: str, limit: int = None, cursor: str = None):
+    """Uploads newest-first; with ``cursor`` resume strictly after that row."""
+    sql = (
+        "SELECT id, url, public_id, note, filename, created_at FROM uploads "
+        "WHERE adm_no=? AND kind=? AND deleted_at IS NULL"
     )
-    rows = c.fetchall()
-    conn.close()
-    return [
-        {
-            "id": r[0],
-            "url": r[1],
-            "public_id": r[2],
-            "note": r[3] or "",
-            "filename": r[4] or "",
-            "created_at": r[5],
-        }
-        for r in rows
-    ]
-
-
-def delete_upload(public_id: str):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("DELETE FROM uploads WHERE public_id=?", (public_id,))
-    conn.commit()
-    conn.close()
+    params = [adm_no, kind]
+    if cursor:
+        sql += " AND (created_at, id) < (?, ?)"
+        params.extend(decode_upload_cursor(cursor))
+    sql += " ORDER BY created_at DESC, id DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return [_upload_dict(r) for r in database.query(sql, params)]
+
+
+def get_uploads_page(adm_no: str, kind: str, cursor: str = None, limit: int = None):
+    """One keyset page: (uploads, next_cursor or None)."""
+    limit = limit or UPLOADS_PAGE_SIZE
+    rows = get_uploads(adm_no, kind, limit=limit + 1, cursor=cursor)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_upload_cursor(rows[-1])
+    return rows, None
+
+
+upload_jobs = UploadJobs(
+    database, storage, add_upload, UPLOAD_SPOOL_DIR,
+    max_workers=UPLOAD_WORKERS, retries=UPLOAD_RETRIES,
+    find_duplicate=find_duplicate_upload, phash_kinds=UPLOAD_PHASH_KINDS,
+)
+
+deletions = DeletionQueue(
+    database, storage, batch_size=DELETE_BATCH_SIZE, interval=DELETE_INTERVAL,
+    reconcile_interval=STORAGE_RECONCILE_INTERVAL, reconcile_repair=STORAGE_RECONCILE_REPAIR,
+)
+
+
+@deletions.subscribe
+def drop_repaired_pages(adm_nos):
+    # Also runs from the periodic reconcile thread: stamped for every
+    # worker, and the pre-rendered profiles go too
+    page_cache.invalidate_many(adm_nos)
+
+
+def mail_configured() -> bool:
+    """Whether contact mail can go out: sender, recipient and (unless SMTP_AUTH=0) the login password."""
+    return bool(EMAIL_FROM and EMAIL_TO and (EMAIL_PASS or not SMTP_AUTH))
+
+
+outbox = MailOutbox(
+    database,
+    SmtpSender(SMTP_HOST, SMTP_PORT, username=EMAIL_FROM, password=EMAIL_PASS if SMTP_AUTH else "",
+               use_ssl=SMTP_SSL, starttls=SMTP_STARTTLS),
+    max_attempts=MAIL_MAX_ATTEMPTS,
+)
 
 # =====================================================
 # One-time migration: results.csv -> uploads(kind='result')
@@ -248,16 +416,25 @@ def migrate_results_csv_to_db():
     if not os.path.exists(RESULTS_CSV):
         return
     try:
+        rows = []
         with open(RESULTS_CSV, newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
+            for row in csv.DictReader(f):
                 adm = (row.get('Admission Number') or '').strip().upper()
                 url = (row.get('url') or '').strip()
                 public_id = (row.get('public_id') or '').strip()
                 note = (row.get('note') or '').strip()
                 if adm and url and public_id:
-                    add_upload(adm, 'result', url, public_id, note=note, filename=os.path.basename(url))
-        # Optionally rename the CSV so we don't re-import on every boot
+                    rows.append((adm, 'result', url, public_id, note, os.path.basename(url)))
+        # One transaction, one executemany; rows already imported are skipped
+        with database.transaction() as c:
+            c.executemany(
+                "INSERT INTO uploads (adm_no, kind, url, public_id, note, filename) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(public_id) DO NOTHING",
+                rows,
+            )
+        if rows:
+            page_cache.clear()
+        # Rename the CSV so we don't re-import on every boot
         try:
             os.rename(RESULTS_CSV, RESULTS_CSV + ".imported")
         except Exception:
@@ -267,18 +444,73 @@ def migrate_results_csv_to_db():
         print("Migration warning:", ex)
 
 # =====================================================
-# CSV roster loader (read-only student data)
+# Roster loader (roster table, or students.csv with ROSTER_SOURCE=csv)
 # =====================================================
 
-def load_students():
-    students_data.clear()
-    if not os.path.exists(STUDENTS_CSV):
+def seed_roster():
+    """First boot on an empty roster table: import STUDENTS_CSV once."""
+    if ROSTER_SOURCE != "db" or not os.path.exists(STUDENTS_CSV):
         return
-    with open(STUDENTS_CSV, newline='', encoding='utf-8') as f:
-        for row in csv.DictReader(f):
-            adm = (row.get('Admission Number') or '').strip().upper()
-            if adm:
-                students_data[adm] = row
+    if database.query_one("SELECT 1 FROM roster LIMIT 1"):
+        return
+    report = import_roster(database, STUDENTS_CSV)
+    print(f"✅ Seeded roster table from {STUDENTS_CSV}: {report['inserted']} students, "
+          f"{len(report['skipped'])} skipped")
+
+
+def load_students():
+    """(Re)load the roster if its source changed; returns the reload diff or None."""
+    return roster.reload()
+
+
+def roster_change_scopes(old_students, new_students, diff):
+    """Page-cache scopes a roster reload reaches: the students it touched and
+    every department they were or now are in."""
+    touched = diff["added"] + diff["removed"] + diff["changed"]
+    sections = {
+        facet_key(rows[adm].get('Department'))
+        for rows in (old_students, new_students) for adm in touched if adm in rows
+    }
+    return touched + [f"department:{slug}" for slug, section in DEPARTMENTS.items() if facet_key(section) in sections]
+
+
+@roster.subscribe
+def install_roster(snapshot, diff):
+    global students_data, roster_index
+    old_students, old_counts = students_data, roster_index.counts('department')
+    students_data = snapshot.students
+    roster_index = snapshot.index
+    score_analytics.invalidate()  # classes may have changed
+    if diff["initial"]:
+        page_cache.clear()  # pages a previous deploy left in the shared store
+    elif diff["added"] or diff["removed"] or diff["changed"]:
+        # Only the pages the change reaches, so the static snapshot keeps the rest
+        page_cache.invalidate_many(roster_change_scopes(old_students, students_data, diff))
+        if static_snapshot is not None and roster_index.counts('department') != old_counts:
+            static_snapshot.invalidate([_page_path('students_chart', fmt=fmt) for fmt in ('png', 'svg')])
+    chart_cache.update(snapshot.version, list(roster_index.counts('department').items()), snapshot.mtime)
+    if diff["initial"]:
+        search_index.rebuild(students_data, get_all_bios())
+    else:
+        for adm in diff["removed"]:
+            search_index.remove(adm)
+        for adm in diff["added"] + diff["changed"]:
+            search_index.update(adm, students_data[adm], get_bio(adm))
+    app.logger.info(
+        "Roster %s loaded: %d students, +%d -%d ~%d",
+        snapshot.version, diff["total"], len(diff["added"]), len(diff["removed"]), len(diff["changed"]),
+    )
+
+
+if ROSTER_CHECK_INTERVAL > 0:
+    @app.before_request
+    def check_roster():
+        roster.maybe_reload()
+
+
+@app.before_request
+def check_bios():
+    bios.maybe_refresh()
 
 # =====================================================
 # Routes
@@ -289,33 +521,58 @@ def index():
     return render_template('index.html')
 
 
-@app.route('/search', methods=['POST'])
+@app.route('/search', methods=['GET', 'POST'])
 def search():
-    adm = (request.form.get('adm_no') or '').strip().upper()
-    if not adm:
+    # Department pages still post 'adm_no'; the home page search box sends 'q'
+    query = (request.values.get('q') or request.form.get('adm_no') or '').strip()
+    if not query:
         flash('Please enter an admission number', 'error')
         return redirect(url_for('index'))
-    return redirect(url_for('profile', adm_no=adm))
+    adm = query.upper()
+    if adm in students_data:
+        return redirect(url_for('profile', adm_no=adm))
+    matches = search_index.search(query, limit=SEARCH_LIMIT, prefix=False)
+    if request.method == 'POST' and len(matches) == 1:
+        return redirect(url_for('profile', adm_no=matches[0]['adm_no']))
+    return render_template('search_results.html', query=query, matches=matches)
+
+
+@app.route('/api/search')
+def api_search():
+    """Ranked JSON search; the last word matches as a prefix (typeahead).
+
+    ``department`` is a slug as in /department/<slug> (the display name works too).
+    """
+    query = (request.args.get('q') or '').strip()
+    limit = max(1, min(request.args.get('limit', SEARCH_LIMIT, type=int) or SEARCH_LIMIT, 50))
+    department = request.args.get('department') or None
+    results = search_index.search(query, limit=limit, department=DEPARTMENTS.get(department, department))
+    for r in results:
+        r['url'] = url_for('profile', adm_no=r['adm_no'])
+    return jsonify({"query": query, "results": results})
 
 
 @app.route('/profile/<adm_no>')
+@page_cache.cached(lambda adm_no: adm_no)
 def profile(adm_no):
     st = students_data.get(adm_no)
     if not st:
         flash('Student not found', 'error')
         return redirect(url_for('index'))
-    # Override CSV biography with SQLite biography if available
+    # The biographies table overrides the roster's starting text
     bio = get_bio(adm_no)
     if bio:
         st = dict(st)  # don't mutate cache row
         st['Small Biography'] = bio
     # Show latest result images below profile
-    result_images = get_uploads(adm_no, 'result')
-    return render_template('profile.html', student=st, results=[], result_images=result_images)
+    result_images, _ = get_uploads_page(adm_no, 'result')
+    return render_template('profile.html', student=st, results=[], result_images=result_images,
+                           score_summary=score_analytics.latest(adm_no))
 
 
 # --------- Gallery ----------
 @app.route('/gallery/<adm_no>', methods=['GET', 'POST'])
+@page_cache.cached(lambda adm_no: adm_no)
 def gallery(adm_no):
     student = students_data.get(adm_no)
     if not student:
@@ -325,38 +582,32 @@ def gallery(adm_no):
     if request.method == 'POST':
         photos = request.files.getlist('gallery_file')
         note = request.form.get('note', '')
-        count = 0
-        for photo in photos:
-            if photo and photo.filename:
-                upload = cloudinary.uploader.upload(photo, folder=f"gallery/{adm_no}/")
-                add_upload(
-                    adm_no,
-                    'gallery',
-                    upload.get('secure_url', ''),
-                    upload.get('public_id', ''),
-                    note=note,
-                    filename=secure_filename(photo.filename),
-                )
-                count += 1
-        if count:
-            flash(f"{count} photo(s) uploaded successfully.", 'success')
-        else:
+        files = [(photo, 'image') for photo in photos if photo and photo.filename]
+        if not files:
             flash('No files uploaded', 'error')
-        return redirect(url_for('gallery', adm_no=adm_no))
+            return redirect(url_for('gallery', adm_no=adm_no))
+        job_id = upload_jobs.submit(adm_no, 'gallery', files, folder=UPLOAD_FOLDERS['gallery'].format(adm_no=adm_no), note=note)
+        return upload_job_accepted(job_id, 'gallery', adm_no, f"{len(files)} photo(s) queued for upload.")
 
-    student_uploads = get_uploads(adm_no, 'gallery')
-    return render_template('gallery.html', uploads=student_uploads, student=student)
+    student_uploads, next_cursor = get_uploads_page(adm_no, 'gallery')
+    return render_template('gallery.html', uploads=student_uploads, student=student, next_cursor=next_cursor,
+                           job_id=request.args.get('job'))
 
 
 # --------- Results ----------
 @app.route('/results/<adm_no>')
+@page_cache.cached(lambda adm_no: adm_no)
 def results(adm_no):
     student = students_data.get(adm_no)
     if not student:
         flash('Student not found', 'error')
         return redirect(url_for('index'))
-    result_images = get_uploads(adm_no, 'result')
-    return render_template('results.html', student=student, results=[], result_images=result_images)
+    result_images, next_cursor = get_uploads_page(adm_no, 'result')
+    score_history = score_analytics.history(adm_no)
+    return render_template('results.html', student=student,
+                           results=score_history[0]['subjects'] if score_history else [],
+                           score_history=score_history, result_images=result_images,
+                           next_cursor=next_cursor, job_id=request.args.get('job'))
 
 
 @app.route('/upload_result_file/<adm_no>', methods=['POST'])
@@ -367,32 +618,23 @@ def upload_result_file(adm_no):
         flash('No files selected', 'error')
         return redirect(url_for('results', adm_no=adm_no))
 
-    count = 0
+    accepted = []
     for file in files:
         name = (file.filename or '').lower()
         if name.endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp', '.pdf')):
             # allow PDF result slips too
             resource_type = 'image' if not name.endswith('.pdf') else 'raw'
-            upload = cloudinary.uploader.upload(file, folder=f"results/{adm_no}", resource_type=resource_type)
-            add_upload(
-                adm_no,
-                'result',
-                upload.get('secure_url', ''),
-                upload.get('public_id', ''),
-                note=note,
-                filename=secure_filename(file.filename),
-            )
-            count += 1
-    if count:
-        flash('Files uploaded successfully', 'success')
-    else:
+            accepted.append((file, resource_type))
+    if not accepted:
         flash('No valid files uploaded', 'error')
-    return redirect(url_for('results', adm_no=adm_no))
+        return redirect(url_for('results', adm_no=adm_no))
+    job_id = upload_jobs.submit(adm_no, 'result', accepted, folder=UPLOAD_FOLDERS['result'].format(adm_no=adm_no), note=note)
+    return upload_job_accepted(job_id, 'results', adm_no, f"{len(accepted)} file(s) queued for upload.")
 
 
-# --------- Letters ----------
 # --------- Letters ----------
 @app.route('/letter/<adm_no>', methods=['GET', 'POST'])
+@page_cache.cached(lambda adm_no: adm_no)
 def letter(adm_no):
     student = students_data.get(adm_no)
     if not student:
@@ -402,56 +644,171 @@ def letter(adm_no):
     if request.method == 'POST':
         files = request.files.getlist('letter_file')
         note = request.form.get('note', '')
-        count = 0
-        for file in files:
-            name = (file.filename or '').lower()
-            if name.endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp')):
-                upload = cloudinary.uploader.upload(
-                    file,
-                    folder=f"letters/{adm_no}/",   # Store in "letters" folder per student
-                    resource_type='image'          # Ensure treated as image
-                )
-                add_upload(
-                    adm_no,
-                    'letter',
-                    upload.get('secure_url', ''),
-                    upload.get('public_id', ''),
-                    note=note,
-                    filename=secure_filename(file.filename),
-                )
-                count += 1
-        if count:
-            flash(f"{count} image letter(s) uploaded successfully.", 'success')
-        else:
+        accepted = [
+            (file, 'image')  # Ensure treated as image
+            for file in files
+            if (file.filename or '').lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp'))
+        ]
+        if not accepted:
             flash('No valid image files uploaded. Allowed: JPG, PNG, GIF, WEBP.', 'error')
-        return redirect(url_for('letter', adm_no=adm_no))
+            return redirect(url_for('letter', adm_no=adm_no))
+        # Store in "letters" folder per student
+        job_id = upload_jobs.submit(adm_no, 'letter', accepted, folder=UPLOAD_FOLDERS['letter'].format(adm_no=adm_no), note=note)
+        return upload_job_accepted(job_id, 'letter', adm_no, f"{len(accepted)} image letter(s) queued for upload.")
+
+    letters, next_cursor = get_uploads_page(adm_no, 'letter')
+    return render_template('letter.html', student=student, letters=letters, next_cursor=next_cursor,
+                           job_id=request.args.get('job'))
+
+
+# --------- Direct-to-storage uploads (signed here, bytes go to storage) ----------
+def upload_resource_type(kind: str, filename: str):
+    """'image' or 'raw' for a file the kind accepts, else None (same rules as the upload forms)."""
+    name = (filename or '').lower()
+    if kind == 'result' and name.endswith('.pdf'):
+        return 'raw'
+    if kind == 'gallery' or name.endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp')):
+        return 'image'
+    return None
+
+
+@app.template_global()
+def direct_upload_url(adm_no, kind):
+    """Signing endpoint for an upload form's script; '' keeps the form posting files here."""
+    return url_for('direct_upload_sign', adm_no=adm_no, kind=kind) if direct_uploads else ''
+
+
+@app.route('/direct_uploads/<adm_no>/<kind>', methods=['POST'])
+def direct_upload_sign(adm_no, kind):
+    if direct_uploads is None:
+        return jsonify({"error": "Direct uploads are not enabled"}), 404
+    if adm_no not in students_data:
+        return jsonify({"error": "Student not found"}), 404
+    if kind not in UPLOAD_FOLDERS:
+        return jsonify({"error": "Invalid kind"}), 400
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename') or '')
+    resource_type = upload_resource_type(kind, filename)
+    if resource_type is None:
+        return jsonify({"error": "File type not allowed"}), 400
+    signed = direct_uploads.sign(
+        adm_no, kind, resource_type, filename=filename, note=(data.get('note') or '').strip(),
+        notification_url=DIRECT_UPLOAD_NOTIFY_URL or url_for('direct_upload_notify', _external=True),
+    )
+    signed["complete_url"] = url_for('direct_upload_complete')
+    return jsonify(signed)
+
+
+def record_direct_upload(upload):
+    # complete and notify both report the same upload; the second is a no-op
+    return add_upload(upload.adm_no, upload.kind, upload.url, upload.public_id, note=upload.note,
+                      filename=upload.filename, resource_type=upload.resource_type)
+
+
+@app.route('/direct_uploads/complete', methods=['POST'])
+def direct_upload_complete():
+    if direct_uploads is None:
+        return jsonify({"success": False, "error": "Direct uploads are not enabled"}), 404
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = direct_uploads.verify_completion(data.get('token') or '', data)
+    except DirectUploadError as ex:
+        return jsonify({"success": False, "error": str(ex)}), 400
+    record_direct_upload(upload)
+    return jsonify({"success": True, "public_id": upload.public_id, "url": upload.url})
+
+
+@app.route('/direct_uploads/notify', methods=['POST'])
+def direct_upload_notify():
+    if direct_uploads is None:
+        abort(404)
+    try:
+        upload = direct_uploads.verify_notification(
+            request.get_data(), request.headers.get('X-Cld-Timestamp', ''), request.headers.get('X-Cld-Signature', '')
+        )
+    except DirectUploadError as ex:
+        return jsonify({"error": str(ex)}), 401
+    if upload is not None:
+        record_direct_upload(upload)
+    return '', 204
 
-    letters = get_uploads(adm_no, 'letter')
-    return render_template('letter.html', student=student, letters=letters)
 
+# --------- Background upload jobs ----------
+def upload_job_accepted(job_id, endpoint, adm_no, message):
+    """202 + job id for XHR clients; flash + redirect (page polls the job) for forms."""
+    status_url = url_for('upload_job_status', job_id=job_id)
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({"job_id": job_id, "status_url": status_url}), 202
+    flash(message, 'success')
+    return redirect(url_for(endpoint, adm_no=adm_no, job=job_id))
 
-# --------- Delete Cloudinary + DB ----------
+
+@app.route('/upload_jobs/<job_id>')
+def upload_job_status(job_id):
+    job = upload_jobs.status(job_id)
+    if not job:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+
+# --------- Load more (keyset pagination, JSON) ----------
+@app.route('/uploads/<adm_no>/<kind>')
+def uploads_page(adm_no, kind):
+    if kind not in ('gallery', 'result', 'letter'):
+        return jsonify({"error": "Invalid kind"}), 400
+    cursor = request.args.get('cursor') or None
+    limit = max(1, min(request.args.get('limit', UPLOADS_PAGE_SIZE, type=int) or UPLOADS_PAGE_SIZE, 100))
+    try:
+        items, next_cursor = get_uploads_page(adm_no.upper(), kind, cursor=cursor, limit=limit)
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+    for item in items:
+        item["created_at"] = str(item["created_at"])
+    return jsonify({"items": items, "next_cursor": next_cursor})
+
+
+# --------- Delete (soft-delete now, storage destroy queued) ----------
 @app.route('/delete_file', methods=['POST'])
 def delete_file():
     data = request.get_json(force=True)
-    adm_no = (data.get('adm_no') or '').strip().upper()
     public_id = data.get('public_id') or ''
     file_type = data.get('type') or ''  # 'gallery' | 'result' | 'letter'
 
     if not public_id or file_type not in ('gallery', 'result', 'letter'):
         return jsonify({"success": False, "error": "Missing or invalid data"}), 400
 
-    try:
-        # Delete from Cloudinary
-        if file_type == 'letter':
-            cloudinary.uploader.destroy(public_id, resource_type='raw')
-        else:
-            cloudinary.uploader.destroy(public_id)
-        # Delete from DB
-        delete_upload(public_id)
-        return jsonify({"success": True})
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+    adm_no = deletions.soft_delete(public_id, kind=file_type)
+    if not adm_no:
+        return jsonify({"success": False, "error": "File not found"}), 404
+    page_cache.invalidate(adm_no)
+    return jsonify({"success": True})
+
+
+# --------- Files kept by the local storage backend ----------
+@app.route('/files/<resource_type>/<path:public_id>')
+def stored_file(resource_type, public_id):
+    if not isinstance(storage, LocalStorage):
+        abort(404)
+    path = storage.blob_path(public_id, resource_type)
+    if path is None:
+        abort(404)
+    # Range requests, If-None-Match/If-Modified-Since and sendfile (via the
+    # server's wsgi.file_wrapper) all come from send_file.  The public_id
+    # embeds the content hash, so the URL can be cached forever.
+    resp = send_file(path, conditional=True, etag=os.path.basename(public_id), max_age=31536000,
+                     download_name=os.path.basename(public_id))
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    return resp
+
+
+@app.before_request
+def start_deletion_worker():
+    # Picks up destroys queued before a restart without waiting for a new delete
+    deletions.ensure_worker()
+    # ...and likewise mail queued before a restart
+    if mail_configured():
+        outbox.ensure_worker()
 
 
 # --------- Departments + Contact ----------
@@ -461,26 +818,16 @@ def departments():
 @app.route("/about")
 def about():
     return render_template("about.html")
-@app.route("/students_chart.png")
-def students_chart():
-    # Load student data
-    df = pd.read_csv("students.csv")  # or fetch from SQLite if you prefer
-
-    # Count per department
-    dept_counts = df["Department"].value_counts()
-
-    # Generate Pie Chart
-    fig, ax = plt.subplots(figsize=(6, 6))
-    ax.pie(dept_counts, labels=dept_counts.index, autopct='%1.1f%%', startangle=140)
-    ax.set_title("Sponsored Students per Department")
-
-    # Save to BytesIO
-    img = io.BytesIO()
-    plt.savefig(img, format="png", bbox_inches="tight")
-    img.seek(0)
-    plt.close(fig)
-
-    return Response(img.getvalue(), mimetype="image/png")
+@app.route("/students_chart.png", defaults={"fmt": "png"})
+@app.route("/students_chart.svg", defaults={"fmt": "svg"})
+def students_chart(fmt):
+    chart = chart_cache.get(fmt)
+    resp = app.response_class(chart.data, mimetype=chart.mimetype)
+    resp.set_etag(chart.etag)
+    resp.last_modified = chart.last_modified
+    resp.cache_control.public = True
+    resp.cache_control.no_cache = True  # always revalidate; a 304 is cheap
+    return resp.make_conditional(request)
 
 #@app.route("/contact", methods=["GET", "POST"])
 #def contact():
@@ -496,24 +843,168 @@ def students_chart():
 
 
 @app.route('/department/<dept_name>', methods=['GET', 'POST'])
+@page_cache.cached(lambda dept_name: f"department:{dept_name}")
 def department(dept_name):
-    dept_map = {
-        'germans': 'Germans',
-        'italians': 'Italians',
-        'education': 'Education for Generations',
-        'warmhearted': 'Warmhearted Group',
-        'assisted': 'Assisted Group',
-    }
-    section = dept_map.get(dept_name, 'Department')
-    filtered = {adm: st for adm, st in students_data.items() if (st.get('Department') or '').strip().lower() == section.lower()}
+    snapshot = roster.snapshot
+    students, index = snapshot.students, snapshot.index
+    section = DEPARTMENTS.get(dept_name, 'Department')
+    members = index.lookup('department', section)
+    filtered = {adm: students[adm] for adm in members}
     error = None
     if request.method == 'POST':
-        adm = (request.form.get('adm_no') or '').strip().upper()
+        query = (request.form.get('adm_no') or '').strip()
+        adm = query.upper()
         if adm in filtered:
             return redirect(url_for('profile', adm_no=adm))
+        # Not an admission number: search names, parents, residence... within the department
+        matches = search_index.search(query, limit=SEARCH_LIMIT, department=section, prefix=False)
+        if matches:
+            filtered = {m['adm_no']: students[m['adm_no']] for m in matches if m['adm_no'] in students}
         else:
             error = "Student not found!"
-    return render_template('department/department_search.html', dept=section, error=error, student=filtered)
+    return render_template('department/department_search.html', dept=section, error=error, student=filtered,
+                           class_counts=index.counts('class', within=members),
+                           sex_counts=index.counts('sex', within=members))
+
+
+@app.route('/api/students')
+def api_students():
+    """Roster filtered by ?department=&class=&school=&sex=, with facet counts."""
+    snapshot = roster.snapshot
+    students, index = snapshot.students, snapshot.index
+    criteria = {facet: request.args.get(facet) for facet in FACETS}
+    matched = index.filter(**criteria)
+    if matched is None:
+        matched = list(students)
+    offset = max(request.args.get('offset', 0, type=int) or 0, 0)
+    limit = max(1, min(request.args.get('limit', 100, type=int) or 100, 500))
+    page = matched[offset:offset + limit]
+    return jsonify({
+        "count": len(matched),
+        "offset": offset,
+        "students": [
+            {
+                "adm_no": adm,
+                "name": students[adm].get('Full Name') or '',
+                "department": students[adm].get('Department') or '',
+                "class": students[adm].get('Class') or '',
+                "school": students[adm].get('school') or '',
+                "sex": students[adm].get('Sex') or '',
+                "url": url_for('profile', adm_no=adm),
+            }
+            for adm in page if adm in students
+        ],
+        "facets": {facet: index.counts(facet, within=matched) for facet in FACETS},
+    })
+
+
+# --------- Batch JSON API (many students per round trip) ----------
+def batch_records(adm_nos, fields, uploads_limit):
+    """One dict per admission number ({"adm_no", "error"} if unknown); one uploads query per chunk."""
+    students = roster.snapshot.students
+    all_bios = get_all_bios()
+    for chunk in in_chunks(adm_nos):
+        uploads, more = fetch_uploads(database, [a for a in chunk if a in students], fields.kinds, limit=uploads_limit)
+        for adm_no in chunk:
+            student = students.get(adm_no)
+            if student is None:
+                yield {"adm_no": adm_no, "error": "Student not found"}
+                continue
+            record = {"adm_no": adm_no, "url": url_for('profile', adm_no=adm_no)}
+            for name in fields.roster:
+                record[name] = student.get(ROSTER_FIELDS[name]) or ''
+            if fields.biography:
+                record["biography"] = all_bios.get(adm_no) or student.get('Small Biography', '')
+            if fields.kinds:
+                mine = uploads.get(adm_no, {})
+                record["uploads"] = {}
+                for kind in fields.kinds:
+                    items = mine.get(kind, [])
+                    record["uploads"][kind] = {
+                        "items": [dict(item, created_at=str(item["created_at"])) for item in items],
+                        # Continue with /uploads/<adm_no>/<kind>?cursor=...
+                        "next_cursor": encode_upload_cursor(items[-1]) if (adm_no, kind) in more else None,
+                    }
+            yield record
+
+
+@app.route('/api/students/batch', methods=['GET', 'POST'])
+def api_students_batch():
+    """Roster fields, biographies and uploads for many students.
+
+    POST {"adm_nos": [...], "fields": "name,biography,uploads.gallery", "uploads_limit": 24}
+    or GET ?adm_no=A,B&fields=...; ?format=ndjson (or Accept: application/x-ndjson)
+    streams one student per line.
+    """
+    data = (request.get_json(silent=True) or {}) if request.method == 'POST' else {}
+    adm_nos = normalize_adm_nos(data.get('adm_nos') or request.args.getlist('adm_no'))
+    if not adm_nos:
+        return jsonify({"error": "No admission numbers given"}), 400
+    if len(adm_nos) > BATCH_MAX_STUDENTS:
+        return jsonify({"error": f"At most {BATCH_MAX_STUDENTS} students per request"}), 400
+    try:
+        fields = parse_fields(data.get('fields') or request.args.get('fields'))
+        uploads_limit = int(data.get('uploads_limit') or request.args.get('uploads_limit') or UPLOADS_PAGE_SIZE)
+    except (TypeError, ValueError) as ex:
+        return jsonify({"error": str(ex)}), 400
+    uploads_limit = max(1, min(uploads_limit, 500))
+    records = batch_records(adm_nos, fields, uploads_limit)
+
+    fmt = data.get('format') or request.args.get('format')
+    if fmt == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson':
+        return Response(stream_with_context(json.dumps(record) + "\n" for record in records),
+                        mimetype='application/x-ndjson')
+    students, missing = [], []
+    for record in records:
+        if "error" in record:
+            missing.append(record["adm_no"])
+        else:
+            students.append(record)
+    return jsonify({"count": len(students), "students": students, "missing": missing})
+
+
+@app.route('/api/biographies', methods=['POST'])
+def api_update_biographies():
+    """Bulk /update_bio: {"biographies": {adm_no: text, ...}} or a list of {adm_no, biography} (?dry_run=1).
+
+    Written in one transaction; texts identical to the current ones are left alone.
+    """
+    if not ADMIN_TOKEN or request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({"error": "Forbidden"}), 403
+    entries = (request.get_json(silent=True) or {}).get('biographies')
+    if isinstance(entries, dict):
+        entries = [{"adm_no": adm_no, "biography": bio} for adm_no, bio in entries.items()]
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"error": "Expected a non-empty 'biographies' object or list"}), 400
+    if len(entries) > BATCH_MAX_STUDENTS:
+        return jsonify({"error": f"At most {BATCH_MAX_STUDENTS} biographies per request"}), 400
+
+    students = roster.snapshot.students
+    updates, skipped = {}, []
+    for entry in entries:
+        entry = entry if isinstance(entry, dict) else {}
+        adm_no = str(entry.get('adm_no') or '').strip().upper()
+        biography = str(entry.get('biography') or '').strip()
+        if not adm_no or not biography:
+            skipped.append({"adm_no": adm_no, "reason": "Missing data"})
+        elif adm_no not in students:
+            skipped.append({"adm_no": adm_no, "reason": "Student not found"})
+        else:
+            updates[adm_no] = biography  # the last entry for a student wins
+    changed = {adm_no: bio for adm_no, bio in updates.items() if get_bio(adm_no) != bio}
+    dry_run = request.args.get('dry_run') == '1'
+    report = {
+        "updated": len(changed),
+        "unchanged": len(updates) - len(changed),
+        "skipped": skipped,
+        "dry_run": dry_run,
+    }
+    if changed and not dry_run:
+        upsert_biographies(database, changed.items())
+        bios.refresh()  # search index, as save_bio() does
+        page_cache.invalidate_many(changed)
+    report["version"] = bios.version
+    return jsonify(report)
 
 
 @app.route('/contact', methods=['GET', 'POST'])
@@ -522,23 +1013,121 @@ def contact():
     if request.method == 'POST':
         e = request.form.get('email') or ''
         m = request.form.get('message') or ''
-        try:
-            if not (EMAIL_FROM and EMAIL_PASS and EMAIL_TO):
-                raise RuntimeError('Email not configured')
-            mail = EmailMessage()
-            mail['Subject'] = "Message from Daisy Portal"
-            mail['From'] = EMAIL_FROM
-            mail['To'] = EMAIL_TO
-            mail.set_content(f"From: {e}\n\n{m}")
-            with smtplib.SMTP_SSL('smtp.gmail.com', 465) as smtp:
-                smtp.login(EMAIL_FROM, EMAIL_PASS)
-                smtp.send_message(mail)
+        if not mail_configured():
+            msg = ('error', "Failed: Email not configured")
+        else:
+            # Queued in the database; the outbox worker does the SMTP round trip
+            outbox.enqueue(EMAIL_FROM, EMAIL_TO, "Message from Daisy Portal", f"From: {e}\n\n{m}")
             msg = ('success', "Message sent successfully!")
-        except Exception as ex:
-            msg = ('error', f"Failed: {ex}")
     return render_template('contact.html', **({msg[0]: msg[1]} if msg else {}))
 
 
+# --------- Admin: roster reload ----------
+@app.route('/admin/reload_roster', methods=['POST'])
+def admin_reload_roster():
+    if not ADMIN_TOKEN or request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({"error": "Forbidden"}), 403
+    diff = roster.reload(force=request.args.get('force') == '1')
+    return jsonify(diff or {"version": roster.snapshot.version, "unchanged": True})
+
+
+@app.route('/admin/storage', methods=['GET', 'POST'])
+def admin_storage():
+    """GET: deletion queue status.  POST: reconcile uploads with storage (?repair=1)."""
+    if not ADMIN_TOKEN or request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({"error": "Forbidden"}), 403
+    if request.method == 'GET':
+        return jsonify(deletions.pending())
+    # Pages of students whose rows a repair drops go through drop_repaired_pages()
+    return jsonify(deletions.reconcile(repair=request.args.get('repair') == '1'))
+
+
+@app.route('/admin/outbox')
+def admin_outbox():
+    """Contact-form mail queue status."""
+    if not ADMIN_TOKEN or request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(outbox.pending())
+
+
+@app.route('/admin/import_scores', methods=['POST'])
+def admin_import_scores():
+    """Upsert an uploaded CSV/Excel score sheet (form field ``file``; ?dry_run=1)."""
+    if not ADMIN_TOKEN or request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({"error": "Forbidden"}), 403
+    sheet = request.files.get('file')
+    if not sheet or not sheet.filename:
+        return jsonify({"error": "No file uploaded"}), 400
+    try:
+        report = ingest_scores(database, sheet.stream, filename=sheet.filename,
+                               known_students=students_data.keys(), dry_run=request.args.get('dry_run') == '1')
+    except ValueError as ex:
+        return jsonify({"error": str(ex)}), 400
+    score_analytics.invalidate()
+    if not report["dry_run"]:
+        page_cache.clear()
+    return jsonify(report)
+
+
+def department_export_tasks(department: str):
+    """Report-pack tasks for every student in a department (slug or name); None if unknown."""
+    snapshot = roster.snapshot
+    adm_nos = snapshot.index.lookup('department', department)
+    if not adm_nos:
+        return None
+    uploads = {}
+    placeholders = ", ".join("?" for _ in adm_nos)
+    rows = database.query(
+        "SELECT adm_no, kind, url, public_id, note, filename, created_at FROM uploads "
+        f"WHERE kind IN ('result', 'letter') AND deleted_at IS NULL AND adm_no IN ({placeholders}) "
+        "ORDER BY created_at DESC, id DESC",
+        adm_nos,
+    )
+    for adm_no, kind, url, public_id, note, filename, created_at in rows:
+        uploads.setdefault(adm_no, {}).setdefault(kind, []).append({
+            "url": url, "public_id": public_id, "note": note or "", "filename": filename or "",
+            "created_at": str(created_at),
+        })
+    students = [snapshot.students[adm_no] for adm_no in adm_nos]
+    return list(department_tasks(students, get_all_bios(), uploads, score_analytics.history, derivatives.best_file))
+
+
+@app.route('/admin/export/<department>.zip')
+def admin_export_department(department):
+    """Streamed ZIP of sponsor report packs for one department."""
+    if not ADMIN_TOKEN or request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({"error": "Forbidden"}), 403
+    tasks = department_export_tasks(department)
+    if tasks is None:
+        return jsonify({"error": "Unknown department"}), 404
+    filename = secure_filename(f"{department}-reports.zip")
+    return Response(
+        stream_zip(tasks, jobs=EXPORT_WORKERS),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+
+
+@app.route('/admin/import_roster', methods=['POST'])
+def admin_import_roster():
+    """Upsert STUDENTS_CSV into the roster table (?prune=1, ?dry_run=1)."""
+    if not ADMIN_TOKEN or request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({"error": "Forbidden"}), 403
+    if ROSTER_SOURCE != "db":
+        return jsonify({"error": "ROSTER_SOURCE is not 'db'"}), 409
+    try:
+        report = import_roster(
+            database, STUDENTS_CSV,
+            prune=request.args.get('prune') == '1',
+            dry_run=request.args.get('dry_run') == '1',
+        )
+    except OSError as ex:
+        return jsonify({"error": str(ex)}), 400
+    if not report["dry_run"]:
+        report["reload"] = roster.reload()
+    return jsonify(report)
+
+
 # --------- Update Biography (AJAX) ----------
 @app.route('/update_bio', methods=['POST'])
 def update_bio():
@@ -550,22 +1139,107 @@ def update_bio():
         return 'Missing data', 400
 
     save_bio(adm_no, new_bio)
+    return '', 204
+
+# =====================================================
+# Static snapshot of the public read-only pages
+# =====================================================
+# Served from the snapshot when it has the page
+SNAPSHOT_ENDPOINTS = ('index', 'about', 'departments', 'department', 'profile', 'students_chart')
+
+
+def _page_path(endpoint: str, **values) -> str:
+    # URL path without a request context (writes also come from worker threads)
+    return app.url_map.bind('').build(endpoint, values)
+
+
+def snapshot_pages():
+    """URL path -> digest of everything that page is rendered from (see static_snapshot.py)."""
+    snapshot = roster.snapshot
+    students, index = snapshot.students, snapshot.index
+    shared = files_digest(os.path.join(BASE_DIR, 'templates'))
+
+    def photo(adm_no):
+        # The page's <picture> variants (built now if on demand, so they don't change under the digest)
+        return derivatives.lookup(students[adm_no].get('Photo') or '')
+
+    pages = {_page_path(endpoint): shared for endpoint in ('index', 'about', 'departments')}
+    chart = digest(sorted(index.counts('department').items()))
+    for fmt in ('png', 'svg'):
+        pages[_page_path('students_chart', fmt=fmt)] = chart
+    for slug, section in DEPARTMENTS.items():
+        members = index.lookup('department', section)
+        pages[_page_path('department', dept_name=slug)] = digest(
+            shared, [(students[adm], photo(adm)) for adm in members],
+        )
+    # Profiles show the newest result uploads
+    result_ids = {}
+    for adm_no, upload_id in database.query(
+        "SELECT adm_no, id FROM uploads WHERE kind='result' AND deleted_at IS NULL"
+    ):
+        result_ids.setdefault(adm_no, []).append(upload_id)
+    all_bios = get_all_bios()
+    for adm_no, row in students.items():
+        pages[_page_path('profile', adm_no=adm_no)] = digest(
+            shared, row, photo(adm_no), all_bios.get(adm_no), sorted(result_ids.get(adm_no, ())),
+            score_analytics.latest(adm_no),
+        )
+    return pages
+
+
+def drop_snapshot_pages(scope):
+    """A page-cache invalidation also retires the matching pre-rendered files."""
+    if scope is None:
+        static_snapshot.clear()
+    elif scope.startswith('department:'):
+        static_snapshot.invalidate([_page_path('department', dept_name=scope.split(':', 1)[1])])
+    else:
+        static_snapshot.invalidate([_page_path('profile', adm_no=scope)])
 
-    # Optional: immediately reflect in roster cache if present
-    if adm_no in students_data:
-        students_data[adm_no]['Small Biography'] = new_bio
 
-    return '', 204
+@app.before_request
+def serve_static_snapshot():
+    if (static_snapshot is None or request.method not in ('GET', 'HEAD') or request.args
+            or request.endpoint not in SNAPSHOT_ENDPOINTS or request.environ.get(BUILD_ENVIRON_KEY)
+            or '_flashes' in session):  # a flash message needs the live page
+        return None
+    path = static_snapshot.path_for(request.path)
+    if path is None:
+        return None
+    return send_file(path, conditional=True, max_age=0)
+
 
 # =====================================================
 # App startup
 # =====================================================
-init_db()
-load_students()
-migrate_results_csv_to_db()
+_started = False
+
+
+def create_app():
+    """Run the one-time startup work and return the app.
+
+    Schema migrations, seeding and legacy imports run under STARTUP_LOCK,
+    so of several workers booting together one does them and the rest find
+    nothing pending.  Under ``gunicorn --preload`` this all happens once in
+    the master; the pool is emptied afterwards so no connection is shared
+    across the fork.
+    """
+    global _started
+    if _started:
+        return app
+    run_startup(database, STARTUP_LOCK, tasks=(seed_roster, migrate_results_csv_to_db))
+    bios.load()
+    load_students()
+    if static_snapshot is not None:
+        # After the initial roster load, whose clear() is not a change
+        page_cache.subscribe(drop_snapshot_pages)
+    database.dispose()
+    _started = True
+    return app
+
+
+create_app()
 
-if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=int(os.getenv('PORT', '5000')), debug=True)
 # =====================================================
 # Entry point
 # =====================================================
@@ -0,0 +1,121 @@
+# batch.py
+"""Many students per request for the JSON API (/api/students/batch).
+
+A dashboard showing fifty students used to fetch fifty profile pages and
+fifty galleries.  The batch endpoint answers for all of them at once:
+roster fields and biographies come from the per-worker roster snapshot and
+biography cache (no query at all), and uploads for a whole chunk of
+students come from one ``adm_no IN (...)`` query, cut to the newest
+``limit`` per student and kind with a window function, so the query count
+grows with the number of chunks, not the number of students.
+
+    fields = parse_fields("name,class,biography,uploads.gallery")
+    for chunk in in_chunks(adm_nos):
+        uploads, more = fetch_uploads(database, chunk, fields.kinds, limit=24)
+"""
+from collections import namedtuple
+
+# API name -> roster column (the fields the profile page shows)
+ROSTER_FIELDS = {
+    "name": "Full Name",
+    "class": "Class",
+    "sex": "Sex",
+    "age": "Age",
+    "department": "Department",
+    "school": "school",
+    "career": "career",
+    "parent": "Parent/Guardian Name",
+    "contact": "Contact",
+    "residence": "Place of Residence",
+    "photo": "Photo",
+}
+UPLOAD_KINDS = ("gallery", "result", "letter")
+# Admission numbers per IN (...) list; well under SQLite's bound-parameter limit
+CHUNK_SIZE = 200
+
+Fields = namedtuple("Fields", "roster biography kinds")
+
+
+def parse_fields(spec=None) -> Fields:
+    """``"name,class,biography,uploads.gallery"`` (or a list) -> Fields; None/empty selects everything.
+
+    ``uploads`` alone means every kind.  ValueError names an unknown field.
+    """
+    if isinstance(spec, str):
+        spec = spec.split(",")
+    names = [name.strip() for name in spec or () if name and name.strip()]
+    if not names:
+        return Fields(tuple(ROSTER_FIELDS), True, UPLOAD_KINDS)
+    roster, biography, kinds = [], False, []
+    for name in names:
+        if name in ROSTER_FIELDS:
+            roster.append(name)
+        elif name == "biography":
+            biography = True
+        elif name == "uploads":
+            kinds.extend(UPLOAD_KINDS)
+        elif name.startswith("uploads.") and name[len("uploads."):] in UPLOAD_KINDS:
+            kinds.append(name[len("uploads."):])
+        else:
+            raise ValueError(f"Unknown field {name!r}")
+    return Fields(tuple(dict.fromkeys(roster)), biography, tuple(k for k in UPLOAD_KINDS if k in kinds))
+
+
+def normalize_adm_nos(values) -> list:
+    """Upper-cased, de-duplicated admission numbers in request order (comma lists allowed)."""
+    adm_nos = {}
+    for value in values or ():
+        for adm_no in str(value).split(","):
+            adm_no = adm_no.strip().upper()
+            if adm_no:
+                adm_nos[adm_no] = None
+    return list(adm_nos)
+
+
+def in_chunks(items, size: int = CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def fetch_uploads(database, adm_nos, kinds, limit: int = None):
+    """Live uploads for ``adm_nos``, newest first, in one query.
+
+    Returns ({adm_no: {kind: [row dicts]}}, {(adm_no, kind) with more rows
+    than ``limit``}).  Each row dict has id, url, public_id, note, filename
+    and created_at, as get_uploads() returns them.
+    """
+    grouped, truncated = {}, set()
+    if not adm_nos or not kinds:
+        return grouped, truncated
+    where = (
+        f"deleted_at IS NULL AND adm_no IN ({', '.join('?' for _ in adm_nos)}) "
+        f"AND kind IN ({', '.join('?' for _ in kinds)})"
+    )
+    columns = "adm_no, kind, id, url, public_id, note, filename, created_at"
+    params = list(adm_nos) + list(kinds)
+    if limit is None:
+        sql = f"SELECT {columns} FROM uploads WHERE {where}"
+    else:
+        # One row past the limit tells us the group has more
+        sql = (
+            f"SELECT {columns} FROM ("
+            f"SELECT {columns}, ROW_NUMBER() OVER "
+            "(PARTITION BY adm_no, kind ORDER BY created_at DESC, id DESC) AS n "
+            f"FROM uploads WHERE {where}) AS ranked WHERE n <= ?"
+        )
+        params.append(limit + 1)
+    sql += " ORDER BY adm_no, kind, created_at DESC, id DESC"
+    for adm_no, kind, upload_id, url, public_id, note, filename, created_at in database.query(sql, params):
+        rows = grouped.setdefault(adm_no, {}).setdefault(kind, [])
+        if limit is not None and len(rows) == limit:
+            truncated.add((adm_no, kind))
+            continue
+        rows.append({
+            "id": upload_id,
+            "url": url,
+            "public_id": public_id,
+            "note": note or "",
+            "filename": filename or "",
+            "created_at": created_at,
+        })
+    return grouped, truncated
@@ -0,0 +1,161 @@
+# benchmarks/micro.py
+"""Micro-benchmarks of the roster loader, upload queries and CSV migrations.
+
+Per roster size, a child process boots the app on synthetic data (see
+synthetic.py) and times, in milliseconds:
+
+  load_students_forced     roster.reload(force=True): full read + index rebuild
+  load_students_unchanged  load_students() when nothing changed (per request)
+  get_uploads              all of one student's uploads of a kind
+  get_uploads_page         one keyset page, as the gallery/results pages run it
+  import_roster_fresh      roster_io.import_roster() into an empty roster table
+  import_roster_noop       the same CSV again (nothing to write)
+  migrate_results_csv      migrate_results_csv_to_db() of a legacy results.csv
+  migrate_bio              migrate_bio.py's biographies copy
+
+    python benchmarks/micro.py                          # 1k, 10k and 100k students
+    python benchmarks/micro.py --sizes 1000 --repeat 3 --out micro.json
+    python benchmarks/micro.py --baseline micro.json --max-regression 1.25
+
+With --baseline the script exits non-zero when a median is more than
+--max-regression times slower than in the baseline report.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from stats import regressions, summarize
+from synthetic import ROOT, write_results_csv
+
+
+def timed(fn, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run_size(size: int, seed: int, repeat: int, calls: int) -> dict:
+    """Child process: every micro-benchmark for one roster size."""
+    from synthetic import boot_app
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app, rows, timings = boot_app(tmpdir, size, seed)
+        from database import Database
+        from roster_io import create_roster_tables, import_roster
+
+        import migrate_bio
+
+        rng = random.Random(seed)
+        adm_nos = [row["Admission Number"] for row in rows]
+        sample = [(rng.choice(adm_nos), rng.choice(("gallery", "result"))) for _ in range(calls)]
+        result = {"students": size, **timings}
+
+        result["load_students_forced"] = summarize(timed(lambda: app.roster.reload(force=True), repeat))
+        result["load_students_unchanged"] = summarize(timed(app.load_students, calls))
+
+        def per_call(fn):
+            samples = []
+            for adm_no, kind in sample:
+                start = time.perf_counter()
+                fn(adm_no, kind)
+                samples.append(time.perf_counter() - start)
+            return summarize(samples)
+
+        result["get_uploads"] = per_call(app.get_uploads)
+        result["get_uploads_page"] = per_call(app.get_uploads_page)
+
+        fresh = []
+        for i in range(repeat):
+            database = Database(f"sqlite:///{os.path.join(tmpdir, f'import{i}.db')}")
+            with database.transaction() as c:
+                create_roster_tables(c, database.id_column)
+            start = time.perf_counter()
+            import_roster(database, app.STUDENTS_CSV)
+            fresh.append(time.perf_counter() - start)
+        result["import_roster_fresh"] = summarize(fresh)
+        result["import_roster_noop"] = summarize(timed(lambda: import_roster(database, app.STUDENTS_CSV), repeat))
+
+        migrate = []
+        for i in range(repeat):
+            write_results_csv(app.RESULTS_CSV, adm_nos, size, seed=seed + i + 1)
+            start = time.perf_counter()
+            app.migrate_results_csv_to_db()
+            migrate.append(time.perf_counter() - start)
+        result["migrate_results_csv"] = summarize(migrate)
+
+        migrate_bio.STUDENTS_CSV = app.STUDENTS_CSV
+        migrate_bio.DB_PATH = os.path.join(tmpdir, "bio.db")
+        migrate_bio.init_db()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result["migrate_bio"] = summarize(timed(migrate_bio.migrate_csv_to_sqlite, repeat))
+        return result
+
+
+def bench_size(size: int, args) -> dict:
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", str(size), "--seed", str(args.seed),
+         "--repeat", str(args.repeat), "--calls", str(args.calls)],
+        cwd=ROOT, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated roster sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each bulk operation")
+    parser.add_argument("--calls", type=int, default=1000, help="calls of each per-request operation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=1.25)
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    if args.child is not None:
+        result = run_size(args.child, args.seed, args.repeat, args.calls)
+        print(json.dumps(result))
+        return 0
+
+    report = {
+        "benchmark": "micro",
+        "python": sys.version.split()[0],
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "calls": args.calls,
+        "sizes": {},
+    }
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        report["sizes"][str(size)] = bench_size(size, args)
+        print(f"  {size} students: load_students {report['sizes'][str(size)]['load_students_forced']['p50']:.1f} ms, "
+              f"import_roster {report['sizes'][str(size)]['import_roster_fresh']['p50']:.1f} ms", file=sys.stderr)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+
+    failures = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failures = regressions(report["sizes"], baseline.get("sizes", {}), {"p50": "lower"}, args.max_regression)
+    for failure in failures:
+        print("REGRESSION:", failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+# benchmarks/routes.py
+"""Load test of the portal's hot routes against synthetic rosters.
+
+For each roster size a child process boots the app on a fresh SQLite file
+with the in-memory storage backend, seeds a synthetic roster, uploads and
+scores (see synthetic.py), and serves it on a threaded local HTTP server.
+This process then drives each route with ``--concurrency`` keep-alive
+clients and reports throughput and latency percentiles, plus the mean SQL
+statements per request taken from the child's /metrics.
+
+    python benchmarks/routes.py                                  # 1k, 10k and 100k students
+    python benchmarks/routes.py --sizes 1000 --requests 500 --out routes.json
+    python benchmarks/routes.py --baseline routes.json --max-regression 1.25
+
+Client and server share no interpreter, but they do share the machine:
+compare runs from the same host.  With --baseline the script exits
+non-zero when a p99 or throughput figure is more than --max-regression
+times worse than in the baseline report.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from stats import regressions, summarize
+from synthetic import FIRST_NAMES, LAST_NAMES, METRICS_TOKEN, PLACES, ROOT, roster_rows
+
+ROUTES = (
+    "/profile/<adm_no>",
+    "/gallery/<adm_no>",
+    "/results/<adm_no>",
+    "/department/<dept_name>",
+    "/students_chart.png",
+    "/search",
+)
+
+
+def route_paths(route: str, rows, rng, count: int = 500) -> list:
+    """Concrete request paths for a route, sampled from the roster."""
+    from roster import DEPARTMENTS
+
+    if route == "/students_chart.png":
+        return [route]
+    if route == "/department/<dept_name>":
+        return [f"/department/{slug}" for slug in DEPARTMENTS]
+    if route == "/search":
+        words = FIRST_NAMES + LAST_NAMES + [f"{name} {place}" for name in LAST_NAMES[:5] for place in PLACES[:4]]
+        return ["/search?q=" + rng.choice(words).replace(" ", "+") for _ in range(count)]
+    prefix = route.split("<", 1)[0]
+    return [prefix + rng.choice(rows)["Admission Number"] for _ in range(count)]
+
+
+def drive(port: int, paths, requests: int, concurrency: int) -> dict:
+    """GET ``requests`` paths (cycling through ``paths``) from ``concurrency`` keep-alive clients."""
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies, statuses, errors = [], {}, []
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        mine = []
+        while True:
+            with lock:
+                i = next(counter)
+            if i >= requests:
+                break
+            start = time.perf_counter()
+            try:
+                conn.request("GET", paths[i % len(paths)])
+                resp = conn.getresponse()
+                resp.read()
+            except (OSError, http.client.HTTPException) as ex:
+                errors.append(repr(ex))
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+                continue
+            mine.append(time.perf_counter() - start)
+            with lock:
+                statuses[resp.status] = statuses.get(resp.status, 0) + 1
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "requests_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": summarize(latencies),
+        "status": {str(code): n for code, n in sorted(statuses.items())},
+        "errors": len(errors),
+    }
+
+
+def queries_per_request(port: int) -> dict:
+    """Mean SQL statements per request by route, from the child's /metrics."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    conn.request("GET", "/metrics", headers={"Authorization": f"Bearer {METRICS_TOKEN}"})
+    text = conn.getresponse().read().decode()
+    conn.close()
+    totals = {}
+    for line in text.splitlines():
+        for suffix in ("_sum", "_count"):
+            head = "http_request_db_queries" + suffix + '{route="'
+            if line.startswith(head):
+                route, _, value = line[len(head):].partition('"} ')
+                totals.setdefault(route, {})[suffix] = float(value)
+    return {route: t["_sum"] / t["_count"] for route, t in totals.items() if t.get("_count")}
+
+
+def serve(size: int, seed: int, uploads_per_student: float, terms: int):
+    """Child process: boot the app on synthetic data, print the port, serve until stdin closes."""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    from synthetic import boot_app
+
+    class Handler(WSGIRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like gunicorn behind a proxy
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app, _, timings = boot_app(tmpdir, size, seed, uploads_per_student, terms)
+        server = make_server("127.0.0.1", 0, app.app, threaded=True, request_handler=Handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        print(json.dumps({"port": server.server_port, **timings}), flush=True)
+        sys.stdin.read()
+        server.shutdown()
+
+
+def bench_size(size: int, args) -> dict:
+    child = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", str(size), "--seed", str(args.seed),
+         "--uploads-per-student", str(args.uploads_per_student), "--terms", str(args.terms)],
+        cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        for line in child.stdout:  # the app prints its own startup messages first
+            if line.startswith('{"port"'):
+                boot = json.loads(line)
+                break
+        else:
+            raise RuntimeError(f"server for {size} students exited with {child.wait()}")
+        port = boot.pop("port")
+        rng = random.Random(args.seed)
+        rows = roster_rows(size, args.seed)
+        result = {"students": size, **boot, "routes": {}}
+        for route in ROUTES:
+            paths = route_paths(route, rows, rng)
+            drive(port, paths, args.warmup, args.concurrency)
+            result["routes"][route] = drive(port, paths, args.requests, args.concurrency)
+            print(f"  {size} students {route}: {result['routes'][route]['requests_per_s']:.0f} req/s, "
+                  f"p99 {result['routes'][route]['latency_ms'].get('p99', 0):.1f} ms", file=sys.stderr)
+        for route, queries in queries_per_request(port).items():
+            if route in result["routes"]:
+                result["routes"][route]["db_queries_per_request"] = queries
+        return result
+    finally:
+        child.stdin.close()
+        child.wait(timeout=60)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated roster sizes")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per route")
+    parser.add_argument("--warmup", type=int, default=100, help="unmeasured requests per route first")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--uploads-per-student", type=float, default=4)
+    parser.add_argument("--terms", type=int, default=2, help="terms of synthetic scores per student")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=1.25)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    if args.serve is not None:
+        serve(args.serve, args.seed, args.uploads_per_student, args.terms)
+        return 0
+
+    report = {
+        "benchmark": "routes",
+        "python": sys.version.split()[0],
+        "seed": args.seed,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "sizes": {},
+    }
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        report["sizes"][str(size)] = bench_size(size, args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+
+    failures = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failures = regressions(report["sizes"], baseline.get("sizes", {}),
+                               {"p99": "lower", "requests_per_s": "higher"}, args.max_regression)
+    for failure in failures:
+        print("REGRESSION:", failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# benchmarks/startup.py
+"""Cold-start benchmark: wall time and RSS of ``import app`` in a fresh interpreter.
+
+Each run spawns a new Python process (like a gunicorn worker booting on
+Render), imports the app against a throwaway SQLite file and reports the
+import time, peak RSS and whether any of the heavy optional libraries
+(pandas, matplotlib, numpy) were pulled in at import.
+
+    python benchmarks/startup.py                      # 5 runs, print JSON
+    python benchmarks/startup.py --runs 10 --out startup.json
+    python benchmarks/startup.py --max-import-ms 800 --max-rss-mb 120 --forbid-heavy
+
+With --max-* thresholds the script exits non-zero when the median exceeds
+them, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("pandas", "matplotlib", "numpy")
+
+PROBE = r"""
+import json, resource, sys, time
+t0 = time.perf_counter()
+import app
+elapsed = time.perf_counter() - t0
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == "darwin":
+    rss //= 1024  # bytes on macOS, KiB on Linux
+heavy = sorted({m.split(".")[0] for m in sys.modules} & set(%r))
+print(json.dumps({"import_ms": elapsed * 1000, "rss_kb": rss, "heavy_modules": heavy}))
+""" % (HEAVY_MODULES,)
+
+
+def run_once(tmpdir: str) -> dict:
+    env = dict(os.environ)
+    env["DB_PATH"] = os.path.join(tmpdir, "bench.db")
+    env["CHART_CACHE_DIR"] = os.path.join(tmpdir, "charts")
+    env.pop("DATABASE_URL", None)
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=ROOT, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--out", help="write the JSON report to this file")
+    parser.add_argument("--max-import-ms", type=float)
+    parser.add_argument("--max-rss-mb", type=float)
+    parser.add_argument("--forbid-heavy", action="store_true",
+                        help="fail if pandas/matplotlib/numpy are imported by 'import app'")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        samples = [run_once(tmpdir) for _ in range(args.runs)]
+
+    import_ms = [s["import_ms"] for s in samples]
+    rss_mb = [s["rss_kb"] / 1024 for s in samples]
+    report = {
+        "benchmark": "startup",
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "import_ms": {"median": statistics.median(import_ms), "min": min(import_ms), "max": max(import_ms)},
+        "rss_mb": {"median": statistics.median(rss_mb), "min": min(rss_mb), "max": max(rss_mb)},
+        "heavy_modules": samples[-1]["heavy_modules"],
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+
+    failures = []
+    if args.max_import_ms is not None and report["import_ms"]["median"] > args.max_import_ms:
+        failures.append(f"import time {report['import_ms']['median']:.0f} ms > {args.max_import_ms:.0f} ms")
+    if args.max_rss_mb is not None and report["rss_mb"]["median"] > args.max_rss_mb:
+        failures.append(f"RSS {report['rss_mb']['median']:.1f} MB > {args.max_rss_mb:.1f} MB")
+    if args.forbid_heavy and report["heavy_modules"]:
+        failures.append("heavy modules imported at boot: " + ", ".join(report["heavy_modules"]))
+    for failure in failures:
+        print("REGRESSION:", failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+# benchmarks/stats.py
+"""Latency summaries and run-to-run comparison shared by the benchmark scripts."""
+import math
+import statistics
+
+
+def percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(seconds) -> dict:
+    """{count, mean, p50, p90, p99, max} in milliseconds."""
+    values = sorted(s * 1000 for s in seconds)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": statistics.fmean(values),
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": values[-1],
+    }
+
+
+def flatten(report, prefix=""):
+    """{"a.b.c": number} for every numeric leaf of a nested report."""
+    out = {}
+    if isinstance(report, dict):
+        for key, value in report.items():
+            out.update(flatten(value, f"{prefix}{key}."))
+    elif isinstance(report, (int, float)) and not isinstance(report, bool):
+        out[prefix[:-1]] = report
+    return out
+
+
+def regressions(report: dict, baseline: dict, keys, threshold: float) -> list:
+    """Messages for metrics that got worse than ``baseline`` by more than ``threshold`` (1.2 = 20%).
+
+    ``keys`` maps a leaf name (e.g. "p99") to the direction that is better:
+    "lower" for latencies, "higher" for throughput.
+    """
+    now, before = flatten(report), flatten(baseline)
+    failures = []
+    for path, value in sorted(now.items()):
+        leaf = path.rsplit(".", 1)[-1]
+        better = keys.get(leaf)
+        old = before.get(path)
+        if better is None or not old or not value:
+            continue
+        ratio = value / old if better == "lower" else old / value
+        if ratio > threshold:
+            failures.append(f"{path}: {old:.3f} -> {value:.3f} ({ratio:.2f}x worse)")
+    return failures
@@ -0,0 +1,226 @@
+# benchmarks/synthetic.py
+"""Synthetic portal data for the benchmarks: rosters, uploads, scores.
+
+Everything is generated from a seed, so two runs with the same arguments
+benchmark the same data.  Rosters use the ``students.csv`` schema and
+spread students over the real departments and classes; uploads and
+scores are row tuples ready for ``executemany``.
+
+    python benchmarks/synthetic.py roster 10000 -o students_10k.csv
+    python benchmarks/synthetic.py results 5000 --roster 10000 -o results.csv
+
+``boot_app()`` is what the route and micro-benchmarks run in their child
+process: it points the app at a temp directory (SQLite file, in-memory
+storage backend), imports it so the roster is seeded from the synthetic
+CSV, and fills ``uploads`` and ``scores``.
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The benchmark app serves /metrics to this token (see metrics.py)
+METRICS_TOKEN = "benchmark"
+
+ROSTER_HEADERS = [
+    "Admission Number", "Full Name", "Class", "Sex", "Age", "Small Biography", "Parent/Guardian Name",
+    "Contact", "Place of Residence", "Photo", "Department", "school", "career",
+]
+
+# Department -> (admission prefix, share of students, school)
+DEPARTMENTS = {
+    "Germans": ("GER", 0.3, "Daisy Centre - ECDE"),
+    "Italians": ("ITA", 0.25, "Daisy Centre - Primary"),
+    "Education for Generations": ("EDU", 0.2, "Daisy Centre - Junior School"),
+    "Warmhearted Group": ("WAR", 0.15, "Daisy Centre - Primary"),
+    "Assisted Group": ("ASS", 0.1, "Daisy Centre - Junior School"),
+}
+CLASSES = ["PP. 1", "PP. 2"] + [f"Grade {n}" for n in range(1, 10)]
+SUBJECTS = ["Maths", "English", "Kiswahili", "Science", "Social Studies"]
+FIRST_NAMES = [
+    "Gladwell", "Sammy", "Faith", "Brian", "Mercy", "Kevin", "Esther", "Dennis", "Joy", "Victor",
+    "Sharon", "Collins", "Purity", "Emmanuel", "Diana", "Felix", "Naomi", "Ian", "Winnie", "Allan",
+]
+LAST_NAMES = [
+    "Andati", "Masinde", "Wanjala", "Otieno", "Akinyi", "Barasa", "Chebet", "Kiptoo", "Mwangi", "Njeri",
+    "Odhiambo", "Wafula", "Mukhwana", "Achieng", "Kamau", "Nafula", "Shikuku", "Atieno", "Simiyu", "Wekesa",
+]
+PLACES = ["Kakamega", "Mumias", "Butere", "Lurambi", "Shinyalu", "Malava", "Navakholo", "Ikolomani"]
+CAREERS = ["Doctor", "Teacher", "Pilot", "Engineer", "Nurse", "Artist", "Footballer", "Lawyer", "Farmer"]
+BIO_PARTS = [
+    "is a bright student who enjoys drawing and playing with friends.",
+    "loves to read storybooks and is a good friend to everyone.",
+    "enjoys football and helps younger pupils during break time.",
+    "is curious about science and asks many questions in class.",
+    "sings in the school choir and likes mathematics.",
+]
+
+
+def roster_rows(size: int, seed: int = 0):
+    """``size`` roster dicts in the students.csv schema, deterministic for a seed."""
+    rng = random.Random(seed)
+    counters = {prefix: 0 for prefix, _, _ in DEPARTMENTS.values()}
+    names = list(DEPARTMENTS)
+    weights = [share for _, share, _ in DEPARTMENTS.values()]
+    rows = []
+    for _ in range(size):
+        department = rng.choices(names, weights)[0]
+        prefix, _, school = DEPARTMENTS[department]
+        counters[prefix] += 1
+        adm_no = f"{prefix}{counters[prefix]:05d}"
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        class_index = rng.randrange(len(CLASSES))
+        rows.append({
+            "Admission Number": adm_no,
+            "Full Name": f"{first} {last}",
+            "Class": CLASSES[class_index],
+            "Sex": rng.choice("FM"),
+            "Age": str(4 + class_index + rng.randint(0, 2)),
+            "Small Biography": f"{first} {rng.choice(BIO_PARTS)} {first} {rng.choice(BIO_PARTS)}",
+            "Parent/Guardian Name": f"{rng.choice(['Mr.', 'Mrs.', 'Ms.'])} {last}",
+            "Contact": "07xxxxxxxx",
+            "Place of Residence": f"{rng.choice(PLACES)}, Kenya",
+            "Photo": f"static/images/{prefix}/{adm_no}.jpg",
+            "Department": department,
+            "school": school,
+            "career": rng.choice(CAREERS),
+        })
+    return rows
+
+
+def write_roster_csv(path: str, size: int, seed: int = 0):
+    """Write a synthetic students.csv; returns the roster rows."""
+    rows = roster_rows(size, seed)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=ROSTER_HEADERS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+
+def upload_rows(adm_nos, per_student: float = 4, seed: int = 0, now: float = None):
+    """uploads rows (adm_no, kind, url, public_id, note, filename, resource_type, created_at).
+
+    Counts per student vary around ``per_student`` (some students have none,
+    a few have many), about two gallery photos per result slip, spread over
+    the past year.
+    """
+    rng = random.Random(seed)
+    now = now or time.time()
+    rows = []
+    for adm_no in adm_nos:
+        for _ in range(int(rng.expovariate(1 / per_student)) if per_student else 0):
+            kind = "gallery" if rng.random() < 0.65 else "result"
+            public_id = f"{kind}/{adm_no}/{uuid.UUID(int=rng.getrandbits(128)).hex}"
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(now - rng.uniform(0, 365 * 86400)))
+            rows.append((adm_no, kind, f"memory://{public_id}", public_id, "Term report" if kind == "result" else "",
+                         public_id.rsplit("/", 1)[1] + ".jpg", "image", created))
+    return rows
+
+
+def score_rows(adm_nos, terms: int = 2, seed: int = 0):
+    """scores rows (adm_no, term, subject, score) for ``terms`` terms of every subject."""
+    rng = random.Random(seed)
+    rows = []
+    for adm_no in adm_nos:
+        ability = rng.gauss(60, 12)
+        for term in range(1, terms + 1):
+            for subject in SUBJECTS:
+                score = min(100.0, max(0.0, round(rng.gauss(ability + term, 8), 1)))
+                rows.append((adm_no, f"2025 T{term}", subject, score))
+    return rows
+
+
+def write_results_csv(path: str, adm_nos, count: int, seed: int = 0):
+    """Legacy results.csv (Admission Number, url, public_id, note) with ``count`` rows."""
+    rng = random.Random(seed)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Admission Number", "url", "public_id", "note"])
+        for _ in range(count):
+            adm_no = rng.choice(adm_nos)
+            public_id = f"results/{adm_no}/{uuid.UUID(int=rng.getrandbits(128)).hex}"
+            writer.writerow([adm_no, f"memory://{public_id}.jpg", public_id, "Term report"])
+
+
+def app_env(tmpdir: str, students_csv: str) -> dict:
+    """Environment that points ``import app`` at ``tmpdir`` and the synthetic roster."""
+    return {
+        "DB_PATH": os.path.join(tmpdir, "portal.db"),
+        "STUDENTS_CSV": students_csv,
+        "RESULTS_CSV": os.path.join(tmpdir, "results.csv"),
+        "ROSTER_SOURCE": "db",
+        "STORAGE_BACKEND": "memory",
+        "STORAGE_ROOT": os.path.join(tmpdir, "storage"),
+        "CHART_CACHE_DIR": os.path.join(tmpdir, "charts"),
+        "UPLOAD_SPOOL_DIR": os.path.join(tmpdir, "spool"),
+        "STORAGE_RECONCILE_INTERVAL": "0",
+        "SLOW_REQUEST_MS": "0",
+        "METRICS_TOKEN": METRICS_TOKEN,
+    }
+
+
+def boot_app(tmpdir: str, size: int, seed: int = 0, uploads_per_student: float = 4, terms: int = 2):
+    """Import the app against a fresh synthetic dataset; returns (app module, roster rows, timings)."""
+    students_csv = os.path.join(tmpdir, "students.csv")
+    rows = write_roster_csv(students_csv, size, seed)
+    os.environ.pop("DATABASE_URL", None)
+    os.environ.update(app_env(tmpdir, students_csv))
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+    timings = {}
+    t0 = time.perf_counter()
+    import app  # seeds the roster table from students.csv and loads it
+    timings["boot_s"] = time.perf_counter() - t0
+
+    adm_nos = [row["Admission Number"] for row in rows]
+    uploads = upload_rows(adm_nos, uploads_per_student, seed)
+    scores = score_rows(adm_nos, terms, seed)
+    t0 = time.perf_counter()
+    with app.database.transaction() as c:
+        c.executemany(
+            "INSERT INTO uploads (adm_no, kind, url, public_id, note, filename, resource_type, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            uploads,
+        )
+        if scores:
+            c.executemany("INSERT INTO scores (adm_no, term, subject, score) VALUES (?, ?, ?, ?)", scores)
+            c.execute(
+                "INSERT INTO scores_meta (id, version, updated_at) VALUES (1, ?, ?)",
+                (uuid.uuid4().hex[:16], time.time()),
+            )
+    timings["seed_s"] = time.perf_counter() - t0
+    timings["uploads"] = len(uploads)
+    timings["scores"] = len(scores)
+    return app, rows, timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic portal data.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    roster = sub.add_parser("roster", help="students.csv with SIZE students")
+    roster.add_argument("size", type=int)
+    results = sub.add_parser("results", help="legacy results.csv with COUNT rows")
+    results.add_argument("count", type=int)
+    results.add_argument("--roster", type=int, default=1000, help="roster size the rows refer to")
+    for command in (roster, results):
+        command.add_argument("-o", "--output", required=True)
+        command.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == "roster":
+        write_roster_csv(args.output, args.size, args.seed)
+    else:
+        adm_nos = [row["Admission Number"] for row in roster_rows(args.roster, args.seed)]
+        write_results_csv(args.output, adm_nos, args.count, args.seed)
+    print(f"✅ Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+# biographies.py
+"""Student biographies: the ``biographies`` table and a per-worker cache of it.
+
+The table is the single source of truth; ``students.csv`` only supplies a
+starting text.  Every write, one edit from the profile page or a bulk
+import, takes the next ``biographies_meta.version`` and stamps it on the
+rows it changed.  Each worker keeps every biography in memory and, at most
+every ``check_interval`` seconds, compares the meta version with the one it
+last saw; if it moved, it fetches just the rows written since:
+
+    SELECT adm_no, biography FROM biographies WHERE version > <last seen>
+
+so an edit handled by one gunicorn worker reaches the others within a
+check interval, and serving a profile costs a dict lookup, not a query.
+Listeners (search index, page cache) hear about each changed student.
+"""
+import threading
+import time
+
+
+def create_biography_tables(database, cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS biographies (
+            adm_no TEXT PRIMARY KEY,
+            biography TEXT,
+            version INTEGER NOT NULL DEFAULT 0
+        );
+        """
+    )
+    database.ensure_column(cursor, "biographies", "version", "INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_biographies_version ON biographies (version);")
+    # Single row: the newest version stamped on any biography
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS biographies_meta (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        );
+        """
+    )
+    cursor.execute("INSERT INTO biographies_meta (id, version) VALUES (1, 0) ON CONFLICT(id) DO NOTHING")
+
+
+def upsert_biographies(database, items) -> int:
+    """Write (adm_no, biography) pairs in one transaction; returns the version they got.
+
+    Rows whose text is unchanged keep their old version, so re-running an
+    import doesn't make every worker re-fetch every biography.
+    """
+    items = list(items)
+    if not items:
+        return 0
+    with database.transaction() as c:
+        # The row lock on biographies_meta serializes writers, so versions
+        # become visible in order and "version > last seen" never skips one
+        c.execute("UPDATE biographies_meta SET version = version + 1 WHERE id=1")
+        version = c.execute("SELECT version FROM biographies_meta WHERE id=1").fetchone()[0]
+        c.executemany(
+            "INSERT INTO biographies (adm_no, biography, version) VALUES (?, ?, ?) "
+            "ON CONFLICT(adm_no) DO UPDATE SET biography=excluded.biography, version=excluded.version "
+            "WHERE biographies.biography IS NULL OR biographies.biography <> excluded.biography",
+            [(adm_no, biography, version) for adm_no, biography in items],
+        )
+    return version
+
+
+class BiographyCache:
+    """adm_no -> biography for this worker, kept current from the version feed."""
+
+    def __init__(self, database, check_interval: float = 2.0):
+        self.database = database
+        self.check_interval = check_interval
+        self.version = None
+        self._bios = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+
+    def subscribe(self, listener):
+        """``listener(changed)`` runs with {adm_no: biography} after each catch-up."""
+        self._listeners.append(listener)
+        return listener
+
+    def get(self, adm_no: str):
+        return self._bios.get(adm_no)
+
+    def all(self) -> dict:
+        return self._bios
+
+    def load(self):
+        """Read every biography (at startup; listeners are not called)."""
+        with self._lock, self.database.connection():
+            version = self.database.query_one("SELECT version FROM biographies_meta WHERE id=1")[0]
+            rows = self.database.query("SELECT adm_no, biography FROM biographies")
+            self._bios = {adm_no: bio for adm_no, bio in rows if bio}
+            self.version = version
+
+    def refresh(self) -> dict:
+        """Fetch biographies written since the last seen version; returns {adm_no: biography}."""
+        if self.version is None:
+            self.load()
+            return {}
+        with self._lock:
+            with self.database.connection():
+                version = self.database.query_one("SELECT version FROM biographies_meta WHERE id=1")[0]
+                if version <= self.version:
+                    return {}
+                rows = self.database.query(
+                    "SELECT adm_no, biography, version FROM biographies WHERE version > ?", (self.version,)
+                )
+            changed = {adm_no: bio for adm_no, bio, _ in rows}
+            # Copy-on-write, like the roster: readers never see a half-applied batch
+            bios = dict(self._bios)
+            for adm_no, bio in changed.items():
+                if bio:
+                    bios[adm_no] = bio
+                else:
+                    bios.pop(adm_no, None)
+            self._bios = bios
+            self.version = max([version] + [v for _, _, v in rows])
+        for listener in self._listeners:
+            listener(changed)
+        return changed
+
+    def maybe_refresh(self):
+        """Throttled refresh() for the request path."""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        self.refresh()
+
+    def save(self, adm_no: str, biography: str):
+        """Write one biography and apply it to this worker at once."""
+        upsert_biographies(self.database, [(adm_no, biography)])
+        self.refresh()
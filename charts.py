@@ -0,0 +1,100 @@
+# charts.py
+"""Department pie chart, rendered once per roster version.
+
+The chart only depends on the per-department student counts, so it is
+rendered when ``load_students()`` sees a roster with a new content hash and
+then served from memory (or from the on-disk copy another worker already
+wrote) until the roster changes again.
+"""
+import io
+import os
+import threading
+from datetime import datetime, timezone
+
+from metrics import CACHE_REQUESTS, CHART_RENDER_SECONDS
+
+CHART_FORMATS = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+
+def render_department_chart(counts, fmt: str = "png") -> bytes:
+    """Render the department pie chart; ``counts`` is [(department, n), ...]."""
+    # matplotlib costs ~0.5s and tens of MB per worker, and this is its only
+    # user, so it is imported on the first render rather than at boot
+    import matplotlib
+    matplotlib.use("Agg")  # prevents Tkinter errors in Flask
+    from matplotlib.figure import Figure
+
+    # Figure (not pyplot) keeps no global state, so concurrent renders are safe
+    fig = Figure(figsize=(6, 6))
+    ax = fig.subplots()
+    labels = [dept for dept, _ in counts]
+    sizes = [n for _, n in counts]
+    if sizes:
+        ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=140)
+    else:
+        ax.axis("off")
+        ax.text(0.5, 0.5, "No students loaded", ha="center", va="center")
+    ax.set_title("Sponsored Students per Department")
+    img = io.BytesIO()
+    fig.savefig(img, format=fmt, bbox_inches="tight")
+    return img.getvalue()
+
+
+class ChartImage:
+    def __init__(self, data: bytes, fmt: str, etag: str, last_modified: datetime):
+        self.data = data
+        self.mimetype = CHART_FORMATS[fmt]
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class ChartCache:
+    """Memory + disk cache of the rendered chart, keyed by roster content hash."""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._version = "empty"
+        self._counts = []
+        self._last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        self._images = {}
+
+    def update(self, version: str, counts, mtime: float):
+        """Called by load_students(); drops cached images only if the roster changed."""
+        with self._lock:
+            if version == self._version:
+                return
+            self._version = version
+            self._counts = list(counts)
+            self._last_modified = datetime.fromtimestamp(int(mtime), tz=timezone.utc)
+            self._images = {}
+
+    def _disk_path(self, fmt: str) -> str:
+        return os.path.join(self.cache_dir, f"students_chart-{self._version}.{fmt}")
+
+    def get(self, fmt: str = "png") -> ChartImage:
+        with self._lock:
+            image = self._images.get(fmt)
+            if image is not None:
+                CACHE_REQUESTS.inc(cache="chart", result="memory")
+                return image
+            path = self._disk_path(fmt)
+            if os.path.exists(path):
+                CACHE_REQUESTS.inc(cache="chart", result="disk")
+                with open(path, "rb") as f:
+                    data = f.read()
+            else:
+                CACHE_REQUESTS.inc(cache="chart", result="miss")
+                with CHART_RENDER_SECONDS.time(format=fmt):
+                    data = render_department_chart(self._counts, fmt)
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)  # atomic, so other workers never read half a file
+            image = ChartImage(data, fmt, f"{self._version}-{fmt}", self._last_modified)
+            self._images[fmt] = image
+            return image
@@ -0,0 +1,278 @@
+# database.py
+"""Pooled data-access layer shared by every SQL helper in app.py.
+
+One ``Database`` object owns a small pool of connections to either SQLite
+(local dev, Render disk) or Postgres (``DATABASE_URL``).  Inside a Flask
+request the same connection is reused for every helper call and handed back
+to the pool on teardown; outside a request (startup, CLI, background
+threads) callers borrow one with ``with database.connection():``.
+
+Helpers write SQL once, in SQLite style (``?`` placeholders), and the layer
+rewrites it for psycopg2 when running on Postgres.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from flask import g, has_app_context
+
+from metrics import record_query
+
+POSTGRES_SCHEMES = ("postgres://", "postgresql://")
+
+# Applied to every new SQLite connection.  WAL lets gunicorn workers read
+# while another one writes; NORMAL sync is safe under WAL and avoids an
+# fsync per commit.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA mmap_size=67108864",
+)
+
+# sqlite3 keeps this many compiled statements per connection, so the
+# handful of queries the portal runs are prepared once per pooled connection.
+SQLITE_STATEMENT_CACHE = 128
+
+
+@lru_cache(maxsize=256)
+def _to_pyformat(sql: str) -> str:
+    """Rewrite ``?`` placeholders as ``%s`` for psycopg2 (escaping literal %)."""
+    return sql.replace("%", "%%").replace("?", "%s")
+
+
+@lru_cache(maxsize=256)
+def _operation(sql: str) -> str:
+    """Metrics label for a statement: its leading keyword (SELECT, INSERT, ...)."""
+    words = sql.split(None, 1)
+    return words[0].upper() if words else ""
+
+
+class Cursor:
+    """Thin cursor wrapper that translates placeholders for the active dialect."""
+
+    def __init__(self, raw, dialect: str):
+        self._raw = raw
+        self._dialect = dialect
+
+    def _sql(self, sql: str) -> str:
+        return _to_pyformat(sql) if self._dialect == "postgres" else sql
+
+    def execute(self, sql: str, params=()):
+        start = time.perf_counter()
+        try:
+            self._raw.execute(self._sql(sql), tuple(params))
+        finally:
+            record_query(time.perf_counter() - start, _operation(sql))
+        return self
+
+    def executemany(self, sql: str, seq_of_params):
+        start = time.perf_counter()
+        try:
+            self._executemany(sql, seq_of_params)
+        finally:
+            record_query(time.perf_counter() - start, _operation(sql))
+        return self
+
+    def _executemany(self, sql: str, seq_of_params):
+        if self._dialect == "postgres":
+            # psycopg2's executemany is one round trip per row; batch them
+            from psycopg2.extras import execute_batch
+
+            execute_batch(self._raw, self._sql(sql), seq_of_params, page_size=500)
+        else:
+            self._raw.executemany(self._sql(sql), seq_of_params)
+
+    def fetchone(self):
+        return self._raw.fetchone()
+
+    def fetchall(self):
+        return self._raw.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._raw.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._raw.lastrowid
+
+    def close(self):
+        self._raw.close()
+
+
+class Database:
+    def __init__(self, url: str, pool_size: int = 5):
+        self.url = url
+        self.dialect = "postgres" if url.startswith(POSTGRES_SCHEMES) else "sqlite"
+        self.pool_size = pool_size
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+    # ------------------------------------------------------------------
+    # Dialect helpers for DDL
+    # ------------------------------------------------------------------
+    @property
+    def id_column(self) -> str:
+        if self.dialect == "postgres":
+            return "SERIAL PRIMARY KEY"
+        return "INTEGER PRIMARY KEY AUTOINCREMENT"
+
+    @property
+    def sqlite_path(self) -> str:
+        path = self.url
+        if path.startswith("sqlite:///"):
+            path = path[len("sqlite:///"):]
+        return path
+
+    def columns(self, cursor, table: str) -> set:
+        if self.dialect == "postgres":
+            cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_name=?", (table,))
+            return {row[0] for row in cursor.fetchall()}
+        cursor.execute(f"PRAGMA table_info({table})")
+        return {row[1] for row in cursor.fetchall()}
+
+    def ensure_column(self, cursor, table: str, column: str, decl: str):
+        """ALTER TABLE ... ADD COLUMN for databases created before ``column`` existed."""
+        if column not in self.columns(cursor, table):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+    # ------------------------------------------------------------------
+    # Pool
+    # ------------------------------------------------------------------
+    def _connect(self):
+        if self.dialect == "postgres":
+            import psycopg2  # only needed when DATABASE_URL points at Postgres
+
+            return psycopg2.connect(self.url)
+        conn = sqlite3.connect(
+            self.sqlite_path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            cached_statements=SQLITE_STATEMENT_CACHE,
+        )
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _check_fork(self):
+        # A forked worker must not reuse the parent's sockets/file handles;
+        # start it on an empty pool and leave the inherited ones to the parent.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pool = queue.LifoQueue(maxsize=self.pool_size)
+            self._local = threading.local()
+
+    def acquire(self):
+        self._check_fork()
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        try:
+            conn.rollback()  # never hand out a connection mid-transaction
+        except Exception:
+            conn.close()
+            return
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def dispose(self):
+        """Close every pooled connection (e.g. after a fork)."""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    # ------------------------------------------------------------------
+    # Connection scoping
+    # ------------------------------------------------------------------
+    def get_conn(self):
+        """Connection for the current request, or the current ``connection()`` block."""
+        if has_app_context():
+            if "db_conn" not in g:
+                g.db_conn = self.acquire()
+            return g.db_conn
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            raise RuntimeError("No connection: use 'with database.connection():' outside a request")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection for code running outside a request."""
+        if has_app_context() or getattr(self._local, "conn", None) is not None:
+            yield self.get_conn()
+            return
+        conn = self.acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self.release(conn)
+
+    def teardown(self, exc=None):
+        conn = g.pop("db_conn", None)
+        if conn is not None:
+            self.release(conn)
+
+    def init_app(self, app):
+        app.teardown_appcontext(self.teardown)
+
+    # ------------------------------------------------------------------
+    # Query helpers
+    # ------------------------------------------------------------------
+    def cursor(self) -> Cursor:
+        return Cursor(self.get_conn().cursor(), self.dialect)
+
+    @contextmanager
+    def transaction(self):
+        """Yield a cursor; commit on success, roll back on error."""
+        with self.connection() as conn:
+            cur = Cursor(conn.cursor(), self.dialect)
+            try:
+                yield cur
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+
+    def query(self, sql: str, params=()):
+        with self.connection():
+            cur = self.cursor()
+            try:
+                return cur.execute(sql, params).fetchall()
+            finally:
+                cur.close()
+
+    def query_one(self, sql: str, params=()):
+        with self.connection():
+            cur = self.cursor()
+            try:
+                return cur.execute(sql, params).fetchone()
+            finally:
+                cur.close()
+
+    def execute(self, sql: str, params=()) -> int:
+        with self.transaction() as cur:
+            return cur.execute(sql, params).rowcount
+
+    def executemany(self, sql: str, seq_of_params) -> int:
+        with self.transaction() as cur:
+            return cur.executemany(sql, seq_of_params).rowcount
@@ -0,0 +1,157 @@
+# dedup.py
+"""Content hashes for uploads, so re-sent photos are stored once per student.
+
+Every upload gets a SHA-256 of its bytes, computed while the request body
+is spooled to disk (no second read), and, for images, an optional 64-bit
+perceptual hash (dHash) that survives the re-encoding WhatsApp applies
+when the same picture is forwarded again.  Both live on the ``uploads``
+row; ``UploadJobs`` skips a file whose hash the student already has.
+
+Rows uploaded before hashing existed are filled in by:
+
+    python dedup.py backfill             # SHA-256 only
+    python dedup.py backfill --phash     # plus perceptual hashes for images
+    python dedup.py report               # list duplicate groups per student
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from collections import defaultdict
+
+from deletions import resource_type_for
+
+CHUNK_SIZE = 1 << 16
+# Two dHashes this many bits apart (of 64) are treated as the same picture
+PHASH_DISTANCE = 6
+
+
+def save_hashed(stream, path: str) -> str:
+    """Copy a binary stream (e.g. a werkzeug FileStorage) to ``path`` in chunks; returns SHA-256 hex."""
+    digest = hashlib.sha256()
+    source = getattr(stream, "stream", stream)
+    with open(path, "wb") as out:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+
+def perceptual_hash(path: str):
+    """64-bit difference hash as 16 hex chars, or None if Pillow can't read the file."""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+    try:
+        with Image.open(path) as im:
+            im.draft("L", (64, 64))  # let JPEG decode at a fraction of full size
+            im = ImageOps.exif_transpose(im).convert("L").resize((9, 8), Image.LANCZOS)
+            px = im.tobytes()  # one byte per pixel in mode "L"
+    except (OSError, ValueError):
+        return None
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (px[row * 9 + col] > px[row * 9 + col + 1])
+    return f"{bits:016x}"
+
+
+def hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def backfill(database, open_file, phash: bool = False, limit: int = None) -> dict:
+    """Hash uploads rows that have no content_hash yet.
+
+    ``open_file(url, public_id, resource_type)`` returns a readable binary
+    stream of the stored bytes.
+    """
+    sql = (
+        "SELECT id, url, public_id, resource_type, filename FROM uploads "
+        "WHERE content_hash IS NULL AND deleted_at IS NULL ORDER BY id"
+    )
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    report = {"hashed": 0, "failed": []}
+    with database.connection():
+        rows = database.query(sql)
+    for upload_id, url, public_id, resource_type, filename in rows:
+        resource_type = resource_type_for(resource_type, filename)
+        fd, tmp = tempfile.mkstemp(suffix=os.path.splitext(filename or public_id)[1])
+        os.close(fd)
+        try:
+            with open_file(url, public_id, resource_type) as stream:
+                content_hash = save_hashed(stream, tmp)
+            image_hash = perceptual_hash(tmp) if phash and resource_type == "image" else None
+            database.execute(
+                "UPDATE uploads SET content_hash=?, phash=COALESCE(?, phash) WHERE id=?",
+                (content_hash, image_hash, upload_id),
+            )
+            report["hashed"] += 1
+        except Exception as ex:
+            report["failed"].append({"public_id": public_id, "error": str(ex)})
+        finally:
+            os.remove(tmp)
+    return report
+
+
+def duplicate_groups(database) -> list:
+    """[{adm_no, kind, content_hash, public_ids}] for every hash stored more than once."""
+    groups = defaultdict(list)
+    rows = database.query(
+        "SELECT adm_no, kind, content_hash, public_id FROM uploads "
+        "WHERE content_hash IS NOT NULL AND deleted_at IS NULL ORDER BY created_at, id"
+    )
+    for adm_no, kind, content_hash, public_id in rows:
+        groups[(adm_no, kind, content_hash)].append(public_id)
+    return [
+        {"adm_no": adm_no, "kind": kind, "content_hash": content_hash, "public_ids": ids}
+        for (adm_no, kind, content_hash), ids in groups.items() if len(ids) > 1
+    ]
+
+
+def open_stored_file(storage):
+    """``open_file`` for backfill(): local blobs straight from disk, anything else over HTTP."""
+    from urllib.request import urlopen
+
+    from storage import LocalStorage
+
+    def open_file(url, public_id, resource_type):
+        if isinstance(storage, LocalStorage):
+            path = storage.blob_path(public_id, resource_type)
+            if path is None:
+                raise FileNotFoundError(public_id)
+            return open(path, "rb")
+        return urlopen(url, timeout=30)
+
+    return open_file
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Content hashes for uploaded files.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fill = sub.add_parser("backfill", help="hash uploads recorded before hashing existed")
+    fill.add_argument("--phash", action="store_true", help="also compute perceptual hashes for images")
+    fill.add_argument("--limit", type=int, help="stop after this many rows")
+    sub.add_parser("report", help="list duplicate uploads per student")
+    args = parser.parse_args(argv)
+
+    # The app module carries the database/storage configuration (and creates the columns)
+    from app import database, storage
+
+    if args.command == "backfill":
+        report = backfill(database, open_stored_file(storage), phash=args.phash, limit=args.limit)
+        print(json.dumps(report, indent=2))
+        return 1 if report["failed"] else 0
+    with database.connection():
+        groups = duplicate_groups(database)
+    print(json.dumps(groups, indent=2))
+    print(f"{len(groups)} duplicate group(s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
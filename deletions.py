@@ -0,0 +1,321 @@
+# deletions.py
+"""Deferred, batched deletion of uploaded files from the storage backend.
+
+``/delete_file`` only soft-deletes the ``uploads`` row (``deleted_at``) and
+queues its public_id in ``storage_deletions``, in one transaction, so the
+click returns at once and a crash can never leave a row without a queued
+destroy.  A background thread drains the queue in batches, one storage
+call per resource type, and only then removes the rows; failures are
+retried with exponential backoff.
+
+``reconcile()`` compares ``uploads`` under the upload folders with the
+backend's listing and reports (or, with ``repair=True``, fixes) drift:
+assets no row points at, and live rows whose asset is gone.  The periodic
+run takes a lease in ``job_leases`` first, so however many workers there
+are, one of them reconciles per interval.  Listeners (the page cache) hear
+which students lost rows to a repair.
+"""
+import os
+import socket
+import sys
+import threading
+import time
+from collections import defaultdict
+
+# Folders the upload routes write to (see app.py)
+UPLOAD_PREFIXES = ("gallery/", "results/", "letters/")
+RESOURCE_TYPES = ("image", "raw")
+
+STORAGE_DELETIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS storage_deletions (
+        public_id TEXT PRIMARY KEY,
+        resource_type TEXT NOT NULL DEFAULT 'image',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL DEFAULT 0,
+        last_error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+JOB_LEASES_DDL = """
+    CREATE TABLE IF NOT EXISTS job_leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    );
+"""
+RECONCILE_LEASE = "storage_reconcile"
+
+
+def resource_type_for(resource_type, filename) -> str:
+    """Rows uploaded before resource_type was recorded: PDFs went up as 'raw'."""
+    if resource_type:
+        return resource_type
+    return "raw" if (filename or "").lower().endswith(".pdf") else "image"
+
+
+class DeletionQueue:
+    def __init__(self, database, storage, batch_size: int = 100, interval: float = 30.0,
+                 coalesce: float = 1.0, backoff: float = 5.0, max_backoff: float = 3600.0, lease: float = 300.0,
+                 reconcile_interval: float = 0.0, reconcile_repair: bool = False,
+                 prefixes=UPLOAD_PREFIXES):
+        self.database = database
+        self.storage = storage
+        self.batch_size = batch_size
+        self.interval = interval
+        self.coalesce = coalesce
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.reconcile_interval = reconcile_interval
+        self.reconcile_repair = reconcile_repair
+        self.prefixes = prefixes
+        self.last_reconcile = None
+        self._listeners = []
+        self._wake = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener):
+        """``listener(adm_nos)`` runs after a reconcile repair removed those students' rows."""
+        self._listeners.append(listener)
+        return listener
+
+    # ------------------------------------------------------------------
+    # Request side
+    # ------------------------------------------------------------------
+    def soft_delete(self, public_id: str, kind: str = None):
+        """Hide the upload now and queue its remote destroy; its adm_no, or None if no live row matched."""
+        sql = "SELECT resource_type, filename, adm_no FROM uploads WHERE public_id=? AND deleted_at IS NULL"
+        params = [public_id]
+        if kind:
+            sql += " AND kind=?"
+            params.append(kind)
+        with self.database.transaction() as c:
+            row = c.execute(sql, params).fetchone()
+            if not row:
+                return None
+            c.execute("UPDATE uploads SET deleted_at=CURRENT_TIMESTAMP WHERE public_id=?", (public_id,))
+            self._enqueue(c, [(public_id, resource_type_for(row[0], row[1]))])
+        self.wake()
+        return row[2]
+
+    @staticmethod
+    def _enqueue(cursor, items):
+        cursor.executemany(
+            "INSERT INTO storage_deletions (public_id, resource_type, next_attempt_at) VALUES (?, ?, 0) "
+            "ON CONFLICT(public_id) DO NOTHING",
+            items,
+        )
+
+    def pending(self) -> dict:
+        row = self.database.query_one(
+            "SELECT COUNT(*), COALESCE(SUM(CASE WHEN attempts > 0 THEN 1 ELSE 0 END), 0), COALESCE(MAX(attempts), 0) "
+            "FROM storage_deletions"
+        )
+        return {"queued": row[0], "retrying": row[1], "max_attempts": row[2], "last_reconcile": self.last_reconcile}
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+    def ensure_worker(self):
+        # Started on first use (and again after a fork) so a preloaded
+        # gunicorn parent never hands a dead thread to its workers
+        if self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread_pid != os.getpid() or not self._thread.is_alive():
+                self._wake = threading.Event()
+                self._thread = threading.Thread(target=self._loop, name="storage-deletions", daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def wake(self):
+        self.ensure_worker()
+        self._wake.set()
+
+    def _loop(self):
+        next_reconcile = time.monotonic() + self.reconcile_interval
+        while True:
+            if self._wake.wait(self.interval):
+                # Let a burst of delete clicks pile up into one batch
+                time.sleep(self.coalesce)
+            self._wake.clear()
+            try:
+                with self.database.connection():
+                    self.drain()
+                    if (self.reconcile_interval > 0 and time.monotonic() >= next_reconcile
+                            and self.take_lease(RECONCILE_LEASE, self.reconcile_interval)):
+                        next_reconcile = time.monotonic() + self.reconcile_interval
+                        report = self.reconcile(repair=self.reconcile_repair)
+                        if report["orphaned_assets"] or report["missing_assets"]:
+                            print(
+                                f"Storage drift: {len(report['orphaned_assets'])} orphaned asset(s), "
+                                f"{len(report['missing_assets'])} row(s) without an asset"
+                                f"{' (repaired)' if report['repaired'] else ''}",
+                                file=sys.stderr,
+                            )
+            except Exception as ex:
+                print("Storage deletion worker error:", ex, file=sys.stderr)
+
+    def take_lease(self, name: str, seconds: float, now: float = None) -> bool:
+        """Hold ``name`` for ``seconds`` unless another process holds it; True if we got it.
+
+        Never released early: the holder's run counts for the whole interval.
+        """
+        now = time.time() if now is None else now
+        holder = f"{socket.gethostname()}:{os.getpid()}"
+        with self.database.transaction() as c:
+            c.execute(
+                "INSERT INTO job_leases (name, holder, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET holder=excluded.holder, expires_at=excluded.expires_at "
+                "WHERE job_leases.expires_at <= ?",
+                (name, holder, now + seconds, now),
+            )
+            return c.rowcount == 1
+
+    def drain(self, now: float = None) -> dict:
+        """Process every due queue entry; returns {"deleted": n, "failed": n}."""
+        totals = {"deleted": 0, "failed": 0}
+        while True:
+            batch = self._claim(time.time() if now is None else now)
+            if not batch:
+                return totals
+            deleted, failed = self._process(batch)
+            totals["deleted"] += deleted
+            totals["failed"] += failed
+
+    def _claim(self, now: float):
+        """Lease up to batch_size due entries so other workers skip them meanwhile."""
+        claimed = []
+        with self.database.transaction() as c:
+            rows = c.execute(
+                "SELECT public_id, resource_type, attempts, next_attempt_at FROM storage_deletions "
+                "WHERE next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+                (now, self.batch_size),
+            ).fetchall()
+            for public_id, resource_type, attempts, due in rows:
+                c.execute(
+                    "UPDATE storage_deletions SET next_attempt_at=? WHERE public_id=? AND next_attempt_at=?",
+                    (now + self.lease, public_id, due),
+                )
+                if c.rowcount == 1:
+                    claimed.append((public_id, resource_type, attempts))
+        return claimed
+
+    def _still_queued(self, batch):
+        """Drop entries whose row was revived since the claim (a re-upload of the same file)."""
+        placeholders = ",".join("?" * len(batch))
+        public_ids = [public_id for public_id, _, _ in batch]
+        revived = (
+            f"public_id IN ({placeholders}) AND EXISTS "
+            "(SELECT 1 FROM uploads WHERE uploads.public_id = storage_deletions.public_id AND deleted_at IS NULL)"
+        )
+        with self.database.transaction() as c:
+            c.execute(f"DELETE FROM storage_deletions WHERE {revived}", public_ids)
+            queued = {row[0] for row in c.execute(
+                f"SELECT public_id FROM storage_deletions WHERE public_id IN ({placeholders})", public_ids
+            ).fetchall()}
+        return [item for item in batch if item[0] in queued]
+
+    def _process(self, batch):
+        # add_upload() revives a soft-deleted row and drops its entry when
+        # the same file comes back; a claimed batch must not destroy it
+        batch = self._still_queued(batch)
+        by_type = defaultdict(list)
+        attempts = {}
+        for public_id, resource_type, tries in batch:
+            by_type[resource_type].append(public_id)
+            attempts[public_id] = tries
+
+        gone, errors = [], {}
+        for resource_type, public_ids in by_type.items():
+            try:
+                done = self.storage.destroy_many(public_ids, resource_type=resource_type)
+            except Exception as ex:
+                errors.update((public_id, str(ex)) for public_id in public_ids)
+                continue
+            for public_id in public_ids:
+                if public_id in done:
+                    gone.append((public_id,))
+                else:
+                    errors[public_id] = "not deleted by storage backend"
+
+        now = time.time()
+        with self.database.transaction() as c:
+            if gone:
+                c.executemany("DELETE FROM uploads WHERE public_id=? AND deleted_at IS NOT NULL", gone)
+                c.executemany("DELETE FROM storage_deletions WHERE public_id=?", gone)
+            if errors:
+                c.executemany(
+                    "UPDATE storage_deletions SET attempts=attempts + 1, last_error=?, next_attempt_at=? "
+                    "WHERE public_id=?",
+                    [
+                        (error[:500], now + min(self.max_backoff, self.backoff * 2 ** attempts[public_id]), public_id)
+                        for public_id, error in errors.items()
+                    ],
+                )
+        return len(gone), len(errors)
+
+    # ------------------------------------------------------------------
+    # Reconciliation
+    # ------------------------------------------------------------------
+    def reconcile(self, repair: bool = False, grace: float = 3600.0) -> dict:
+        """Diff ``uploads`` against the storage listing; optionally queue/remove the strays.
+
+        Only public_ids under ``prefixes`` are compared: the listing covers
+        nothing else, so a row outside them would look like a missing asset.
+        Assets younger than ``grace`` seconds are ignored: their row may not
+        be written yet (uploads record the row after the asset exists).
+        """
+        prefixes = tuple(self.prefixes)
+        # Read the DB before listing storage, so every row we see had its
+        # asset uploaded before the listing started
+        with self.database.connection():
+            rows = self.database.query(
+                "SELECT public_id, resource_type, filename, adm_no FROM uploads WHERE deleted_at IS NULL"
+            )
+            live = {row[0]: row[3] for row in rows if row[0].startswith(prefixes)}
+            known = {row[0] for row in rows}
+            known.update(row[0] for row in self.database.query("SELECT public_id FROM uploads WHERE deleted_at IS NOT NULL"))
+            known.update(row[0] for row in self.database.query("SELECT public_id FROM storage_deletions"))
+
+        remote = {}
+        for prefix in prefixes:
+            for resource_type in RESOURCE_TYPES:
+                for public_id, created in self.storage.list(prefix, resource_type=resource_type):
+                    remote[public_id] = (resource_type, created)
+
+        cutoff = time.time() - grace
+        orphaned = sorted(
+            public_id for public_id, (_, created) in remote.items()
+            if public_id not in known and created < cutoff
+        )
+        missing = sorted(public_id for public_id in live if public_id not in remote)
+        students = sorted({live[public_id] for public_id in missing})
+
+        if repair and (orphaned or missing):
+            with self.database.transaction() as c:
+                if orphaned:
+                    self._enqueue(c, [(public_id, remote[public_id][0]) for public_id in orphaned])
+                if missing:
+                    c.executemany("DELETE FROM uploads WHERE public_id=?", [(public_id,) for public_id in missing])
+            if orphaned:
+                self.wake()
+            if students:
+                # Their pages still link to the rows just dropped
+                for listener in self._listeners:
+                    listener(students)
+
+        report = {
+            "rows": len(live),
+            "assets": len(remote),
+            "orphaned_assets": orphaned,
+            "missing_assets": missing,
+            "students": students,
+            "repaired": bool(repair and (orphaned or missing)),
+            "checked_at": time.time(),
+        }
+        self.last_reconcile = {k: v for k, v in report.items() if not isinstance(v, list)}
+        return report
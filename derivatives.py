@@ -0,0 +1,326 @@
+# derivatives.py
+"""Resized, re-encoded copies of roster photos for the web.
+
+Raw phone photos under ``static/images`` are turned into a few widths of
+WebP (plus AVIF when Pillow supports it, and a JPEG fallback).  Each file
+name carries a hash of the source bytes, so derived files never change
+under a URL and can be cached forever.  ``manifest.json`` in the output
+directory maps each source photo to its variants.
+
+Build everything ahead of time (e.g. in Render's buildCommand):
+
+    python derivatives.py build            # only new/changed photos
+    python derivatives.py build --force    # re-encode everything
+    python derivatives.py build --jobs 4   # encoder processes (default: CPU count)
+
+Until a photo is in the manifest its original is served.  With
+``DERIVATIVES_ON_DEMAND`` enabled, the first render also queues it for a
+background encoder thread, so no request ever waits on Pillow.
+"""
+import argparse
+import hashlib
+import json
+import os
+import queue
+import sys
+import threading
+
+from markupsafe import Markup, escape
+
+from metrics import CACHE_REQUESTS
+
+DERIVED_DIRNAME = "derived"
+WIDTHS = (160, 320, 640)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+QUALITY = {"avif": 50, "webp": 75, "jpeg": 80}
+PIL_FORMATS = {"avif": "AVIF", "webp": "WEBP", "jpeg": "JPEG"}
+MIMETYPES = {"avif": "image/avif", "webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+def available_formats():
+    """Modern formats first; AVIF only if this Pillow build can encode it."""
+    from PIL import features
+
+    formats = []
+    if features.check("avif"):
+        formats.append("avif")
+    if features.check("webp"):
+        formats.append("webp")
+    formats.append("jpeg")
+    return formats
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Derivatives:
+    def __init__(self, static_dir: str, widths=WIDTHS, on_demand: bool = True):
+        self.static_dir = static_dir
+        self.out_dir = os.path.join(static_dir, DERIVED_DIRNAME)
+        self.manifest_path = os.path.join(self.out_dir, "manifest.json")
+        self.widths = tuple(sorted(widths))
+        self.on_demand = on_demand
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._formats = None
+        self._missing = set()
+        self._queue = None
+        self._queued = set()
+        self._thread = None
+        self._thread_pid = None
+
+    # ------------------------------------------------------------------
+    # Manifest
+    # ------------------------------------------------------------------
+    def manifest(self) -> dict:
+        if self._manifest is None:
+            try:
+                with open(self.manifest_path, encoding="utf-8") as f:
+                    self._manifest = json.load(f)
+            except (OSError, ValueError):
+                self._manifest = {}
+        return self._manifest
+
+    def _save_manifest(self):
+        # Merge with what other processes may have written since we loaded it;
+        # a lost race only means a photo is regenerated later
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                on_disk = json.load(f)
+        except (OSError, ValueError):
+            on_disk = {}
+        on_disk.update(self._manifest)
+        self._manifest = on_disk
+        os.makedirs(self.out_dir, exist_ok=True)
+        tmp = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(on_disk, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    # ------------------------------------------------------------------
+    # Generation
+    # ------------------------------------------------------------------
+    def _source_key(self, photo: str) -> str:
+        """'static/images/GER/GER001.jpg' -> 'images/GER/GER001.jpg' (relative to static/)."""
+        photo = (photo or "").replace("\\", "/").lstrip("/")
+        if photo.startswith("static/"):
+            photo = photo[len("static/"):]
+        return photo
+
+    def _is_stale(self, key: str, entry) -> bool:
+        if not entry:
+            return True
+        try:
+            st = os.stat(os.path.join(self.static_dir, key))
+        except OSError:
+            return False  # source gone; keep serving what we have
+        return entry.get("size") != st.st_size or entry.get("mtime") != int(st.st_mtime)
+
+    def generate(self, key: str, force: bool = False, save: bool = True):
+        """Create all variants for one source photo; returns its manifest entry or None."""
+        from PIL import Image, ImageOps
+
+        src = os.path.join(self.static_dir, key)
+        if not os.path.isfile(src) or not key.lower().endswith(IMAGE_EXTENSIONS):
+            return None
+        entry = self.manifest().get(key)
+        if not force and not self._is_stale(key, entry):
+            return entry
+
+        if self._formats is None:
+            self._formats = available_formats()
+        digest = file_digest(src)[:12]
+        stem = os.path.splitext(key)[0]
+        st = os.stat(src)
+        with Image.open(src) as im:
+            # Let the JPEG decoder downscale by 2/4/8 while decoding; we never
+            # need more than twice the largest output width
+            im.draft("RGB", (self.widths[-1] * 2, self.widths[-1] * 2))
+            im = ImageOps.exif_transpose(im)  # phone photos are often rotated via EXIF
+            if im.mode not in ("RGB", "L"):
+                im = im.convert("RGB")
+            width, height = im.size
+            widths = [w for w in self.widths if w < width] or [width]
+            variants = {fmt: {} for fmt in self._formats}
+            for w in widths:
+                h = max(1, round(height * w / width))
+                resized = im if w == width else im.resize((w, h), Image.LANCZOS)
+                for fmt in self._formats:
+                    rel = f"{DERIVED_DIRNAME}/{stem}-{w}w-{digest}.{'jpg' if fmt == 'jpeg' else fmt}"
+                    out = os.path.join(self.static_dir, rel)
+                    if force or not os.path.exists(out):
+                        os.makedirs(os.path.dirname(out), exist_ok=True)
+                        tmp = f"{out}.{os.getpid()}.tmp"
+                        resized.save(tmp, PIL_FORMATS[fmt], quality=QUALITY[fmt], optimize=fmt == "jpeg")
+                        os.replace(tmp, out)
+                    variants[fmt][str(w)] = rel
+
+        entry = {
+            "hash": digest,
+            "size": st.st_size,
+            "mtime": int(st.st_mtime),
+            "width": width,
+            "height": height,
+            "variants": variants,
+        }
+        self.manifest()[key] = entry
+        if save:
+            self._save_manifest()
+        return entry
+
+    def build(self, force: bool = False, source_dir: str = "images", jobs: int = 1):
+        """Generate variants for every photo under static/<source_dir>; returns (built, skipped)."""
+        todo = []
+        skipped = 0
+        root = os.path.join(self.static_dir, source_dir)
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if d != DERIVED_DIRNAME]
+            for name in sorted(filenames):
+                if not name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                key = os.path.relpath(os.path.join(dirpath, name), self.static_dir).replace(os.sep, "/")
+                if not force and not self._is_stale(key, self.manifest().get(key)):
+                    skipped += 1
+                else:
+                    todo.append(key)
+
+        built = 0
+        if jobs > 1:
+            # Encoding (AVIF especially) is CPU-bound, so fan out across processes
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                results = pool.map(_generate_one, [(self.static_dir, self.widths, key, force) for key in todo])
+                for key, entry, error in results:
+                    built += self._record_build(key, entry, error)
+        else:
+            for key in todo:
+                built += self._record_build(*_generate_one((self.static_dir, self.widths, key, force), self))
+        self._save_manifest()
+        return built, skipped
+
+    def _record_build(self, key, entry, error) -> int:
+        if error:
+            print(f"skipped {key}: {error}", file=sys.stderr)
+            return 0
+        if entry:
+            self.manifest()[key] = entry
+            return 1
+        return 0
+
+    def lookup(self, photo: str):
+        """(key, manifest entry or None); a photo without one is queued for the background encoder."""
+        key = self._source_key(photo)
+        entry = self.manifest().get(key)
+        CACHE_REQUESTS.inc(cache="photo_derivatives", result="hit" if entry else "miss")
+        if entry is None and self.on_demand:
+            self._enqueue(key)
+        return key, entry
+
+    def _enqueue(self, key: str):
+        with self._lock:
+            # Started on first use (and again after a fork) so a preloaded
+            # gunicorn parent never hands a dead thread to its workers
+            if self._thread_pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._queued = set()
+                self._thread = threading.Thread(target=self._encode_queued, name="photo-derivatives", daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+            if key in self._missing or key in self._queued:
+                return
+            self._queued.add(key)
+            self._queue.put(key)
+
+    def _encode_queued(self):
+        while True:
+            key = self._queue.get()
+            try:
+                if self.generate(key) is None:
+                    self._missing.add(key)  # not a photo we can read; don't queue it on every render
+            except Exception as ex:
+                print(f"Photo derivative error for {key}:", ex, file=sys.stderr)
+                self._missing.add(key)
+            finally:
+                with self._lock:
+                    self._queued.discard(key)
+                self._queue.task_done()
+
+    def best_file(self, photo: str):
+        """Filesystem path of the largest built JPEG variant, else the original (None if missing)."""
+        key = self._source_key(photo)
+        entry = self.manifest().get(key)
+        if entry and entry["variants"].get("jpeg"):
+            jpegs = entry["variants"]["jpeg"]
+            path = os.path.join(self.static_dir, jpegs[max(jpegs, key=int)])
+            if os.path.isfile(path):
+                return path
+        path = os.path.join(self.static_dir, key)
+        return path if key and os.path.isfile(path) else None
+
+    # ------------------------------------------------------------------
+    # Template helper
+    # ------------------------------------------------------------------
+    def picture(self, photo: str, url_for, alt: str = "", sizes: str = "100vw", loading: str = "lazy",
+                **attrs) -> Markup:
+        """<picture> with AVIF/WebP srcsets and a JPEG <img> fallback for ``photo``."""
+        key, entry = self.lookup(photo)
+        extra = "".join(
+            f' {escape(name.rstrip("_").replace("_", "-"))}="{escape(value)}"' for name, value in attrs.items()
+        )
+        original = url_for("static", filename=key)
+        if not entry:
+            return Markup(f'<img src="{escape(original)}" alt="{escape(alt)}"{extra}>')
+
+        def srcset(fmt):
+            return ", ".join(
+                f"{url_for('static', filename=rel)} {w}w" for w, rel in sorted(
+                    entry["variants"][fmt].items(), key=lambda kv: int(kv[0]))
+            )
+
+        sources = "".join(
+            f'<source type="{MIMETYPES[fmt]}" srcset="{escape(srcset(fmt))}" sizes="{escape(sizes)}">'
+            for fmt in entry["variants"] if fmt != "jpeg"
+        )
+        fallback = entry["variants"]["jpeg"]
+        src = url_for("static", filename=fallback[max(fallback, key=int)])
+        img = (
+            f'<img src="{escape(src)}" srcset="{escape(srcset("jpeg"))}" sizes="{escape(sizes)}" '
+            f'alt="{escape(alt)}" loading="{escape(loading)}" decoding="async"{extra}>'
+        )
+        return Markup(f"<picture>{sources}{img}</picture>")
+
+
+def _generate_one(args, derivatives=None):
+    """Process-pool worker: (static_dir, widths, key, force) -> (key, entry, error)."""
+    static_dir, widths, key, force = args
+    if derivatives is None:
+        derivatives = Derivatives(static_dir, widths, on_demand=False)
+        derivatives._manifest = {}  # the parent already decided this photo needs building
+    try:
+        return key, derivatives.generate(key, force=force, save=False), None
+    except OSError as ex:
+        return key, None, str(ex)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build resized WebP/AVIF/JPEG variants of roster photos.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="generate variants for static/images/**")
+    build.add_argument("--force", action="store_true", help="re-encode even if up to date")
+    build.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="encoder processes (default: CPU count)")
+    build.add_argument("--static-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"))
+    args = parser.parse_args(argv)
+
+    derivatives = Derivatives(args.static_dir, on_demand=False)
+    built, skipped = derivatives.build(force=args.force, jobs=args.jobs)
+    print(f"✅ {built} photo(s) processed, {skipped} already up to date -> {derivatives.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+# direct_uploads.py
+"""Signed browser-to-storage uploads: file bytes never pass through a worker.
+
+The upload forms used to post every photo to a gunicorn worker, which held
+it (up to MAX_CONTENT_LENGTH) and then sent it on to Cloudinary.  With
+direct uploads the form's script instead asks the app to sign one upload:
+
+    POST /direct_uploads/<adm_no>/<kind>  {"filename", "note"}
+        -> {"upload_url", "fields", "token", "complete_url"}
+
+and posts the file with those fields straight to Cloudinary.  The signed
+fields pin the folder (so the public_id is under ``gallery/<adm_no>/``
+etc.), the student and kind (as Cloudinary ``context``) and a webhook URL;
+Cloudinary refuses an upload whose fields were altered or that was signed
+more than an hour ago.  The upload is then recorded by whichever arrives
+first (``add_upload`` ignores a public_id it already has):
+
+    POST /direct_uploads/complete  the browser: the token plus Cloudinary's
+                                   reply, whose signature over public_id and
+                                   version proves the upload happened
+    POST /direct_uploads/notify    Cloudinary's upload notification, signed
+                                   over its body (X-Cld-Signature)
+
+so a tab closed mid-way still gets its file recorded.  Directly uploaded
+files have no content hash yet; ``python dedup.py backfill`` adds it.
+
+A local stand-in speaks the same signed-upload protocol, for testing the
+whole flow without a Cloudinary account:
+
+    CLOUDINARY_API_KEY=key CLOUDINARY_API_SECRET=secret \\
+        python direct_uploads.py serve --port 8765 --root /tmp/standin
+
+with the app's DIRECT_UPLOADS=1, the same key/secret and
+
+    DIRECT_UPLOAD_URL=http://localhost:8765/{resource_type}/upload
+    DIRECT_UPLOAD_DELIVERY_URL=http://localhost:8765/{resource_type}/upload/v{version}/{public_id}
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import mimetypes
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import namedtuple
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import Request, urlopen
+
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+CLOUDINARY_UPLOAD_URL = "https://api.cloudinary.com/v1_1/{cloud_name}/{{resource_type}}/upload"
+CLOUDINARY_DELIVERY_URL = "https://res.cloudinary.com/{cloud_name}/{{resource_type}}/upload/v{{version}}/{{public_id}}"
+
+# Parameters Cloudinary leaves out of the string it signs
+UNSIGNED_PARAMS = ("file", "api_key", "resource_type", "cloud_name", "signature")
+# Cloudinary refuses an upload signed longer ago than this (the stand-in too)
+SIGNATURE_MAX_AGE = 3600
+# Notifications older than this are refused, so a captured one can't be replayed later
+NOTIFICATION_MAX_AGE = 7200
+RESOURCE_TYPES = ("image", "raw")
+
+DirectUpload = namedtuple("DirectUpload", "adm_no kind public_id url resource_type filename note")
+
+
+class DirectUploadError(Exception):
+    pass
+
+
+def api_sign(params: dict, secret: str) -> str:
+    """Cloudinary's request signature: SHA-1 of the sorted ``k=v&...`` string followed by the secret."""
+    to_sign = "&".join(
+        f"{k}={v}" for k, v in sorted(params.items()) if k not in UNSIGNED_PARAMS and v not in (None, "")
+    )
+    return hashlib.sha1((to_sign + secret).encode("utf-8")).hexdigest()
+
+
+def notification_signature(body: bytes, timestamp, secret: str) -> str:
+    """Cloudinary's X-Cld-Signature: SHA-1 of the raw body, X-Cld-Timestamp and the secret."""
+    return hashlib.sha1(body + str(timestamp).encode("utf-8") + secret.encode("utf-8")).hexdigest()
+
+
+def _escape_context(value) -> str:
+    return str(value).replace("=", "\\=").replace("|", "\\|")
+
+
+def encode_context(values: dict) -> str:
+    """Cloudinary ``context`` parameter: ``k=v|k=v`` with ``=`` and ``|`` in values escaped."""
+    return "|".join(f"{k}={_escape_context(v)}" for k, v in values.items())
+
+
+def decode_context(context: str) -> dict:
+    values = {}
+    for pair in re.split(r"(?<!\\)\|", context or ""):
+        key, _, value = pair.partition("=")  # keys are never escaped
+        if key:
+            values[key] = value.replace("\\=", "=").replace("\\|", "|")
+    return values
+
+
+class DirectUploads:
+    """Signs uploads for the browser and verifies what comes back.
+
+    ``folders`` maps each kind to its storage folder, e.g.
+    ``{"gallery": "gallery/{adm_no}"}``.  ``upload_url`` and
+    ``delivery_url`` are templates (``{resource_type}``, ``{version}``,
+    ``{public_id}``); the stored URL is built from the verified public_id,
+    never taken from the browser.
+    """
+
+    def __init__(self, api_key: str, api_secret: str, token_secret: str, folders: dict,
+                 upload_url: str, delivery_url: str, ttl: float = 600.0):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.folders = folders
+        self.upload_url = upload_url
+        self.delivery_url = delivery_url
+        self.ttl = ttl
+        self._tokens = URLSafeTimedSerializer(token_secret, salt="direct-upload")
+
+    def folder(self, kind: str, adm_no: str) -> str:
+        return self.folders[kind].format(adm_no=adm_no).strip("/")
+
+    def sign(self, adm_no: str, kind: str, resource_type: str, filename: str = "", note: str = "",
+             notification_url: str = None, now: float = None) -> dict:
+        """Fields for one browser upload to ``upload_url``, plus the token /complete wants back."""
+        params = {
+            "timestamp": int(time.time() if now is None else now),
+            "folder": self.folder(kind, adm_no),
+            "context": encode_context({"adm_no": adm_no, "kind": kind, "filename": filename, "note": note}),
+            "notification_url": notification_url,
+        }
+        params = {k: v for k, v in params.items() if v not in (None, "")}
+        fields = dict(params, api_key=self.api_key, signature=api_sign(params, self.api_secret))
+        token = self._tokens.dumps({
+            "adm_no": adm_no, "kind": kind, "resource_type": resource_type, "filename": filename, "note": note,
+        })
+        return {
+            "upload_url": self.upload_url.format(resource_type=resource_type),
+            "fields": fields,
+            "token": token,
+        }
+
+    def _upload(self, adm_no, kind, public_id, version, resource_type, filename, note) -> DirectUpload:
+        if kind not in self.folders or resource_type not in RESOURCE_TYPES:
+            raise DirectUploadError("Invalid upload")
+        if not public_id.startswith(self.folder(kind, adm_no) + "/") or ".." in public_id:
+            raise DirectUploadError("Upload is outside the student's folder")
+        url = self.delivery_url.format(resource_type=resource_type, version=version, public_id=public_id)
+        return DirectUpload(adm_no, kind, public_id, url, resource_type, filename or None, note)
+
+    def verify_completion(self, token: str, result: dict) -> DirectUpload:
+        """Check the browser's report: our token (not expired) and the storage's signed reply."""
+        try:
+            claims = self._tokens.loads(token, max_age=self.ttl)
+        except SignatureExpired:
+            raise DirectUploadError("Upload authorization expired") from None
+        except BadSignature:
+            raise DirectUploadError("Invalid upload token") from None
+        public_id = str(result.get("public_id") or "")
+        version = result.get("version")
+        expected = api_sign({"public_id": public_id, "version": version}, self.api_secret)
+        if not public_id or version in (None, "") or not hmac.compare_digest(expected, str(result.get("signature") or "")):
+            raise DirectUploadError("Storage signature does not match")
+        return self._upload(claims["adm_no"], claims["kind"], public_id, version, claims["resource_type"],
+                            claims["filename"], claims["note"])
+
+    def verify_notification(self, body: bytes, timestamp: str, signature: str, now: float = None):
+        """Check a webhook; the DirectUpload it reports, or None if it isn't one of ours."""
+        expected = notification_signature(body, timestamp, self.api_secret)
+        if not timestamp or not hmac.compare_digest(expected, signature or ""):
+            raise DirectUploadError("Invalid notification signature")
+        try:
+            age = (time.time() if now is None else now) - int(timestamp)
+        except ValueError:
+            raise DirectUploadError("Invalid notification timestamp") from None
+        if abs(age) > NOTIFICATION_MAX_AGE:
+            raise DirectUploadError("Notification is too old")
+        try:
+            payload = json.loads(body)
+            custom = (payload.get("context") or {}).get("custom") or {}
+            ours = payload.get("notification_type") == "upload" and custom.get("adm_no") and custom.get("kind")
+        except (ValueError, AttributeError):  # not JSON, or not the objects we expect
+            raise DirectUploadError("Invalid notification body") from None
+        if not ours:
+            return None  # e.g. a server-side upload, which recorded itself
+        return self._upload(custom["adm_no"], custom["kind"], str(payload.get("public_id") or ""),
+                            payload.get("version"), payload.get("resource_type"),
+                            custom.get("filename"), custom.get("note", ""))
+
+
+# ----------------------------------------------------------------------
+# Local stand-in for Cloudinary's signed upload API
+# ----------------------------------------------------------------------
+def parse_form_data(content_type: str, body: bytes):
+    """multipart/form-data -> ({name: value}, {name: (filename, bytes)})."""
+    message = BytesParser(policy=HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body
+    )
+    fields, files = {}, {}
+    if not message.is_multipart():
+        return fields, files
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        data = part.get_payload(decode=True) or b""
+        if part.get_filename() is not None:
+            files[name] = (part.get_filename(), data)
+        else:
+            fields[name] = data.decode("utf-8")
+    return fields, files
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """POST /<resource_type>/upload and GET /<resource_type>/upload/v<version>/<public_id>."""
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, message: str):
+        self._send_json(status, {"error": {"message": message}})
+
+    def do_OPTIONS(self):
+        # CORS preflight: the portal's pages post here from another origin
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Methods", "POST, GET, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "*")
+        self.end_headers()
+
+    def do_POST(self):
+        server = self.server
+        match = re.fullmatch(r"/(image|raw)/upload", self.path)
+        if not match:
+            return self._error(404, "Not found")
+        resource_type = match.group(1)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        fields, files = parse_form_data(self.headers.get("Content-Type", ""), body)
+        if "file" not in files:
+            return self._error(400, "Missing required parameter - file")
+        if fields.get("api_key") != server.api_key:
+            return self._error(401, "Invalid api_key")
+        params = {k: v for k, v in fields.items() if k not in UNSIGNED_PARAMS}
+        if not hmac.compare_digest(api_sign(params, server.api_secret), fields.get("signature", "")):
+            return self._error(401, "Invalid Signature")
+        try:
+            age = time.time() - int(fields.get("timestamp", ""))
+        except ValueError:
+            return self._error(400, "Invalid timestamp")
+        if age > SIGNATURE_MAX_AGE:
+            return self._error(400, "Stale request")
+
+        filename, data = files["file"]
+        stem, ext = os.path.splitext(filename)
+        folder = fields.get("folder", "").strip("/")
+        # Like Cloudinary: images drop the extension (it's the format), raw files keep it
+        public_id = f"{folder}/{uuid.uuid4().hex}" + (ext.lower() if resource_type == "raw" else "")
+        public_id = public_id.lstrip("/")
+        path = os.path.join(server.root, resource_type, *public_id.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+        version = int(time.time())
+        host = self.headers.get("Host") or f"{server.server_address[0]}:{server.server_address[1]}"
+        result = {
+            "public_id": public_id,
+            "version": version,
+            "signature": api_sign({"public_id": public_id, "version": version}, server.api_secret),
+            "resource_type": resource_type,
+            "format": ext.lstrip(".").lower(),
+            "bytes": len(data),
+            "original_filename": stem,
+            "secure_url": f"http://{host}/{resource_type}/upload/v{version}/{public_id}",
+            "context": {"custom": decode_context(fields.get("context", ""))},
+        }
+        self._send_json(200, result)
+        if fields.get("notification_url"):
+            threading.Thread(
+                target=server.notify, args=(fields["notification_url"], dict(result, notification_type="upload")),
+                daemon=True,
+            ).start()
+
+    def do_GET(self):
+        match = re.fullmatch(r"/(image|raw)/upload/v\d+/(.+)", self.path)
+        if not match or ".." in match.group(2):
+            return self._error(404, "Not found")
+        path = os.path.join(self.server.root, match.group(1), *match.group(2).split("/"))
+        if not os.path.isfile(path):
+            return self._error(404, "Not found")
+        with open(path, "rb") as f:
+            data = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, api_key: str, api_secret: str, root: str, verbose: bool = False):
+        super().__init__(address, StandInHandler)
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.root = os.path.abspath(root)
+        self.verbose = verbose
+        self.notifications = []  # (url, HTTP status or error) per webhook sent
+
+    def notify(self, url: str, payload: dict):
+        """Post a signed upload notification, as Cloudinary does."""
+        body = json.dumps(payload).encode("utf-8")
+        timestamp = str(int(time.time()))
+        request = Request(url, data=body, method="POST", headers={
+            "Content-Type": "application/json",
+            "X-Cld-Timestamp": timestamp,
+            "X-Cld-Signature": notification_signature(body, timestamp, self.api_secret),
+        })
+        try:
+            with urlopen(request, timeout=10) as resp:
+                self.notifications.append((url, resp.status))
+        except Exception as ex:
+            self.notifications.append((url, str(ex)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for Cloudinary's signed upload API.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="accept signed uploads and send upload notifications")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--root", default=os.path.join(os.getcwd(), "standin_uploads"))
+    args = parser.parse_args(argv)
+
+    api_key = os.getenv("CLOUDINARY_API_KEY", "")
+    api_secret = os.getenv("CLOUDINARY_API_SECRET", "")
+    if not api_key or not api_secret:
+        print("Set CLOUDINARY_API_KEY and CLOUDINARY_API_SECRET (the same values the app uses).", file=sys.stderr)
+        return 2
+    server = StandInServer((args.host, args.port), api_key, api_secret, args.root, verbose=True)
+    print(f"Signed-upload stand-in on http://{args.host}:{args.port}/ storing under {server.root}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+# export.py
+"""Department-wide sponsor report packs, streamed as one ZIP.
+
+Each student gets a folder with ``report.html`` (profile, biography,
+scores, result slips and letters; prints cleanly to PDF from a browser),
+``profile.json`` and their photo.  Packs are rendered in a process pool and
+written into a ZIP that is produced incrementally, so the response starts
+at once and memory stays flat however large the department is.
+
+    python export.py germans -o germans.zip
+    python export.py "Education for Generations" --jobs 4
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+# Packs rendered ahead of the ZIP writer, per worker process
+PREFETCH = 4
+
+_template = None
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only stream that hands written bytes to the response as they appear."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _safe_name(text: str) -> str:
+    keep = "".join(ch if ch.isalnum() or ch in " -_." else "_" for ch in text or "")
+    return " ".join(keep.split())[:80] or "student"
+
+
+def build_pack(task: dict):
+    """Process-pool worker: one student's task -> (folder, [(name, bytes, compress)])."""
+    global _template
+    if _template is None:
+        from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+        env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape(["html"]))
+        _template = env.get_template("report_pack.html")
+
+    student = task["student"]
+    adm_no = student.get("Admission Number", "")
+    # An edited biography wins; otherwise the roster's, as on the profile page
+    bio = task.get("bio") or student.get("Small Biography", "")
+    folder = _safe_name(f"{adm_no} - {student.get('Full Name', '')}")
+    files = []
+    photo_name = None
+    photo_path = task.get("photo_path")
+    if photo_path and os.path.isfile(photo_path):
+        photo_name = "photo" + os.path.splitext(photo_path)[1].lower()
+        with open(photo_path, "rb") as f:
+            files.append((photo_name, f.read(), False))  # already compressed
+    html = _template.render(
+        student=student,
+        bio=bio,
+        scores=task.get("scores") or [],
+        results=task.get("results") or [],
+        letters=task.get("letters") or [],
+        photo=photo_name,
+        generated=task["generated"],
+    )
+    files.append(("report.html", html.encode("utf-8"), True))
+    profile = dict(
+        student,
+        biography=bio,
+        scores=task.get("scores") or [],
+        results=task.get("results") or [],
+        letters=task.get("letters") or [],
+    )
+    files.append(("profile.json", json.dumps(profile, indent=2, default=str).encode("utf-8"), True))
+    return folder, files
+
+
+def _pool_context():
+    # The web process runs background threads; forking it mid-lock could
+    # deadlock a child, so start workers from a clean process instead
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _packs(tasks, jobs: int):
+    """Yield build_pack() results in task order, with a bounded number in flight."""
+    if jobs <= 1:
+        for task in tasks:
+            yield build_pack(task)
+        return
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=_pool_context()) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(build_pack, task))
+            if len(pending) >= jobs * PREFETCH:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def stream_zip(tasks, jobs: int = 2):
+    """Generator of ZIP bytes for an iterable of build_pack() tasks."""
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w") as archive:
+        for folder, files in _packs(tasks, jobs):
+            for name, data, compress in files:
+                info = zipfile.ZipInfo(f"{folder}/{name}", date_time=time.localtime()[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+                archive.writestr(info, data)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    yield sink.drain()  # central directory
+
+
+def department_tasks(students, bios: dict, uploads: dict, scores, photo_path):
+    """build_pack() tasks for ``students`` (roster rows).
+
+    ``uploads`` maps adm_no -> {"result": [...], "letter": [...]}; ``scores``
+    is a callable adm_no -> term history; ``photo_path`` maps a Photo value
+    to a file on disk (or None).
+    """
+    generated = time.strftime("%Y-%m-%d %H:%M")
+    for student in students:
+        adm_no = student.get("Admission Number", "")
+        mine = uploads.get(adm_no, {})
+        yield {
+            "student": dict(student),
+            "bio": bios.get(adm_no),
+            "scores": scores(adm_no),
+            "results": mine.get("result", []),
+            "letters": mine.get("letter", []),
+            "photo_path": photo_path(student.get("Photo")),
+            "generated": generated,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a department's sponsor report packs as a ZIP.")
+    parser.add_argument("department", help="department slug (e.g. germans) or name")
+    parser.add_argument("-o", "--output", help="ZIP path (default: <department>.zip)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="render processes")
+    args = parser.parse_args(argv)
+
+    # The app module carries the roster, database and storage configuration
+    from app import department_export_tasks
+
+    tasks = department_export_tasks(args.department)
+    if tasks is None:
+        print(f"❌ Unknown department {args.department!r}", file=sys.stderr)
+        return 1
+    output = args.output or f"{_safe_name(args.department)}.zip"
+    with open(output, "wb") as f:
+        for chunk in stream_zip(tasks, jobs=args.jobs):
+            f.write(chunk)
+    print(f"✅ Wrote {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+# gunicorn.conf.py
+"""gunicorn settings: load the app once in the master, then fork workers.
+
+With ``preload_app`` the imports, migrations, roster and biography loads in
+``app.create_app()`` run once instead of once per worker, and the workers
+share those pages copy-on-write.  Freezing the heap before the fork keeps
+the garbage collector from touching (and so copying) them.
+"""
+import gc
+import os
+
+preload_app = True
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+
+
+def pre_fork(server, worker):
+    gc.freeze()
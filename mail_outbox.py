@@ -0,0 +1,286 @@
+# mail_outbox.py
+"""Contact-form mail, queued in the database and sent in the background.
+
+``/contact`` only inserts a row into ``mail_outbox`` and answers at once.
+A background thread per worker claims queued rows in batches and sends
+them over one authenticated SMTP connection that it keeps open between
+batches (checked with NOOP before reuse, closed after ``idle_timeout``), so
+the TLS handshake and login are paid once, not per message.  Transient
+failures are retried with exponential backoff; a permanent refusal (5xx)
+or ``max_attempts`` tries marks the row ``failed``.
+
+Point SMTP_HOST/SMTP_PORT at a local stand-in (``SMTP_SSL=0 SMTP_AUTH=0``)
+to test without Gmail, e.g. ``python -m aiosmtpd -n -l localhost:1025``.
+
+    python mail_outbox.py status    # queued / failed counts
+    python mail_outbox.py drain     # send everything due now, in this process
+"""
+import argparse
+import json
+import os
+import smtplib
+import sys
+import threading
+import time
+from email.message import EmailMessage
+
+# Sent rows are kept this long for reference, then pruned
+SENT_RETENTION = 30 * 86400
+
+
+def mail_outbox_ddl(id_column: str) -> str:
+    return f"""
+        CREATE TABLE IF NOT EXISTS mail_outbox (
+            id {id_column},
+            mail_from TEXT NOT NULL,
+            mail_to TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            last_error TEXT,
+            sent_at REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """
+
+
+class SmtpSender:
+    """One SMTP connection, opened on demand and reused across batches."""
+
+    def __init__(self, host: str, port: int, username: str = "", password: str = "",
+                 use_ssl: bool = True, starttls: bool = False, timeout: float = 30.0, idle_timeout: float = 60.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.starttls = starttls
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._smtp = None
+        self._last_used = 0.0
+
+    def _connect(self):
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                smtp.starttls()
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        return smtp
+
+    def connection(self):
+        """The open connection, checked with NOOP if it sat idle; reconnects if it was dropped."""
+        if self._smtp is not None and time.monotonic() - self._last_used > 5:
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self.close()
+            except (smtplib.SMTPException, OSError):
+                self.close()
+        if self._smtp is None:
+            self._smtp = self._connect()
+        self._last_used = time.monotonic()
+        return self._smtp
+
+    def send(self, message: EmailMessage):
+        self.connection().send_message(message)
+        self._last_used = time.monotonic()
+
+    def close_if_idle(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+
+    def close(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+
+
+def _refused(ex: Exception):
+    """For a reply refusing this one message: True if permanent (5xx), False if 4xx.
+
+    None means the connection itself failed (dropped, login refused), so the
+    rest of the batch can't go out on it either.
+    """
+    if isinstance(ex, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in ex.recipients.values())
+    if isinstance(ex, smtplib.SMTPResponseException) and not isinstance(ex, smtplib.SMTPAuthenticationError):
+        return ex.smtp_code >= 500
+    return None
+
+
+class MailOutbox:
+    def __init__(self, database, sender, batch_size: int = 20, interval: float = 30.0, coalesce: float = 0.5,
+                 backoff: float = 30.0, max_backoff: float = 3600.0, max_attempts: int = 8, lease: float = 300.0):
+        self.database = database
+        self.sender = sender
+        self.batch_size = batch_size
+        self.interval = interval
+        self.coalesce = coalesce
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self._wake = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Request side
+    # ------------------------------------------------------------------
+    def enqueue(self, mail_from: str, mail_to: str, subject: str, body: str):
+        """Queue one message (durable once this returns) and nudge the sender."""
+        self.database.execute(
+            "INSERT INTO mail_outbox (mail_from, mail_to, subject, body) VALUES (?, ?, ?, ?)",
+            (mail_from, mail_to, subject, body),
+        )
+        self.wake()
+
+    def pending(self) -> dict:
+        rows = self.database.query(
+            "SELECT status, COUNT(*), COALESCE(MAX(attempts), 0) FROM mail_outbox GROUP BY status"
+        )
+        counts = {status: (n, attempts) for status, n, attempts in rows}
+        return {
+            "queued": counts.get("queued", (0, 0))[0],
+            "max_attempts": counts.get("queued", (0, 0))[1],
+            "failed": counts.get("failed", (0, 0))[0],
+            "sent": counts.get("sent", (0, 0))[0],
+        }
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+    def ensure_worker(self):
+        # Started on first use (and again after a fork), like the deletion queue
+        if self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread_pid != os.getpid() or not self._thread.is_alive():
+                self._wake = threading.Event()
+                self._thread = threading.Thread(target=self._loop, name="mail-outbox", daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def wake(self):
+        self.ensure_worker()
+        self._wake.set()
+
+    def _loop(self):
+        while True:
+            if self._wake.wait(min(self.interval, self.sender.idle_timeout)):
+                # Let a burst of submissions pile up into one batch
+                time.sleep(self.coalesce)
+            self._wake.clear()
+            try:
+                with self.database.connection():
+                    self.drain()
+            except Exception as ex:
+                print("Mail outbox worker error:", ex, file=sys.stderr)
+            self.sender.close_if_idle()
+
+    def drain(self, now: float = None) -> dict:
+        """Send every due message; returns {"sent": n, "retrying": n, "failed": n}."""
+        totals = {"sent": 0, "retrying": 0, "failed": 0}
+        while True:
+            batch = self._claim(time.time() if now is None else now)
+            if not batch:
+                break
+            for key, n in self._process(batch).items():
+                totals[key] += n
+        self.database.execute(
+            "DELETE FROM mail_outbox WHERE status='sent' AND sent_at < ?", (time.time() - SENT_RETENTION,)
+        )
+        return totals
+
+    def _claim(self, now: float):
+        """Lease up to batch_size due messages so other workers skip them meanwhile."""
+        claimed = []
+        with self.database.transaction() as c:
+            rows = c.execute(
+                "SELECT id, mail_from, mail_to, subject, body, attempts, next_attempt_at FROM mail_outbox "
+                "WHERE status='queued' AND next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT ?",
+                (now, self.batch_size),
+            ).fetchall()
+            for row in rows:
+                c.execute(
+                    "UPDATE mail_outbox SET next_attempt_at=? WHERE id=? AND next_attempt_at=?",
+                    (now + self.lease, row[0], row[6]),
+                )
+                if c.rowcount == 1:
+                    claimed.append(row[:6])
+        return claimed
+
+    def _process(self, batch) -> dict:
+        sent, errors = [], {}
+        for i, (message_id, mail_from, mail_to, subject, body, attempts) in enumerate(batch):
+            message = EmailMessage()
+            message["Subject"] = subject
+            message["From"] = mail_from
+            message["To"] = mail_to
+            message.set_content(body)
+            try:
+                self.sender.send(message)
+                sent.append(message_id)
+            except (smtplib.SMTPException, OSError) as ex:
+                permanent = _refused(ex)
+                errors[message_id] = (attempts, attempts + 1, str(ex), bool(permanent))
+                if permanent is None:
+                    # Retry the rest of the batch later, on a fresh connection
+                    self.sender.close()
+                    for rest in batch[i + 1:]:
+                        errors[rest[0]] = (rest[5], rest[5], f"not attempted: {ex}", False)
+                    break
+
+        now = time.time()
+        failed = 0
+        with self.database.transaction() as c:
+            if sent:
+                c.executemany(
+                    "UPDATE mail_outbox SET status='sent', sent_at=?, last_error=NULL WHERE id=?",
+                    [(now, message_id) for message_id in sent],
+                )
+            updates = []
+            for message_id, (attempts, tried, error, permanent) in errors.items():
+                give_up = permanent or tried >= self.max_attempts
+                failed += give_up
+                updates.append((
+                    "failed" if give_up else "queued", tried, error[:500],
+                    now + min(self.max_backoff, self.backoff * 2 ** attempts), message_id,
+                ))
+            if updates:
+                c.executemany(
+                    "UPDATE mail_outbox SET status=?, attempts=?, last_error=?, next_attempt_at=? WHERE id=?",
+                    updates,
+                )
+        return {"sent": len(sent), "retrying": len(errors) - failed, "failed": failed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Contact-form mail outbox.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="queued / failed / sent counts")
+    sub.add_parser("drain", help="send everything due now")
+    args = parser.parse_args(argv)
+
+    # The app module carries the database and SMTP configuration
+    from app import database, outbox
+
+    with database.connection():
+        if args.command == "drain":
+            print(json.dumps(outbox.drain(), indent=2))
+            outbox.sender.close()
+        print(json.dumps(outbox.pending(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+# metrics.py
+"""Request timing, counters and histograms, exposed in Prometheus text format.
+
+A dependency-free subset of prometheus_client: module-level metrics that
+other modules record into directly, e.g.
+
+    from metrics import CACHE_REQUESTS
+    CACHE_REQUESTS.inc(cache="chart", result="memory")
+
+``init_app()`` times every request (per route template, so URLs with
+admission numbers don't explode the label set), counts the SQL it ran, and
+serves everything at ``/metrics`` to scrapers that send the configured
+token (``Authorization: Bearer <token>``); with no token the endpoint is
+off.  Values are per process: with several gunicorn workers each scrape
+sees the worker that answered it.
+
+With ``SLOW_REQUEST_MS`` set, requests slower than that are logged with
+their DB time and query count; a ``PROFILE_SAMPLE_RATE`` share of requests
+also run under cProfile, and a slow one logs its top functions.
+"""
+import cProfile
+import hmac
+import io
+import pstats
+import random
+import threading
+import time
+
+from flask import Response, abort, g, has_request_context, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple((name, labels.get(name, "")) for name in self.labelnames)
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name + ("_total" if not self.name.endswith("_total") else ""), key, value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values = {}  # labels -> [per-bucket counts, sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple((name, labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield self.name + "_bucket", key + (("le", _number(bound)),), cumulative
+            yield self.name + "_sum", key, total
+            yield self.name + "_count", key, count
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ----------------------------------------------------------------------
+# The portal's metrics
+# ----------------------------------------------------------------------
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route.", ("method", "route", "status"))
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements run per request.", ("route",), buckets=QUERY_COUNT_BUCKETS)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "Time spent in SQL statements.", ("operation",))
+STORAGE_SECONDS = Histogram(
+    "storage_call_duration_seconds", "Time spent in storage backend calls.", ("backend", "operation", "outcome"))
+CHART_RENDER_SECONDS = Histogram(
+    "chart_render_duration_seconds", "Department chart render time.", ("format",))
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit/miss/...).", ("cache", "result"))
+SLOW_REQUESTS = Counter(
+    "http_slow_requests_total", "Requests slower than SLOW_REQUEST_MS.", ("route",))
+
+
+def record_query(seconds: float, operation: str):
+    """Called by database.Cursor for every statement."""
+    DB_QUERY_SECONDS.observe(seconds, operation=operation)
+    if has_request_context():
+        g._metrics_queries = g.get("_metrics_queries", 0) + 1
+        g._metrics_db_seconds = g.get("_metrics_db_seconds", 0.0) + seconds
+
+
+def instrument_storage(storage):
+    """Time a storage backend's calls in place (keeps its type for isinstance checks)."""
+    backend = getattr(storage, "name", type(storage).__name__)
+    for operation in ("upload", "destroy", "destroy_many"):
+        method = getattr(storage, operation, None)
+        if method is None:
+            continue
+
+        def timed(*args, _method=method, _operation=operation, **kwargs):
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                result = _method(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                STORAGE_SECONDS.observe(time.perf_counter() - start, backend=backend,
+                                        operation=_operation, outcome=outcome)
+
+        setattr(storage, operation, timed)
+    return storage
+
+
+def init_app(app, slow_ms: float = 0, profile_rate: float = 0.0, endpoint: str = "/metrics", token: str = ""):
+    slow_seconds = slow_ms / 1000.0
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_start = time.perf_counter()
+        if slow_seconds and profile_rate and random.random() < profile_rate:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                return  # another profiler is already active in this thread
+            g._metrics_profiler = profiler
+
+    @app.after_request
+    def _metrics_finish(resp):
+        start = g.pop("_metrics_start", None)
+        profiler = g.get("_metrics_profiler")
+        if start is None:
+            return resp
+        elapsed = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        queries = g.get("_metrics_queries", 0)
+        REQUEST_SECONDS.observe(elapsed, method=request.method, route=route, status=resp.status_code)
+        REQUEST_QUERIES.observe(queries, route=route)
+        if slow_seconds and elapsed >= slow_seconds:
+            SLOW_REQUESTS.inc(route=route)
+            message = (
+                f"Slow request {request.method} {request.path} ({route}): {elapsed * 1000:.0f} ms, "
+                f"{queries} queries, {g.get('_metrics_db_seconds', 0.0) * 1000:.0f} ms in SQL"
+            )
+            if profiler is not None:
+                profiler.disable()
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(25)
+                message += "\n" + out.getvalue()
+            app.logger.warning(message)
+        return resp
+
+    @app.teardown_request
+    def _metrics_stop_profiler(exc=None):
+        # Runs even when the view raised, so the thread is never left profiled
+        profiler = g.pop("_metrics_profiler", None)
+        if profiler is not None:
+            profiler.disable()
+
+    @app.route(endpoint)
+    def metrics():
+        if not token:
+            abort(404)
+        supplied = request.headers.get("Authorization", "")
+        if not supplied.startswith("Bearer ") or not hmac.compare_digest(supplied[len("Bearer "):], token):
+            return Response("Forbidden\n", status=403, mimetype="text/plain")
+        return Response(render(), mimetype="text/plain; version=0.0.4")
@@ -1,47 +1,49 @@
 import os
 import csv
-import sqlite3
+
+from biographies import upsert_biographies
+from database import Database
+from migrations import migrate
+from response_cache import invalidate_pages
+from static_snapshot import StaticSnapshot
 
 DATA_DIR = "."
 STUDENTS_CSV = os.path.join(DATA_DIR, "students.csv")
-DB_PATH = os.path.join(DATA_DIR, "students.db")
+DB_PATH = os.getenv("DB_PATH", os.path.join(DATA_DIR, "students.db"))
+
+
+def get_database():
+    return Database(os.getenv("DATABASE_URL", f"sqlite:///{DB_PATH}"))
+
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS biographies (
-            adm_no TEXT PRIMARY KEY,
-            biography TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    migrate(get_database())  # the same versioned schema the app creates
+
 
 def migrate_csv_to_sqlite():
     if not os.path.exists(STUDENTS_CSV):
         print("❌ students.csv not found.")
         return
-    
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
 
     with open(STUDENTS_CSV, newline='', encoding='utf-8') as f:
         reader = csv.DictReader(f)
-        count = 0
+        bios = {}
         for row in reader:
             adm_no = row.get("Admission Number", "").strip().upper()
             bio = row.get("Small Biography", "").strip()
             if adm_no and bio:
-                c.execute('''
-                    INSERT INTO biographies (adm_no, biography) VALUES (?, ?)
-                    ON CONFLICT(adm_no) DO UPDATE SET biography=excluded.biography
-                ''', (adm_no, bio))
-                count += 1
-
-    conn.commit()
-    conn.close()
-    print(f"✅ Migration complete. {count} biographies copied to SQLite.")
+                bios[adm_no] = bio
+
+    # One transaction, one executemany; running workers pick the rows up
+    # from the biographies version feed
+    database = get_database()
+    upsert_biographies(database, bios.items())
+    # Workers only drop their own copies as they catch up; the shared
+    # stamps and pre-rendered profiles are the writer's job
+    invalidate_pages(database, list(bios))
+    if os.getenv("STATIC_SNAPSHOT_DIR"):
+        StaticSnapshot(os.getenv("STATIC_SNAPSHOT_DIR")).invalidate(f"/profile/{adm_no}" for adm_no in bios)
+    print(f"✅ Migration complete. {len(bios)} biographies copied to the database.")
 
 if __name__ == "__main__":
     init_db()
@@ -0,0 +1,217 @@
+# migrations.py
+"""Versioned schema migrations and the one-time startup tasks, run under a lock.
+
+Each entry in ``MIGRATIONS`` runs once per database, in order, in its own
+transaction together with its ``schema_migrations`` row.  ``run_startup()``
+holds an exclusive file lock while it applies pending migrations and then
+runs the app's one-time tasks (seeding the roster, importing legacy CSVs),
+so when several gunicorn workers boot at once exactly one does the work
+and the rest find nothing pending.  Across machines (Postgres) the primary
+key on ``schema_migrations`` stops a second apply from committing.
+
+To change the schema, append a ``(version, name, function)``; never edit
+one that has shipped.
+
+    python migrations.py            # apply pending migrations
+    python migrations.py status     # applied and pending versions
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from biographies import create_biography_tables
+from deletions import JOB_LEASES_DDL, STORAGE_DELETIONS_DDL
+from mail_outbox import mail_outbox_ddl
+from response_cache import create_response_cache_tables
+from roster_io import create_roster_tables
+from scores import create_scores_tables
+
+try:
+    import fcntl
+except ImportError:  # Windows dev box: one process, nothing to race
+    fcntl = None
+
+DEFAULT_LOCK_PATH = os.path.join(tempfile.gettempdir(), "daisy_startup.lock")
+
+SCHEMA_MIGRATIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at REAL NOT NULL
+    );
+"""
+
+
+def _baseline(database, c):
+    """Everything the app's old init_db() created; idempotent, so existing databases just get recorded."""
+    id_column = database.id_column
+    # Biographies + their change version (see biographies.py)
+    create_biography_tables(database, c)
+    # Unified uploads table for gallery/results/letters
+    c.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS uploads (
+            id {id_column},
+            adm_no TEXT NOT NULL,
+            kind TEXT NOT NULL CHECK(kind IN ('gallery','result','letter')),
+            url TEXT NOT NULL,
+            public_id TEXT NOT NULL UNIQUE,
+            note TEXT,
+            filename TEXT,
+            resource_type TEXT,
+            content_hash TEXT,
+            phash TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            deleted_at TIMESTAMP
+        );
+        """
+    )
+    database.ensure_column(c, "uploads", "resource_type", "TEXT")
+    database.ensure_column(c, "uploads", "deleted_at", "TIMESTAMP")
+    database.ensure_column(c, "uploads", "content_hash", "TEXT")
+    database.ensure_column(c, "uploads", "phash", "TEXT")
+    # "Does this student already have this file?" (see dedup.py)
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_uploads_student_hash
+        ON uploads (adm_no, kind, content_hash)
+        WHERE deleted_at IS NULL;
+        """
+    )
+    # Serves get_uploads(): equality on (adm_no, kind), then the
+    # keyset walk over (created_at, id) newest-first without a sort.
+    # Partial, so soft-deleted rows awaiting their storage destroy
+    # never cost anything on the read path.
+    c.execute("DROP INDEX IF EXISTS idx_uploads_student_kind_created;")
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_uploads_live_student_kind_created
+        ON uploads (adm_no, kind, created_at DESC, id DESC)
+        WHERE deleted_at IS NULL;
+        """
+    )
+    # Remote destroys queued by /delete_file (see deletions.py)
+    c.execute(STORAGE_DELETIONS_DDL)
+    # Contact-form mail waiting for the background sender (see mail_outbox.py)
+    c.execute(mail_outbox_ddl(id_column))
+    # Student roster + its change version (see roster_io.py)
+    create_roster_tables(c, id_column)
+    # Exam scores + their change version (see scores.py)
+    create_scores_tables(c, id_column)
+    # Progress of background upload batches (see upload_jobs.py)
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS upload_jobs (
+            id TEXT PRIMARY KEY,
+            adm_no TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            completed INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            duplicates INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+    )
+    database.ensure_column(c, "upload_jobs", "duplicates", "INTEGER NOT NULL DEFAULT 0")
+    # Shared rendered pages and invalidation stamps for the page cache (see response_cache.py)
+    create_response_cache_tables(c)
+
+
+def _job_leases(database, c):
+    """Leases that let one process run a periodic job (storage reconcile) per interval."""
+    c.execute(JOB_LEASES_DDL)
+
+
+MIGRATIONS = (
+    (1, "baseline", _baseline),
+    (2, "job_leases", _job_leases),
+)
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive advisory lock on ``path`` for the duration of the block."""
+    if fcntl is None:
+        yield
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def applied_versions(database) -> set:
+    with database.transaction() as c:
+        c.execute(SCHEMA_MIGRATIONS_DDL)
+    return {row[0] for row in database.query("SELECT version FROM schema_migrations")}
+
+
+def migrate(database) -> list:
+    """Apply pending migrations in order; returns the names applied."""
+    applied = []
+    with database.connection():
+        done = applied_versions(database)
+        for version, name, apply in MIGRATIONS:
+            if version in done:
+                continue
+            with database.transaction() as c:
+                if database.dialect == "sqlite":
+                    # sqlite3 only opens a transaction by itself before DML, so
+                    # the DDL would otherwise commit statement by statement
+                    c.execute("BEGIN")
+                apply(database, c)
+                c.execute(
+                    "INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)",
+                    (version, name, time.time()),
+                )
+            applied.append(f"{version}_{name}")
+    return applied
+
+
+def run_startup(database, lock_path: str = DEFAULT_LOCK_PATH, tasks=()) -> list:
+    """Migrate, then run each one-time ``task()``, all while holding the startup lock."""
+    with file_lock(lock_path):
+        applied = migrate(database)
+        for version in applied:
+            print(f"✅ Applied migration {version}")
+        for task in tasks:
+            task()
+    return applied
+
+
+def main(argv=None):
+    from database import Database
+
+    parser = argparse.ArgumentParser(description="Schema migrations.")
+    parser.add_argument("command", nargs="?", choices=("migrate", "status"), default="migrate")
+    args = parser.parse_args(argv)
+
+    db_path = os.getenv("DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "students.db"))
+    database = Database(os.getenv("DATABASE_URL", f"sqlite:///{db_path}"))
+    lock_path = os.getenv("STARTUP_LOCK", DEFAULT_LOCK_PATH)
+    if args.command == "migrate":
+        run_startup(database, lock_path)
+    with database.connection():
+        done = applied_versions(database)
+    print(json.dumps({
+        "applied": [f"{v}_{n}" for v, n, _ in MIGRATIONS if v in done],
+        "pending": [f"{v}_{n}" for v, n, _ in MIGRATIONS if v not in done],
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+# response_cache.py
+"""Rendered-page cache for the student and department pages, with ETags.
+
+The profile, gallery, results, letter and department pages only change on
+an upload, a delete, a biography edit, a score import or a roster reload,
+yet each view re-runs its queries and re-renders its template.  Views
+wrapped in ``ResponseCache.cached()`` keep the rendered body under a scope
+(the student's admission number, or ``department:<slug>``) and serve it
+back with a strong ETag, so a browser revalidating gets a bodiless 304.
+
+Writers call ``invalidate(scope)``, ``invalidate_many(scopes)`` or
+``clear()`` for roster-wide changes; other copies of the pages (the static
+snapshot) ``subscribe()``.  Every invalidation is stamped in the shared
+``response_cache_scopes`` table, so one made by another gunicorn worker, or
+by a CLI through ``invalidate_pages()``, is seen by all of them.  A worker
+catching up on a change another one wrote calls ``forget(scopes)``, which
+only drops its own copies.  Two stores:
+
+    memory    per-worker LRU, bounded by entry count, with a TTL; each hit
+              checks the scope's stamp (one primary-key lookup)
+    database  the ``response_cache`` table, shared by every worker
+
+A page rendered while its scope was being invalidated is not stored, so a
+slow render can't put a pre-upload page back into the cache.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import current_app, request
+
+from metrics import CACHE_REQUESTS
+
+CachedPage = namedtuple("CachedPage", "body mimetype etag")
+
+# Query arguments that make a page one-off (e.g. ?job=... shows an upload's progress)
+UNCACHED_ARGS = ("job",)
+# Every this many stores, the database store drops expired and excess rows
+PRUNE_EVERY = 100
+ALL_SCOPES = "*"
+
+
+def create_response_cache_tables(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS response_cache (
+            key TEXT PRIMARY KEY,
+            scope TEXT NOT NULL,
+            body TEXT NOT NULL,
+            mimetype TEXT NOT NULL,
+            etag TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        """
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_scope ON response_cache (scope);")
+    # When each scope was last invalidated (ALL_SCOPES for clear()), so a
+    # render that started before that isn't stored
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS response_cache_scopes (
+            scope TEXT PRIMARY KEY,
+            invalidated_at REAL NOT NULL
+        );
+        """
+    )
+
+
+def _record_invalidation(cursor, scope: str, now: float):
+    cursor.execute(
+        "INSERT INTO response_cache_scopes (scope, invalidated_at) VALUES (?, ?) "
+        "ON CONFLICT(scope) DO UPDATE SET invalidated_at=excluded.invalidated_at",
+        (scope, now),
+    )
+
+
+def invalidate_pages(database, scopes=None):
+    """Mark cached pages stale for every worker, from outside the app (None: all of them)."""
+    now = time.time()
+    with database.transaction() as c:
+        for scope in [ALL_SCOPES] if scopes is None else scopes:
+            _record_invalidation(c, scope, now)
+            if scope == ALL_SCOPES:
+                c.execute("DELETE FROM response_cache")
+            else:
+                c.execute("DELETE FROM response_cache WHERE scope=?", (scope,))
+
+
+class MemoryPageStore:
+    """Per-process LRU of rendered pages with a TTL.
+
+    With ``database``, invalidations are shared through the
+    ``response_cache_scopes`` table: each hit is checked against the
+    scope's stamp, so a page another worker invalidated is re-rendered here
+    too.  Without it (tests, benchmarks) the store only sees its own.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 300.0, database=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.database = database
+        self._lock = threading.Lock()
+        self._pages = OrderedDict()  # key -> (expires_at, scope, page, render started)
+        self._invalidated = {}       # scope -> time of last invalidate() in this process
+        self._cleared_at = 0.0
+
+    def now(self) -> float:
+        return time.time()  # compared with stamps written by other processes
+
+    def _invalidated_since(self, scope: str, started: float) -> bool:
+        row = self.database.query_one(
+            "SELECT 1 FROM response_cache_scopes WHERE scope IN (?, ?) AND invalidated_at >= ?",
+            (scope, ALL_SCOPES, started),
+        )
+        return row is not None
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= self.now():
+                del self._pages[key]
+                return None
+            self._pages.move_to_end(key)
+        expires_at, scope, page, started = entry
+        if self.database is not None and self._invalidated_since(scope, started):
+            with self._lock:
+                if self._pages.get(key) is entry:
+                    del self._pages[key]
+            return None
+        return page
+
+    def set(self, key: str, scope: str, page: CachedPage, started: float):
+        with self._lock:
+            if started <= max(self._cleared_at, self._invalidated.get(scope, 0.0)):
+                return
+            self._pages[key] = (self.now() + self.ttl, scope, page, started)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+
+    def _share(self, scopes, now: float):
+        if self.database is not None:
+            with self.database.transaction() as c:
+                for scope in scopes:
+                    _record_invalidation(c, scope, now)
+
+    def forget(self, scopes) -> float:
+        """Drop this process's pages for ``scopes``; nothing is shared."""
+        scopes = set(scopes)
+        now = self.now()
+        with self._lock:
+            for scope in scopes:
+                self._invalidated[scope] = now
+            for key in [k for k, (_, s, _, _) in self._pages.items() if s in scopes]:
+                del self._pages[key]
+        return now
+
+    def invalidate(self, scope: str):
+        self.invalidate_many([scope])
+
+    def invalidate_many(self, scopes):
+        scopes = list(scopes)
+        self._share(scopes, self.forget(scopes))
+
+    def clear(self):
+        now = self.now()
+        with self._lock:
+            self._cleared_at = now
+            self._invalidated = {}
+            self._pages.clear()
+        self._share([ALL_SCOPES], now)
+
+
+class DatabasePageStore:
+    """Rendered pages in the ``response_cache`` table, shared by all workers.
+
+    Bounded like the memory store, except that the rows dropped first are
+    the ones closest to expiry rather than the least recently read (a read
+    doesn't write).
+    """
+
+    def __init__(self, database, max_entries: int = 512, ttl: float = 300.0):
+        self.database = database
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._stores = 0
+
+    def now(self) -> float:
+        return time.time()  # compared across processes
+
+    def get(self, key: str):
+        row = self.database.query_one(
+            "SELECT body, mimetype, etag FROM response_cache WHERE key=? AND expires_at > ?", (key, self.now())
+        )
+        return CachedPage(row[0].encode("utf-8"), row[1], row[2]) if row else None
+
+    def set(self, key: str, scope: str, page: CachedPage, started: float):
+        now = self.now()
+        with self.database.transaction() as c:
+            stale = c.execute(
+                "SELECT 1 FROM response_cache_scopes WHERE scope IN (?, ?) AND invalidated_at >= ?",
+                (scope, ALL_SCOPES, started),
+            ).fetchone()
+            if stale:
+                return
+            c.execute(
+                "INSERT INTO response_cache (key, scope, body, mimetype, etag, expires_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET scope=excluded.scope, body=excluded.body, "
+                "mimetype=excluded.mimetype, etag=excluded.etag, expires_at=excluded.expires_at",
+                (key, scope, page.body.decode("utf-8"), page.mimetype, page.etag, now + self.ttl),
+            )
+        self._stores += 1
+        if self._stores % PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        now = self.now()
+        with self.database.transaction() as c:
+            c.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+            # An invalidation older than any live page can no longer matter
+            c.execute("DELETE FROM response_cache_scopes WHERE invalidated_at < ?", (now - self.ttl,))
+            excess = c.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0] - self.max_entries
+            if excess > 0:
+                c.execute(
+                    "DELETE FROM response_cache WHERE key IN "
+                    "(SELECT key FROM response_cache ORDER BY expires_at LIMIT ?)",
+                    (excess,),
+                )
+
+    def forget(self, scopes):
+        pass  # the writer's invalidation already removed the shared rows
+
+    def invalidate(self, scope: str):
+        invalidate_pages(self.database, [scope])
+
+    def invalidate_many(self, scopes):
+        invalidate_pages(self.database, list(scopes))
+
+    def clear(self):
+        invalidate_pages(self.database)
+
+
+class ResponseCache:
+    """Wraps views; ``store`` None disables caching (views run as before)."""
+
+    def __init__(self, store=None):
+        self.store = store
+        self._listeners = []
+
+    def subscribe(self, listener):
+        """``listener(scope)`` runs after each invalidate(), and with None after clear()."""
+        self._listeners.append(listener)
+        return listener
+
+    def invalidate(self, scope: str):
+        if not scope:
+            return
+        if self.store is not None:
+            self.store.invalidate(scope)
+        for listener in self._listeners:
+            listener(scope)
+
+    def invalidate_many(self, scopes):
+        """invalidate() for each scope, stamped in one transaction."""
+        scopes = [scope for scope in scopes if scope]
+        if not scopes:
+            return
+        if self.store is not None:
+            self.store.invalidate_many(scopes)
+        for scope in scopes:
+            for listener in self._listeners:
+                listener(scope)
+
+    def forget(self, scopes):
+        """Drop this worker's copies of pages another process already invalidated."""
+        if self.store is not None:
+            self.store.forget(scopes)
+
+    def clear(self):
+        if self.store is not None:
+            self.store.clear()
+        for listener in self._listeners:
+            listener(None)
+
+    def cached(self, scope):
+        """Decorator; ``scope(**view_args)`` names what invalidates the page (e.g. the adm_no)."""
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**view_args):
+                store = self.store
+                if store is None or request.method not in ("GET", "HEAD") or any(
+                    arg in request.args for arg in UNCACHED_ARGS
+                ):
+                    return view(**view_args)
+                page_scope = scope(**view_args)
+                key = f"{page_scope}|{request.full_path}"
+                page = store.get(key)
+                CACHE_REQUESTS.inc(cache="response", result="hit" if page else "miss")
+                if page is None:
+                    started = store.now()
+                    resp = current_app.make_response(view(**view_args))
+                    if resp.status_code != 200 or resp.is_streamed:
+                        return resp  # redirects ("Student not found") etc. are never cached
+                    body = resp.get_data()
+                    page = CachedPage(body, resp.mimetype, hashlib.sha256(body).hexdigest()[:32])
+                    store.set(key, page_scope, page, started)
+                resp = current_app.response_class(page.body, mimetype=page.mimetype)
+                resp.set_etag(page.etag)
+                resp.cache_control.no_cache = True  # always revalidate; a 304 is cheap
+                return resp.make_conditional(request)
+
+            return wrapper
+
+        return decorator
@@ -0,0 +1,241 @@
+# roster.py
+"""Student roster: immutable snapshots, hot reload and secondary indexes.
+
+``RosterStore`` loads the roster from a source (the ``roster`` table, or
+``students.csv`` directly) into a ``RosterSnapshot`` (rows keyed by
+admission number plus a ``RosterIndex``) and swaps the whole snapshot in
+with one assignment, so requests see either the old roster or the new one,
+never a half-filled dict.  ``maybe_reload()`` is cheap enough to call on
+every request: at most every few seconds it checks the source's change
+token and, if it moved, reloads on a background thread.
+
+``students_data`` is keyed by admission number; listing pages need the
+other direction (all students in a department, class, school, sex).  The
+index is built once per roster load so those pages cost O(result) rather
+than a scan of every student on each request.
+"""
+import csv
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+# URL slug -> Department value used in students.csv
+DEPARTMENTS = {
+    'germans': 'Germans',
+    'italians': 'Italians',
+    'education': 'Education for Generations',
+    'warmhearted': 'Warmhearted Group',
+    'assisted': 'Assisted Group',
+}
+
+# facet name (API / query string) -> roster column
+FACETS = {
+    'department': 'Department',
+    'class': 'Class',
+    'school': 'school',
+    'sex': 'Sex',
+}
+
+
+def facet_key(value) -> str:
+    return ' '.join((value or '').split()).lower()
+
+
+class RosterIndex:
+    def __init__(self, students: dict = None):
+        self._by = {}
+        self._labels = {}
+        self._keys = {}
+        self.rebuild(students or {})
+
+    def rebuild(self, students: dict):
+        by = {facet: defaultdict(list) for facet in FACETS}
+        labels = {facet: {} for facet in FACETS}
+        keys = {facet: {} for facet in FACETS}
+        for adm_no, row in students.items():
+            for facet, column in FACETS.items():
+                raw = (row.get(column) or '').strip()
+                if not raw:
+                    continue
+                key = facet_key(raw)
+                by[facet][key].append(adm_no)
+                labels[facet].setdefault(key, raw)
+                keys[facet][adm_no] = key
+        # Swap whole dicts so readers never see a half-built index
+        self._by = {facet: dict(values) for facet, values in by.items()}
+        self._labels = labels
+        self._keys = keys
+
+    def lookup(self, facet: str, value: str):
+        """Admission numbers with ``facet == value`` (case/space-insensitive), roster order."""
+        if facet == 'department':
+            value = DEPARTMENTS.get(facet_key(value), value)
+        return self._by.get(facet, {}).get(facet_key(value), [])
+
+    def filter(self, **criteria):
+        """Admission numbers matching every given facet value (None/'' = any)."""
+        criteria = {facet: value for facet, value in criteria.items() if value}
+        if not criteria:
+            return None  # caller decides what "no filter" means
+        lists = sorted((self.lookup(facet, value) for facet, value in criteria.items()), key=len)
+        result = lists[0]
+        for other in lists[1:]:
+            allowed = set(other)
+            result = [adm_no for adm_no in result if adm_no in allowed]
+        return result
+
+    def counts(self, facet: str, within=None) -> dict:
+        """{label: count} for ``facet``, over the whole roster or the ``within`` subset."""
+        labels = self._labels.get(facet, {})
+        if within is None:
+            counts = Counter({key: len(adms) for key, adms in self._by.get(facet, {}).items()})
+        else:
+            keys = self._keys.get(facet, {})
+            counts = Counter(keys[adm_no] for adm_no in within if adm_no in keys)
+        return {labels[key]: n for key, n in counts.most_common()}
+
+    def values(self, facet: str):
+        return sorted(self._labels.get(facet, {}).values())
+
+
+class RosterSnapshot:
+    def __init__(self, students: dict, version: str, mtime: float, fingerprint=None):
+        self.students = students
+        # adm_no -> hash of the row as loaded, for per-reload diffs
+        self.fingerprints = {adm: hash(tuple(row.items())) for adm, row in students.items()}
+        self.version = version
+        self.mtime = mtime
+        self.fingerprint = fingerprint  # source change token (CSV stat / DB version)
+        self.index = RosterIndex(students)
+
+    @classmethod
+    def empty(cls):
+        return cls({}, "empty", time.time())
+
+
+def _stat_key(path: str):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+class CsvRosterSource:
+    """students.csv read directly (ROSTER_SOURCE=csv)."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def fingerprint(self):
+        try:
+            return _stat_key(self.path)
+        except OSError:
+            return None
+
+    def load(self):
+        """Parse the CSV into a snapshot; None if the file is missing."""
+        fingerprint = self.fingerprint()
+        if fingerprint is None:
+            return None
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+        students = {}
+        for row in csv.DictReader(io.StringIO(raw.decode('utf-8'), newline='')):
+            adm = (row.get('Admission Number') or '').strip().upper()
+            if adm:
+                students[adm] = row
+        return RosterSnapshot(students, hashlib.sha256(raw).hexdigest()[:16], fingerprint[0] / 1e9, fingerprint)
+
+
+class DbRosterSource:
+    """The roster table, shared by every worker (ROSTER_SOURCE=db).
+
+    ``roster_meta.version`` is the change token: checking it is one
+    single-row query, and the full table is only read when it moved.
+    """
+
+    def __init__(self, database):
+        self.database = database
+
+    def fingerprint(self):
+        row = self.database.query_one("SELECT version, updated_at FROM roster_meta WHERE id=1")
+        return tuple(row) if row else None
+
+    def load(self):
+        from roster_io import DB_COLUMNS, row_from_db
+
+        with self.database.connection():
+            meta = self.fingerprint()
+            if meta is None:
+                return None
+            rows = self.database.query(f"SELECT {', '.join(DB_COLUMNS)} FROM roster ORDER BY id")
+        students = {}
+        for values in rows:
+            row = row_from_db(values)
+            students[row['Admission Number']] = row
+        return RosterSnapshot(students, meta[0], meta[1], meta)
+
+
+def diff_snapshots(old: RosterSnapshot, new: RosterSnapshot) -> dict:
+    old_keys = old.fingerprints.keys()
+    new_keys = new.fingerprints.keys()
+    return {
+        "version": new.version,
+        "previous_version": old.version,
+        "total": len(new.students),
+        "added": sorted(new_keys - old_keys),
+        "removed": sorted(old_keys - new_keys),
+        "changed": sorted(adm for adm in new_keys & old_keys if new.fingerprints[adm] != old.fingerprints[adm]),
+    }
+
+
+class RosterStore:
+    def __init__(self, source, check_interval: float = 5.0):
+        self.source = source
+        self.check_interval = check_interval
+        self.snapshot = RosterSnapshot.empty()
+        self.last_diff = None
+        self._listeners = []
+        self._reload_lock = threading.Lock()
+        self._last_check = 0.0
+
+    def subscribe(self, listener):
+        """``listener(snapshot, diff)`` runs after every swap, one reload at a time."""
+        self._listeners.append(listener)
+        return listener
+
+    def reload(self, force: bool = False):
+        """Re-read the source if it changed (or ``force``); returns the diff, or None if unchanged."""
+        with self._reload_lock:
+            old = self.snapshot
+            if not force and old.fingerprint is not None and self.source.fingerprint() == old.fingerprint:
+                return None
+            new = self.source.load()
+            if new is None:
+                if old.students:
+                    return None  # source missing mid-deploy: keep serving the last good roster
+                new = RosterSnapshot.empty()
+            if not force and new.version == old.version:
+                old.fingerprint = new.fingerprint  # touched but identical content
+                return None
+            diff = diff_snapshots(old, new)
+            diff["initial"] = old.version == "empty" and not old.students
+            self.snapshot = new  # the atomic swap
+            self.last_diff = diff
+            for listener in self._listeners:
+                listener(new, diff)
+            return diff
+
+    def maybe_reload(self):
+        """Throttled change check; a changed roster is loaded off the request path."""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        fingerprint = self.source.fingerprint()
+        if fingerprint is None or fingerprint == self.snapshot.fingerprint:
+            return
+        if self._reload_lock.locked():
+            return
+        threading.Thread(target=self.reload, name="roster-reload", daemon=True).start()
@@ -0,0 +1,226 @@
+# roster_io.py
+"""Bulk import/export of the student roster between CSV and the ``roster`` table.
+
+    python roster_io.py import students.csv            # upsert by Admission Number
+    python roster_io.py import students.csv --dry-run  # validation report only
+    python roster_io.py import students.csv --prune    # also delete students not in the file
+    python roster_io.py export roster_export.csv
+
+An import runs in one transaction: rows are validated, compared with what
+is already stored, and only new or changed rows are written, as a single
+batched upsert.  Any change bumps ``roster_meta.version``, which is how
+every gunicorn worker notices it must reload its roster snapshot.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+import uuid
+
+from roster import DEPARTMENTS
+
+# roster table column -> students.csv header, in CSV order
+ROSTER_COLUMNS = (
+    ("adm_no", "Admission Number"),
+    ("full_name", "Full Name"),
+    ("class_name", "Class"),
+    ("sex", "Sex"),
+    ("age", "Age"),
+    ("bio", "Small Biography"),
+    ("parent_name", "Parent/Guardian Name"),
+    ("contact", "Contact"),
+    ("residence", "Place of Residence"),
+    ("photo", "Photo"),
+    ("department", "Department"),
+    ("school", "school"),
+    ("career", "career"),
+)
+DB_COLUMNS = tuple(col for col, _ in ROSTER_COLUMNS)
+CSV_HEADERS = tuple(header for _, header in ROSTER_COLUMNS)
+
+
+def roster_ddl(id_column: str):
+    return (
+        f"""
+        CREATE TABLE IF NOT EXISTS roster (
+            id {id_column},
+            adm_no TEXT NOT NULL UNIQUE,
+            full_name TEXT NOT NULL,
+            class_name TEXT,
+            sex TEXT,
+            age TEXT,
+            bio TEXT,
+            parent_name TEXT,
+            contact TEXT,
+            residence TEXT,
+            photo TEXT,
+            department TEXT,
+            school TEXT,
+            career TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_roster_department ON roster (department);",
+        # Single row: bumped by every import so workers know to reload
+        """
+        CREATE TABLE IF NOT EXISTS roster_meta (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        """,
+    )
+
+
+def create_roster_tables(cursor, id_column: str):
+    for statement in roster_ddl(id_column):
+        cursor.execute(statement)
+
+
+def row_from_db(values) -> dict:
+    """roster table tuple (DB_COLUMNS order) -> dict keyed like students.csv."""
+    return {header: (value if value is not None else "") for header, value in zip(CSV_HEADERS, values)}
+
+
+def validate_rows(reader):
+    """Yield (line_no, values_tuple, errors, warnings) for each CSV row."""
+    known = set(DEPARTMENTS.values())
+    for line_no, row in enumerate(reader, start=2):
+        values = tuple((row.get(header) or "").strip() for header in CSV_HEADERS)
+        record = dict(zip(DB_COLUMNS, values))
+        record["adm_no"] = record["adm_no"].upper()
+        errors, warnings = [], []
+        if not record["adm_no"]:
+            errors.append("missing Admission Number")
+        if not record["full_name"]:
+            errors.append("missing Full Name")
+        if record["sex"] and record["sex"].upper()[:1] not in ("M", "F"):
+            warnings.append(f"unexpected Sex {record['sex']!r}")
+        if record["age"] and not record["age"].isdigit():
+            warnings.append(f"non-numeric Age {record['age']!r}")
+        if record["department"] and record["department"] not in known:
+            warnings.append(f"unknown Department {record['department']!r}")
+        if not record["department"]:
+            warnings.append("missing Department")
+        yield line_no, tuple(record[col] for col in DB_COLUMNS), errors, warnings
+
+
+def import_roster(database, source, prune: bool = False, dry_run: bool = False) -> dict:
+    """Upsert a roster CSV (path or text stream) into the roster table; returns a report."""
+    if isinstance(source, str):
+        with open(source, newline="", encoding="utf-8") as f:
+            return import_roster(database, io.StringIO(f.read()), prune=prune, dry_run=dry_run)
+
+    reader = csv.DictReader(source)
+    report = {
+        "rows": 0, "inserted": 0, "updated": 0, "unchanged": 0, "removed": 0,
+        "skipped": [], "warnings": [], "dry_run": dry_run,
+    }
+    unknown = [h for h in (reader.fieldnames or []) if h not in CSV_HEADERS]
+    if unknown:
+        report["warnings"].append({"line": 1, "messages": [f"ignored column(s): {', '.join(unknown)}"]})
+
+    incoming = {}
+    for line_no, values, errors, warnings in validate_rows(reader):
+        report["rows"] += 1
+        adm_no = values[0]
+        if not errors and adm_no in incoming:
+            errors.append(f"duplicate Admission Number {adm_no} (first seen on line {incoming[adm_no][0]})")
+        if errors:
+            report["skipped"].append({"line": line_no, "adm_no": adm_no, "errors": errors})
+            continue
+        if warnings:
+            report["warnings"].append({"line": line_no, "adm_no": adm_no, "messages": warnings})
+        incoming[adm_no] = (line_no, values)
+
+    columns = ", ".join(DB_COLUMNS)
+    updates = ", ".join(f"{col}=excluded.{col}" for col in DB_COLUMNS[1:])
+    with database.transaction() as c:
+        existing = {
+            row[0]: tuple("" if v is None else v for v in row)
+            for row in c.execute(f"SELECT {columns} FROM roster").fetchall()
+        }
+        changed = []
+        for adm_no, (_, values) in incoming.items():
+            if adm_no not in existing:
+                report["inserted"] += 1
+                changed.append(values)
+            elif existing[adm_no] != values:
+                report["updated"] += 1
+                changed.append(values)
+            else:
+                report["unchanged"] += 1
+        stale = sorted(set(existing) - set(incoming)) if prune else []
+        report["removed"] = len(stale)
+        if dry_run:
+            return report
+
+        if changed:
+            c.executemany(
+                f"INSERT INTO roster ({columns}) VALUES ({', '.join('?' for _ in DB_COLUMNS)}) "
+                f"ON CONFLICT(adm_no) DO UPDATE SET {updates}, updated_at=CURRENT_TIMESTAMP",
+                changed,
+            )
+        if stale:
+            c.executemany("DELETE FROM roster WHERE adm_no=?", [(adm_no,) for adm_no in stale])
+        if changed or stale or not existing:
+            bump_roster_version(c)
+    return report
+
+
+def bump_roster_version(cursor):
+    version = uuid.uuid4().hex[:16]
+    cursor.execute(
+        "INSERT INTO roster_meta (id, version, updated_at) VALUES (1, ?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET version=excluded.version, updated_at=excluded.updated_at",
+        (version, time.time()),
+    )
+    return version
+
+
+def export_roster(database, dest) -> int:
+    """Write the roster table as students.csv-format CSV to a path or text stream."""
+    if isinstance(dest, str):
+        with open(dest, "w", newline="", encoding="utf-8") as f:
+            return export_roster(database, f)
+    writer = csv.writer(dest)
+    writer.writerow(CSV_HEADERS)
+    count = 0
+    for row in database.query(f"SELECT {', '.join(DB_COLUMNS)} FROM roster ORDER BY id"):
+        writer.writerow(["" if v is None else v for v in row])
+        count += 1
+    return count
+
+
+def main(argv=None):
+    from database import Database
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description="Import/export the student roster.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="upsert a students.csv-format file into the database")
+    imp.add_argument("path")
+    imp.add_argument("--prune", action="store_true", help="delete students missing from the file")
+    imp.add_argument("--dry-run", action="store_true", help="validate and report without writing")
+    exp = sub.add_parser("export", help="write the roster table to CSV")
+    exp.add_argument("path")
+    args = parser.parse_args(argv)
+
+    db_path = os.getenv("DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "students.db"))
+    database = Database(os.getenv("DATABASE_URL", f"sqlite:///{db_path}"))
+    migrate(database)  # the same versioned schema the app creates
+
+    if args.command == "import":
+        report = import_roster(database, args.path, prune=args.prune, dry_run=args.dry_run)
+        print(json.dumps(report, indent=2))
+        return 1 if report["skipped"] else 0
+    count = export_roster(database, args.path)
+    print(f"✅ Exported {count} students to {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+# scores.py
+"""Structured exam scores and the per-class analytics built on them.
+
+Scores live in the ``scores`` table, one row per (student, term, subject).
+They arrive in bulk from a CSV or Excel sheet in either shape:
+
+    Admission Number,Term,Subject,Score              # long
+    Admission Number,Term,Maths,English,Kiswahili    # wide: one column per subject
+
+    python scores.py import results_term1.xlsx
+    python scores.py import results_term1.csv --dry-run
+
+Every ingest bumps ``scores_meta.version``.  ``ScoreAnalytics`` computes
+class means, ranks, percentiles and term-over-term deltas for all students
+in one vectorized pandas pass and keeps the result until that version
+moves, so the results/profile pages only do a dict lookup.  An import from
+the command line also marks every worker's cached pages stale and drops
+the pre-rendered snapshot (STATIC_SNAPSHOT_DIR), as the admin upload does.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+
+from metrics import CACHE_REQUESTS
+
+# Header aliases accepted on import (lower-cased) -> canonical column
+COLUMN_ALIASES = {
+    "admission number": "adm_no",
+    "adm_no": "adm_no",
+    "adm no": "adm_no",
+    "term": "term",
+    "subject": "subject",
+    "score": "score",
+    "marks": "score",
+}
+
+
+def scores_ddl(id_column: str):
+    return (
+        f"""
+        CREATE TABLE IF NOT EXISTS scores (
+            id {id_column},
+            adm_no TEXT NOT NULL,
+            term TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            score REAL NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (adm_no, term, subject)
+        );
+        """,
+        # Single row: bumped by every ingest so cached analytics are rebuilt
+        """
+        CREATE TABLE IF NOT EXISTS scores_meta (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        """,
+    )
+
+
+def create_scores_tables(cursor, id_column: str):
+    for statement in scores_ddl(id_column):
+        cursor.execute(statement)
+
+
+def term_key(term: str):
+    """Natural sort key, so "2024 T2" < "2024 T10" < "2025 T1"."""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", term or "")]
+
+
+def read_sheet(source, filename: str = ""):
+    """DataFrame of (adm_no, term, subject, score) from a CSV/Excel path or binary stream."""
+    import pandas as pd
+
+    name = (filename or (source if isinstance(source, str) else "")).lower()
+    if name.endswith((".xlsx", ".xls")):
+        try:
+            frame = pd.read_excel(source, dtype=str)
+        except ImportError as ex:
+            raise ValueError(f"Excel import needs openpyxl installed ({ex})") from ex
+    else:
+        frame = pd.read_csv(source, dtype=str, skipinitialspace=True)
+
+    frame = frame.rename(columns=lambda c: COLUMN_ALIASES.get(str(c).strip().lower(), str(c).strip()))
+    missing = {"adm_no", "term"} - set(frame.columns)
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(sorted(missing))}")
+    if "subject" not in frame.columns:
+        # Wide sheet: every other column is a subject
+        subjects = [c for c in frame.columns if c not in ("adm_no", "term") and not str(c).startswith("Unnamed")]
+        frame = frame.melt(id_vars=["adm_no", "term"], value_vars=subjects, var_name="subject", value_name="score")
+    elif "score" not in frame.columns:
+        raise ValueError("Missing column: Score")
+    frame = frame[["adm_no", "term", "subject", "score"]].copy()
+    for column in ("adm_no", "term", "subject"):
+        frame[column] = frame[column].fillna("").astype(str).str.strip()
+    frame["adm_no"] = frame["adm_no"].str.upper()
+    frame["raw_score"] = frame["score"].fillna("").astype(str).str.strip()
+    frame["score"] = pd.to_numeric(frame["raw_score"], errors="coerce")
+    return frame
+
+
+def ingest_scores(database, source, filename: str = "", known_students=None, dry_run: bool = False) -> dict:
+    """Upsert a score sheet in one transaction; returns a report."""
+    frame = read_sheet(source, filename)
+    report = {"rows": int(len(frame)), "upserted": 0, "skipped": 0, "unknown_students": [], "dry_run": dry_run}
+
+    blank = (frame["adm_no"] == "") | (frame["term"] == "") | (frame["subject"] == "")
+    # An empty score cell (common in wide sheets) just means "not taken";
+    # only a score we can't place or can't parse counts as skipped
+    given = frame["raw_score"] != ""
+    report["skipped"] = int((given & (blank | frame["score"].isna())).sum())
+    valid = frame[~blank & frame["score"].notna()]
+    valid = valid.drop_duplicates(subset=["adm_no", "term", "subject"], keep="last")
+    if known_students is not None:
+        unknown = sorted(set(valid["adm_no"]) - set(known_students))
+        report["unknown_students"] = unknown
+    report["upserted"] = int(len(valid))
+    if dry_run or valid.empty:
+        return report
+
+    rows = list(zip(valid["adm_no"], valid["term"], valid["subject"], valid["score"].astype(float)))
+    with database.transaction() as c:
+        c.executemany(
+            "INSERT INTO scores (adm_no, term, subject, score) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(adm_no, term, subject) DO UPDATE SET score=excluded.score, updated_at=CURRENT_TIMESTAMP",
+            rows,
+        )
+        c.execute(
+            "INSERT INTO scores_meta (id, version, updated_at) VALUES (1, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET version=excluded.version, updated_at=excluded.updated_at",
+            (uuid.uuid4().hex[:16], time.time()),
+        )
+    return report
+
+
+def compute_analytics(frame, classes: dict) -> dict:
+    """adm_no -> [term summary, newest term first] from a (adm_no, term, subject, score) frame.
+
+    ``classes`` maps adm_no to the student's current class; everything is
+    grouped by (term, class), so each figure is one groupby over the whole
+    table rather than a loop per class or student.
+    """
+    import pandas as pd
+
+    if frame.empty:
+        return {}
+    frame = frame.copy()
+    frame["class_name"] = frame["adm_no"].map(classes).fillna("")
+    terms = sorted(frame["term"].unique(), key=term_key)
+    frame["term_no"] = frame["term"].map({term: i for i, term in enumerate(terms)})
+
+    # Subject level: class mean per subject, and change since the student's previous term
+    frame["subject_class_mean"] = frame.groupby(["term_no", "class_name", "subject"])["score"].transform("mean")
+    frame = frame.sort_values(["adm_no", "subject", "term_no"])
+    frame["subject_delta"] = frame.groupby(["adm_no", "subject"])["score"].diff()
+
+    # Student level: average over subjects, then ranked within (term, class)
+    per_term = frame.groupby(["adm_no", "term_no", "term", "class_name"], as_index=False)["score"].mean()
+    per_term = per_term.rename(columns={"score": "average"})
+    group = per_term.groupby(["term_no", "class_name"])["average"]
+    per_term["class_mean"] = group.transform("mean")
+    per_term["class_size"] = group.transform("size")
+    per_term["rank"] = group.rank(method="min", ascending=False)
+    # Share of the class scoring at or below this student
+    per_term["percentile"] = group.rank(method="max", pct=True) * 100
+    per_term = per_term.sort_values(["adm_no", "term_no"])
+    per_term["delta"] = per_term.groupby("adm_no")["average"].diff()
+
+    def clean(value, digits=1):
+        return None if pd.isna(value) else round(float(value), digits)
+
+    subjects = {}
+    for row in frame.sort_values(["adm_no", "term_no", "subject"]).itertuples(index=False):
+        subjects.setdefault((row.adm_no, row.term_no), []).append({
+            "subject": row.subject,
+            "score": clean(row.score),
+            "class_mean": clean(row.subject_class_mean),
+            "delta": clean(row.subject_delta),
+        })
+
+    result = {}
+    for row in per_term.itertuples(index=False):
+        result.setdefault(row.adm_no, []).append({
+            "term": row.term,
+            "class": row.class_name,
+            "average": clean(row.average),
+            "class_mean": clean(row.class_mean),
+            "class_size": int(row.class_size),
+            "rank": int(row.rank),
+            "percentile": clean(row.percentile, 0),
+            "delta": clean(row.delta),
+            "subjects": subjects.get((row.adm_no, row.term_no), []),
+        })
+    for history in result.values():
+        history.reverse()
+    return result
+
+
+class ScoreAnalytics:
+    """Read-through cache of compute_analytics(), rebuilt when scores_meta.version moves."""
+
+    def __init__(self, database, classes, check_interval: float = 5.0):
+        """``classes()`` returns {adm_no: class} for the current roster."""
+        self.database = database
+        self.classes = classes
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._version = None
+        self._data = {}
+        self._checked = False
+        self._last_check = 0.0
+
+    def _current_version(self):
+        row = self.database.query_one("SELECT version FROM scores_meta WHERE id=1")
+        return row[0] if row else None
+
+    def invalidate(self):
+        self._checked = False
+        self._version = None
+
+    def refresh(self, force: bool = False) -> bool:
+        """Rebuild if scores_meta.version moved (checked every check_interval); True if rebuilt."""
+        now = time.monotonic()
+        if not force and self._checked and now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+        self._checked = True
+        version = self._current_version()
+        if version == self._version and not force:
+            return False
+        with self._lock:
+            if version == self._version and not force:
+                return False
+            if version is None:
+                self._data = {}
+            else:
+                import pandas as pd
+
+                rows = self.database.query("SELECT adm_no, term, subject, score FROM scores")
+                frame = pd.DataFrame(rows, columns=["adm_no", "term", "subject", "score"])
+                frame["score"] = frame["score"].astype(float)
+                self._data = compute_analytics(frame, self.classes())
+            self._version = version
+            return True
+
+    def history(self, adm_no: str) -> list:
+        """Term summaries for one student, newest first ([] if none)."""
+        rebuilt = self.refresh()
+        CACHE_REQUESTS.inc(cache="score_analytics", result="miss" if rebuilt else "hit")
+        return self._data.get(adm_no, [])
+
+    def latest(self, adm_no: str):
+        history = self.history(adm_no)
+        return history[0] if history else None
+
+
+def main(argv=None):
+    from database import Database
+    from migrations import migrate
+    from response_cache import invalidate_pages
+    from static_snapshot import StaticSnapshot
+
+    parser = argparse.ArgumentParser(description="Import exam scores.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="upsert a CSV/Excel score sheet")
+    imp.add_argument("path")
+    imp.add_argument("--dry-run", action="store_true", help="validate and report without writing")
+    args = parser.parse_args(argv)
+
+    db_path = os.getenv("DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "students.db"))
+    database = Database(os.getenv("DATABASE_URL", f"sqlite:///{db_path}"))
+    migrate(database)  # the same versioned schema the app creates
+    with database.connection():
+        known = [row[0] for row in database.query("SELECT adm_no FROM roster")] or None
+    report = ingest_scores(database, args.path, known_students=known, dry_run=args.dry_run)
+    if not report["dry_run"]:
+        # Running workers pick up the new analytics from scores_meta.version;
+        # the pages they rendered from the old scores go the same way
+        invalidate_pages(database)
+        if os.getenv("STATIC_SNAPSHOT_DIR"):
+            StaticSnapshot(os.getenv("STATIC_SNAPSHOT_DIR")).clear()
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
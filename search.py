@@ -0,0 +1,249 @@
+# search.py
+"""In-memory student search: inverted index + trigram fuzzy matching.
+
+Works the same on SQLite and Postgres because it indexes the roster rows
+and biographies the app already holds, instead of relying on FTS5.
+
+    index = SearchIndex()
+    index.rebuild(students_data, bios)         # on roster load
+    index.update(adm_no, row, bio)             # after a bio edit
+    index.search("the Masinde boy in Kakamega", limit=10)
+
+Every query word is matched exactly, then by prefix (for typeahead), then
+by trigram similarity (for typos such as "Kakamenga").  Documents are
+ranked first by how many query words they matched, then by a field-weighted
+TF-IDF score.
+"""
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+# Roster column -> weight.  Names and admission numbers dominate; free text
+# (biography) only breaks ties.
+FIELD_WEIGHTS = {
+    "Admission Number": 8.0,
+    "Full Name": 5.0,
+    "Parent/Guardian Name": 3.0,
+    "Place of Residence": 2.0,
+    "school": 2.0,
+    "career": 2.0,
+    "Department": 1.5,
+    "Class": 1.0,
+    "Small Biography": 0.5,
+}
+
+STOPWORDS = frozenset("a an and at from in of on the to with who is".split())
+
+# "the Masinde boy" -> match on the Sex column rather than the word "boy"
+SEX_SYNONYMS = {
+    "boy": "sex:m", "boys": "sex:m", "male": "sex:m", "son": "sex:m",
+    "girl": "sex:f", "girls": "sex:f", "female": "sex:f", "daughter": "sex:f",
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+MIN_SIMILARITY = 0.45
+MAX_EXPANSIONS = 6
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text: str):
+    return TOKEN_RE.findall(normalize(text))
+
+
+def trigrams(term: str):
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)  # term -> {adm_no: weight}
+        self._doc_terms = {}                # adm_no -> {term: weight}
+        self._docs = {}                     # adm_no -> summary dict for results
+        self._grams = defaultdict(set)      # trigram -> {term}
+        self._gram_counts = {}              # term -> len(trigrams(term))
+        self._vocab = []                    # sorted terms, for prefix lookups
+        self._vocab_dirty = False
+
+    # ------------------------------------------------------------------
+    # Indexing
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _doc_weights(row: dict, bio: str = None) -> dict:
+        weights = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            value = bio if field == "Small Biography" and bio else row.get(field)
+            for term in tokenize(value):
+                weights[term] += weight
+        sex = (row.get("Sex") or "").strip().lower()[:1]
+        if sex in ("m", "f"):
+            weights[f"sex:{sex}"] += 1.0
+        return dict(weights)
+
+    def _add(self, adm_no: str, terms: dict):
+        self._doc_terms[adm_no] = terms
+        for term, weight in terms.items():
+            postings = self._postings[term]
+            if not postings:
+                grams = trigrams(term)
+                for gram in grams:
+                    self._grams[gram].add(term)
+                self._gram_counts[term] = len(grams)
+                self._vocab_dirty = True
+            postings[adm_no] = weight
+
+    def _remove(self, adm_no: str):
+        for term in self._doc_terms.pop(adm_no, {}):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(adm_no, None)
+            if not postings:
+                del self._postings[term]
+                del self._gram_counts[term]
+                for gram in trigrams(term):
+                    self._grams[gram].discard(term)
+                self._vocab_dirty = True
+
+    def rebuild(self, students: dict, bios: dict = None):
+        bios = bios or {}
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._docs.clear()
+            self._grams.clear()
+            self._gram_counts.clear()
+            for adm_no, row in students.items():
+                self._docs[adm_no] = self._summary(adm_no, row)
+                self._add(adm_no, self._doc_weights(row, bios.get(adm_no)))
+            self._vocab_dirty = True
+
+    def update(self, adm_no: str, row: dict, bio: str = None):
+        """Re-index one student (e.g. after update_bio) without touching the rest."""
+        with self._lock:
+            self._remove(adm_no)
+            self._docs[adm_no] = self._summary(adm_no, row)
+            self._add(adm_no, self._doc_weights(row, bio))
+
+    def remove(self, adm_no: str):
+        with self._lock:
+            self._remove(adm_no)
+            self._docs.pop(adm_no, None)
+
+    @staticmethod
+    def _summary(adm_no: str, row: dict) -> dict:
+        return {
+            "adm_no": adm_no,
+            "name": row.get("Full Name") or "",
+            "department": row.get("Department") or "",
+            "class": row.get("Class") or "",
+            "school": row.get("school") or "",
+            "residence": row.get("Place of Residence") or "",
+        }
+
+    def __len__(self):
+        return len(self._docs)
+
+    # ------------------------------------------------------------------
+    # Querying
+    # ------------------------------------------------------------------
+    def _vocabulary(self):
+        if self._vocab_dirty:
+            self._vocab = sorted(self._postings)
+            self._vocab_dirty = False
+        return self._vocab
+
+    def _expand(self, word: str, prefix: bool):
+        """[(term, similarity)] that ``word`` should match."""
+        if word in self._postings:
+            matches = [(word, 1.0)]
+        else:
+            matches = []
+        if prefix and len(word) >= 2:
+            vocab = self._vocabulary()
+            i = bisect_left(vocab, word)
+            while i < len(vocab) and vocab[i].startswith(word) and len(matches) < MAX_EXPANSIONS * 2:
+                if vocab[i] != word:
+                    matches.append((vocab[i], 0.9))
+                i += 1
+        if matches or len(word) < 3:
+            return matches
+        # Trigram (Jaccard) similarity for typos and alternative spellings
+        grams = trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            for term in self._grams.get(gram, ()):
+                shared[term] += 1
+        scored, n_grams, gram_counts = [], len(grams), self._gram_counts
+        for term, common in shared.items():
+            similarity = common / (n_grams + gram_counts[term] - common)
+            if similarity >= MIN_SIMILARITY:
+                scored.append((term, similarity))
+        scored.sort(key=lambda ts: -ts[1])
+        return scored[:MAX_EXPANSIONS]
+
+    def search(self, query: str, limit: int = 10, department: str = None, prefix: bool = True):
+        """Ranked [{adm_no, name, ..., score, matched}] for ``query``.
+
+        ``prefix`` lets the last word match as a prefix, for typeahead.
+        """
+        words = [w for w in tokenize(query) if w not in STOPWORDS]
+        if not words:
+            return []
+        department = (department or "").strip().lower()
+        with self._lock:
+            n_docs = max(len(self._docs), 1)
+            per_word = []
+            for i, word in enumerate(words):
+                if word in SEX_SYNONYMS:
+                    expansions = [(SEX_SYNONYMS[word], 1.0)]
+                else:
+                    expansions = self._expand(word, prefix=prefix and i == len(words) - 1)
+                best = {}
+                for term, similarity in expansions:
+                    postings = self._postings.get(term, {})
+                    factor = math.log(1 + n_docs / (1 + len(postings))) * similarity
+                    if not best:
+                        best = {adm_no: weight * factor for adm_no, weight in postings.items()}
+                        continue
+                    for adm_no, weight in postings.items():
+                        score = weight * factor
+                        if score > best.get(adm_no, 0.0):
+                            best[adm_no] = score
+                per_word.append(best)
+
+            # Documents matching more query words always rank higher, so only
+            # the best coverage tiers that can fill ``limit`` need scoring
+            coverage = Counter()
+            for best in per_word:
+                coverage.update(best.keys())
+            if department:
+                coverage = Counter({
+                    adm_no: n for adm_no, n in coverage.items()
+                    if self._docs.get(adm_no, {}).get("department", "").strip().lower() == department
+                })
+            tiers = defaultdict(list)
+            for adm_no, n in coverage.items():
+                tiers[n].append(adm_no)
+
+            results = []
+            for n in sorted(tiers, reverse=True):
+                if len(per_word) == 1:
+                    only = per_word[0]
+                    scored = [(only[adm_no], adm_no) for adm_no in tiers[n]]
+                else:
+                    scored = [(sum(best.get(adm_no, 0.0) for best in per_word), adm_no) for adm_no in tiers[n]]
+                for score, adm_no in heapq.nsmallest(limit - len(results), scored, key=lambda sa: (-sa[0], sa[1])):
+                    results.append(dict(self._docs[adm_no], score=round(score, 3), matched=n))
+                if len(results) >= limit:
+                    break
+            return results
@@ -0,0 +1,256 @@
+# static_snapshot.py
+"""Pre-rendered copies of the public read-only pages.
+
+The home, about and departments pages, each department page, every
+student profile and the department chart only change when the roster, a
+biography, a student's result uploads or their scores change, yet each hit
+renders them again.  ``build`` renders them once into an output directory
+that a static host can serve as-is (``/profile/GER001`` ->
+``profile/GER001.html``, ``/`` -> ``index.html``; ``static/`` is copied
+alongside), or that the app serves itself with ``send_file`` when
+STATIC_SNAPSHOT_DIR points at it, so Flask only renders what isn't there.
+
+Builds are incremental.  For every page the app lists a digest of what
+the page is rendered from (its roster row and photo variants, biography,
+result upload ids, latest scores, and the templates); ``manifest.json`` in
+the output directory keeps the digest each file was rendered with, and a
+page is re-rendered only when its digest moved.  The app retires a page's
+file (moves it under ``.retired/``) as soon as a write touches it, so it
+falls back to live rendering until the next build; that build puts the
+file back untouched if the page's digest turned out not to move (e.g. a
+gallery upload, which profiles don't show), and renders it otherwise.
+
+    python static_snapshot.py build               # only pages whose inputs changed
+    python static_snapshot.py build --force       # everything (after changing view code)
+    python static_snapshot.py build --out /data/site
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+MANIFEST_NAME = "manifest.json"
+# Invalidated pages wait here for the next build to restore or replace them
+RETIRED_DIRNAME = ".retired"
+# Set on the WSGI environ of the build's own requests, so the app renders
+# them instead of answering from the snapshot being rebuilt
+BUILD_ENVIRON_KEY = "static_snapshot.build"
+
+
+def page_file(url_path: str):
+    """Relative output file for a URL path, or None if it can't be one."""
+    parts = [part for part in url_path.split("/") if part]
+    if any(part.startswith(".") or "\\" in part for part in parts):
+        return None
+    if not parts:
+        return "index.html"
+    if os.path.splitext(parts[-1])[1]:
+        return os.path.join(*parts)  # e.g. students_chart.png
+    return os.path.join(*parts) + ".html"
+
+
+def digest(*inputs) -> str:
+    """Stable hash of JSON-able inputs (dates etc. via str())."""
+    raw = json.dumps(inputs, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def files_digest(*paths) -> str:
+    """Hash of every file under ``paths`` (directories walked; missing paths count as empty)."""
+    h = hashlib.sha256()
+    for root in paths:
+        files = [root] if os.path.isfile(root) else sorted(
+            os.path.join(d, name) for d, _, names in os.walk(root) for name in names
+        )
+        for path in files:
+            h.update(os.path.relpath(path, root).encode("utf-8"))
+            with open(path, "rb") as f:
+                h.update(hashlib.sha256(f.read()).digest())
+    return h.hexdigest()[:32]
+
+
+def sync_tree(source: str, target: str) -> int:
+    """Copy files that are new or changed (size/mtime) from ``source`` to ``target``; returns the count."""
+    copied = 0
+    for directory, _, names in os.walk(source):
+        out_dir = os.path.join(target, os.path.relpath(directory, source))
+        for name in names:
+            src, dst = os.path.join(directory, name), os.path.join(out_dir, name)
+            st = os.stat(src)
+            try:
+                dst_st = os.stat(dst)
+                if dst_st.st_size == st.st_size and int(dst_st.st_mtime) == int(st.st_mtime):
+                    continue
+            except FileNotFoundError:
+                pass
+            os.makedirs(out_dir, exist_ok=True)
+            shutil.copy2(src, dst)
+            copied += 1
+    return copied
+
+
+class StaticSnapshot:
+    def __init__(self, out_dir: str):
+        self.out_dir = os.path.abspath(out_dir)
+        self.manifest_path = os.path.join(self.out_dir, MANIFEST_NAME)
+        self.retired_dir = os.path.join(self.out_dir, RETIRED_DIRNAME)
+
+    def path_for(self, url_path: str):
+        """File to serve for ``url_path`` if the snapshot has it."""
+        rel = page_file(url_path)
+        if rel is None:
+            return None
+        path = os.path.join(self.out_dir, rel)
+        return path if os.path.isfile(path) else None
+
+    def invalidate(self, url_paths):
+        """Retire these pages' files; they're served live until the next build."""
+        for url_path in url_paths:
+            rel = page_file(url_path)
+            if rel is None:
+                continue
+            path, retired = os.path.join(self.out_dir, rel), os.path.join(self.retired_dir, rel)
+            if not os.path.isfile(path):
+                continue
+            os.makedirs(os.path.dirname(retired), exist_ok=True)
+            try:
+                os.replace(path, retired)
+            except FileNotFoundError:
+                continue  # another worker retired it first
+            os.utime(retired)  # when it was retired, see build()
+
+    def clear(self):
+        self.invalidate(self.load_manifest().get("pages", {}))
+
+    def _restore(self, rel: str, since: float) -> bool:
+        """Put a retired file back if it was retired before ``since``."""
+        retired = os.path.join(self.retired_dir, rel)
+        try:
+            if os.stat(retired).st_mtime >= since:
+                return False  # retired by a write the build's digests may not include
+            os.replace(retired, os.path.join(self.out_dir, rel))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _delete(self, rel: str, retired_only: bool = False):
+        paths = [os.path.join(self.retired_dir, rel)]
+        if not retired_only:
+            paths.append(os.path.join(self.out_dir, rel))
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def load_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest: dict):
+        os.makedirs(self.out_dir, exist_ok=True)
+        tmp = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def _write(self, rel: str, data: bytes):
+        path = os.path.join(self.out_dir, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)  # a reader never sees half a page
+
+    def build(self, pages: dict, render, force: bool = False, since: float = None) -> dict:
+        """Render stale pages.
+
+        ``pages`` maps URL path -> input digest, as of ``since`` (default:
+        now); ``render(url_path)`` returns the body, or None if the page
+        can't be pre-rendered (left live).  A retired page whose digest
+        didn't move is restored instead of rendered, unless it was retired
+        after ``since``.  Pages no longer listed are deleted.
+        """
+        since = time.time() if since is None else since
+        old = self.load_manifest().get("pages", {})
+        entries, rendered, restored, failed = {}, [], [], []
+        for url_path, inputs in pages.items():
+            rel = page_file(url_path)
+            if rel is None:
+                continue
+            entry = old.get(url_path)
+            if not force and entry and entry.get("inputs") == inputs:
+                if os.path.isfile(os.path.join(self.out_dir, rel)):
+                    entries[url_path] = entry
+                    continue
+                if self._restore(rel, since):
+                    entries[url_path] = entry
+                    restored.append(url_path)
+                    continue
+            body = render(url_path)
+            if body is None:
+                failed.append(url_path)
+                continue
+            self._write(rel, body)
+            self._delete(rel, retired_only=True)
+            entries[url_path] = {"inputs": inputs, "file": rel.replace(os.sep, "/"), "built_at": time.time()}
+            rendered.append(url_path)
+        removed = [url_path for url_path in old if url_path not in pages]
+        for url_path in removed:
+            rel = page_file(url_path)
+            if rel:
+                self._delete(rel)
+        self._save_manifest({"pages": entries})
+        return {
+            "rendered": len(rendered),
+            "restored": len(restored),
+            "unchanged": len(entries) - len(rendered) - len(restored),
+            "removed": removed,
+            "failed": failed,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-render the public read-only pages.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="render pages whose inputs changed")
+    build.add_argument("--force", action="store_true", help="re-render every page")
+    build.add_argument("--out", default=None, help="output directory (default: STATIC_SNAPSHOT_DIR or ./static_site)")
+    build.add_argument("--no-assets", action="store_true", help="don't copy static/ into the output")
+    args = parser.parse_args(argv)
+
+    # The app module carries the roster, biographies and templates
+    from app import BASE_DIR, STATIC_SNAPSHOT_DIR, app, derivatives, snapshot_pages
+
+    snapshot = StaticSnapshot(args.out or STATIC_SNAPSHOT_DIR or os.path.join(BASE_DIR, "static_site"))
+    client = app.test_client()
+    # Pages link to the photo variants; the app only queues missing ones in
+    # the background, so encode them now or the pages would get originals
+    derivatives.build(jobs=os.cpu_count() or 1)
+
+    def render(url_path):
+        resp = client.get(url_path, environ_overrides={BUILD_ENVIRON_KEY: True})
+        return resp.get_data() if resp.status_code == 200 else None
+
+    started = time.perf_counter()
+    since = time.time()  # a page retired after this may have inputs the digests missed
+    with app.test_request_context():
+        pages = snapshot_pages()
+    report = snapshot.build(pages, render, force=args.force, since=since)
+    if not args.no_assets:
+        # Static hosts need the assets the pages link to
+        report["assets_copied"] = sync_tree(os.path.join(BASE_DIR, "static"), os.path.join(snapshot.out_dir, "static"))
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    print(json.dumps(report, indent=2))
+    print(f"✅ Snapshot in {snapshot.out_dir}")
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
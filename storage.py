@@ -0,0 +1,281 @@
+# storage.py
+"""Storage backends for uploaded files (gallery photos, result slips, letters).
+
+Every backend exposes the same calls the portal needs:
+
+    upload(path, folder, resource_type="image") -> {"url": ..., "public_id": ...}
+    destroy(public_id, resource_type="image")
+    destroy_many(public_ids, resource_type="image") -> {public_ids now gone}
+    list(prefix, resource_type="image") -> iter of (public_id, created_at epoch)
+
+``CloudinaryStorage`` is what production uses.  ``LocalStorage`` keeps
+files on a local disk (e.g. the Render ``/data`` disk) and the app serves
+them itself.  ``MemoryStorage`` is an in-process stand-in with the same
+contract, for tests (``STORAGE_BACKEND=memory``).
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# Cloudinary's Admin API deletes at most this many public_ids per call
+DESTROY_BATCH = 100
+
+# Read/write size for LocalStorage copies and hashing
+CHUNK_SIZE = 1 << 20
+
+
+class StorageError(Exception):
+    pass
+
+
+class CloudinaryStorage:
+    name = "cloudinary"
+
+    def __init__(self, cloud_name: str = None, api_key: str = None, api_secret: str = None):
+        self._credentials = {"cloud_name": cloud_name, "api_key": api_key, "api_secret": api_secret}
+        self._configured = False
+
+    def _configure(self):
+        # Deferred so importing the app never loads the SDK or needs credentials
+        if not self._configured:
+            import cloudinary
+
+            cloudinary.config(secure=True, **{k: v for k, v in self._credentials.items() if v})
+            self._configured = True
+
+    def upload(self, path: str, folder: str, resource_type: str = "image") -> dict:
+        self._configure()
+        import cloudinary.uploader
+
+        result = cloudinary.uploader.upload(path, folder=folder, resource_type=resource_type)
+        if not result.get("public_id"):
+            raise StorageError(f"Cloudinary returned no public_id for {path}")
+        return {"url": result.get("secure_url", ""), "public_id": result["public_id"]}
+
+    def destroy(self, public_id: str, resource_type: str = "image"):
+        self._configure()
+        import cloudinary.uploader
+
+        cloudinary.uploader.destroy(public_id, resource_type=resource_type)
+
+    def destroy_many(self, public_ids, resource_type: str = "image") -> set:
+        self._configure()
+        import cloudinary.api
+
+        public_ids = list(public_ids)
+        gone = set()
+        for i in range(0, len(public_ids), DESTROY_BATCH):
+            result = cloudinary.api.delete_resources(public_ids[i:i + DESTROY_BATCH], resource_type=resource_type)
+            # "not_found" counts as gone: the asset was already deleted
+            gone.update(pid for pid, state in result.get("deleted", {}).items() if state in ("deleted", "not_found"))
+        return gone
+
+    def list(self, prefix: str, resource_type: str = "image"):
+        self._configure()
+        import cloudinary.api
+
+        next_cursor = None
+        while True:
+            params = {"type": "upload", "resource_type": resource_type, "prefix": prefix, "max_results": 500}
+            if next_cursor:
+                params["next_cursor"] = next_cursor
+            page = cloudinary.api.resources(**params)
+            for resource in page.get("resources", []):
+                created = resource.get("created_at")
+                created = datetime.fromisoformat(created.replace("Z", "+00:00")).timestamp() if created else 0.0
+                yield resource["public_id"], created
+            next_cursor = page.get("next_cursor")
+            if not next_cursor:
+                break
+
+
+class LocalStorage:
+    """Content-addressed files under ``root``, served by the app at ``base_url``.
+
+    Bytes live once in ``objects/<sha[:2]>/<sha><ext>``; each upload is a
+    hard link to that blob at ``files/<resource_type>/<public_id>``, where
+    the public_id embeds the hash.  The same photo uploaded again (by any
+    student) costs no extra disk, and a blob disappears with its last link.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str, base_url: str = "/files/"):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/") + "/"
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.files_dir = os.path.join(self.root, "files")
+
+    def _file_path(self, public_id: str, resource_type: str = "image"):
+        """Filesystem path for a public_id, or None if it would escape the store."""
+        base = os.path.join(self.files_dir, resource_type)
+        path = os.path.abspath(os.path.join(base, public_id))
+        if resource_type not in ("image", "raw") or not path.startswith(base + os.sep):
+            return None
+        return path
+
+    def _store_blob(self, path: str, ext: str) -> str:
+        """Copy ``path`` into objects/ in chunks while hashing; returns the hex digest."""
+        os.makedirs(self.objects_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=self.objects_dir, suffix=".part")
+        try:
+            with open(path, "rb") as src, os.fdopen(fd, "wb") as dst:
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    dst.write(chunk)
+            sha = digest.hexdigest()
+            blob = os.path.join(self.objects_dir, sha[:2], sha + ext)
+            if os.path.exists(blob):
+                os.remove(tmp)  # already stored once
+            else:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                os.replace(tmp, blob)
+            return sha
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def blob_path(self, public_id: str, resource_type: str = "image"):
+        path = self._file_path(public_id, resource_type)
+        return path if path and os.path.isfile(path) else None
+
+    def upload(self, path: str, folder: str, resource_type: str = "image") -> dict:
+        ext = os.path.splitext(path)[1].lower()
+        sha = self._store_blob(path, ext)
+        blob = os.path.join(self.objects_dir, sha[:2], sha + ext)
+        public_id = f"{folder.strip('/')}/{sha[:32]}{ext}"
+        target = self._file_path(public_id, resource_type)
+        if target is None:
+            raise StorageError(f"Invalid folder {folder!r}")
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                os.link(blob, target)
+            except FileExistsError:
+                pass
+            except OSError as ex:
+                # A copy would leak its blob: destroy() counts links to know the last one went
+                if os.stat(blob).st_nlink == 1:
+                    os.remove(blob)
+                raise StorageError(f"LocalStorage needs a filesystem with hard links under {self.root}: {ex}") from ex
+        return {"url": f"{self.base_url}{resource_type}/{public_id}", "public_id": public_id}
+
+    def destroy(self, public_id: str, resource_type: str = "image"):
+        path = self._file_path(public_id, resource_type)
+        if path is None:
+            return
+        try:
+            st = os.stat(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        if st.st_nlink == 2:
+            # Only the blob itself is left: drop it too
+            sha_ext = os.path.basename(path)
+            for blob in self._blobs_for(sha_ext):
+                if os.stat(blob).st_ino == st.st_ino:
+                    os.remove(blob)
+
+    def _blobs_for(self, name: str):
+        directory = os.path.join(self.objects_dir, name[:2])
+        try:
+            candidates = os.listdir(directory)
+        except FileNotFoundError:
+            return []
+        stem, ext = os.path.splitext(name)
+        return [os.path.join(directory, c) for c in candidates if c.startswith(stem) and c.endswith(ext)]
+
+    def destroy_many(self, public_ids, resource_type: str = "image") -> set:
+        public_ids = list(public_ids)
+        for public_id in public_ids:
+            self.destroy(public_id, resource_type=resource_type)
+        return set(public_ids)
+
+    def list(self, prefix: str, resource_type: str = "image"):
+        base = os.path.join(self.files_dir, resource_type)
+        start = os.path.join(base, os.path.dirname(prefix))
+        for dirpath, _, filenames in os.walk(start):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                public_id = os.path.relpath(path, base).replace(os.sep, "/")
+                if public_id.startswith(prefix):
+                    # ctime changes when the link is created; mtime is the shared blob's
+                    yield public_id, os.stat(path).st_ctime
+
+
+class MemoryStorage:
+    """Keeps uploaded bytes in a dict; ``fail_next`` injects transient errors."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.objects = {}
+        self.created = {}
+        self.fail_next = 0
+        self.calls = []
+
+    def _maybe_fail(self):
+        with self._lock:
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                raise StorageError("injected failure")
+
+    def upload(self, path: str, folder: str, resource_type: str = "image") -> dict:
+        self.calls.append(("upload", path, folder, resource_type))
+        self._maybe_fail()
+        public_id = f"{folder.rstrip('/')}/{uuid.uuid4().hex}"
+        with open(path, "rb") as f:
+            data = f.read()
+        with self._lock:
+            self.objects[public_id] = (resource_type, data)
+            self.created[public_id] = time.time()
+        return {"url": f"memory://{public_id}", "public_id": public_id}
+
+    def destroy(self, public_id: str, resource_type: str = "image"):
+        self.calls.append(("destroy", public_id, resource_type))
+        self._maybe_fail()
+        with self._lock:
+            self.objects.pop(public_id, None)
+            self.created.pop(public_id, None)
+
+    def destroy_many(self, public_ids, resource_type: str = "image") -> set:
+        public_ids = list(public_ids)
+        self.calls.append(("destroy_many", tuple(public_ids), resource_type))
+        self._maybe_fail()
+        with self._lock:
+            for public_id in public_ids:
+                if self.objects.get(public_id, (resource_type,))[0] == resource_type:
+                    self.objects.pop(public_id, None)
+                    self.created.pop(public_id, None)
+        return set(public_ids)
+
+    def list(self, prefix: str, resource_type: str = "image"):
+        with self._lock:
+            items = [
+                (public_id, self.created.get(public_id, 0.0))
+                for public_id, (rtype, _) in self.objects.items()
+                if rtype == resource_type and public_id.startswith(prefix)
+            ]
+        return iter(sorted(items))
+
+
+BACKENDS = {
+    "cloudinary": CloudinaryStorage,
+    "local": LocalStorage,
+    "memory": MemoryStorage,
+}
+
+
+def create_storage(name: str, **options):
+    try:
+        backend = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown STORAGE_BACKEND {name!r}; expected one of {sorted(BACKENDS)}") from None
+    return backend(**options)
@@ -0,0 +1,154 @@
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# app.py reads its settings at import time: point everything it writes at a
+# scratch directory and use the in-repo local storage backend
+_SCRATCH = tempfile.mkdtemp(prefix="daisy-tests-")
+for key, value in {
+    "DB_PATH": os.path.join(_SCRATCH, "app.db"),
+    "STORAGE_BACKEND": "local",
+    "STORAGE_ROOT": os.path.join(_SCRATCH, "uploads"),
+    "UPLOAD_SPOOL_DIR": os.path.join(_SCRATCH, "spool"),
+    "CHART_CACHE_DIR": os.path.join(_SCRATCH, "charts"),
+    "STARTUP_LOCK": os.path.join(_SCRATCH, "startup.lock"),
+    "STUDENTS_CSV": os.path.join(ROOT, "students.csv"),
+    "RESULTS_CSV": os.path.join(_SCRATCH, "results.csv"),
+    "DERIVATIVES_ON_DEMAND": "0",
+    "DELETE_INTERVAL": "3600",
+    "STORAGE_RECONCILE_INTERVAL": "0",
+    "UPLOAD_RETRIES": "2",
+    "ADMIN_TOKEN": "test-admin-token",
+    "EMAIL_FROM": "",
+    "EMAIL_PASS": "",
+    "EMAIL_TO": "",
+}.items():
+    os.environ[key] = value
+
+from database import Database  # noqa: E402
+from migrations import migrate  # noqa: E402
+
+
+@pytest.fixture
+def database(tmp_path):
+    """A fresh, migrated SQLite database."""
+    db = Database(f"sqlite:///{tmp_path / 'test.db'}")
+    migrate(db)
+    yield db
+    db.dispose()
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    import app
+
+    app.app.config["TESTING"] = True
+    yield app
+    app.upload_jobs.shutdown()
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def no_deletion_worker(app_module, monkeypatch):
+    """Leave the deletion queue to the test: soft deletes don't wake the worker."""
+    monkeypatch.setattr(app_module.deletions, "wake", lambda: None)
+    return app_module.deletions
+
+
+def wait_for(predicate, timeout: float = 10.0, interval: float = 0.05):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = predicate()
+        if result:
+            return result
+        time.sleep(interval)
+    raise AssertionError("timed out waiting for condition")
+
+
+@pytest.fixture
+def wait_for_job():
+    def wait(jobs, job_id, timeout: float = 10.0):
+        def finished():
+            status = jobs.status(job_id)
+            return status if status and status["status"] in ("done", "failed") else None
+        return wait_for(finished, timeout=timeout)
+    return wait
+
+
+class SmtpStandIn(socketserver.ThreadingTCPServer):
+    """Just enough SMTP to accept mail; ``fail_next``/``reject_next``/``drop_next`` script the replies."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SmtpStandInHandler)
+        self.connections = 0
+        self.messages = []
+        self.fail_next = 0    # 451 after DATA (transient)
+        self.reject_next = 0  # 554 after DATA (permanent)
+        self.drop_next = 0    # hang up after DATA
+
+
+class SmtpStandInHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply("220 stand-in")
+        data = None
+        for raw in self.rfile:
+            line = raw.decode().rstrip("\r\n")
+            if data is not None:
+                if line != ".":
+                    data.append(line)
+                    continue
+                if server.drop_next:
+                    server.drop_next -= 1
+                    return
+                if server.fail_next:
+                    server.fail_next -= 1
+                    self.reply("451 try again later")
+                elif server.reject_next:
+                    server.reject_next -= 1
+                    self.reply("554 rejected")
+                else:
+                    server.messages.append("\n".join(data))
+                    self.reply("250 queued")
+                data = None
+                continue
+            command = line.upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 stand-in")
+            elif command == "DATA":
+                data = []
+                self.reply("354 end with .")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+
+@pytest.fixture
+def smtp_server():
+    server = SmtpStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
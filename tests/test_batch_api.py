@@ -0,0 +1,109 @@
+import json
+
+import batch
+from batch import fetch_uploads, in_chunks, parse_fields
+
+ADMIN = {"X-Admin-Token": "test-admin-token"}
+
+
+def test_batch_biography_falls_back_to_roster_text(app_module, client):
+    bios = app_module.get_all_bios()
+    adm_no, student = next(
+        (adm_no, student) for adm_no, student in app_module.students_data.items()
+        if student.get("Small Biography") and not bios.get(adm_no)
+    )
+    resp = client.get(f"/api/students/batch?adm_no={adm_no}&fields=biography")
+    assert resp.status_code == 200
+    (record,) = resp.get_json()["students"]
+    assert record["biography"] == student["Small Biography"]
+
+
+def test_field_selection(app_module, client):
+    adm_no = sorted(app_module.students_data)[0]
+    resp = client.post("/api/students/batch", json={"adm_nos": [adm_no.lower()], "fields": "name,class,uploads.letter"})
+    (record,) = resp.get_json()["students"]
+    assert set(record) == {"adm_no", "url", "name", "class", "uploads"}
+    assert record["name"] == app_module.students_data[adm_no]["Full Name"]
+    assert set(record["uploads"]) == {"letter"}
+
+    assert parse_fields(None).biography and parse_fields("uploads").kinds == ("gallery", "result", "letter")
+    resp = client.get(f"/api/students/batch?adm_no={adm_no}&fields=name,password")
+    assert resp.status_code == 400 and "password" in resp.get_json()["error"]
+
+
+def test_large_batches_take_one_uploads_query_per_chunk(app_module, client, monkeypatch):
+    calls = []
+
+    def counting(database, adm_nos, kinds, limit=None):
+        calls.append(len(adm_nos))
+        return fetch_uploads(database, adm_nos, kinds, limit=limit)
+
+    monkeypatch.setattr(app_module, "fetch_uploads", counting)
+    known = sorted(app_module.students_data)
+    adm_nos = [f"NOPE{i:03}" for i in range(450 - len(known))] + known
+    resp = client.post("/api/students/batch", json={"adm_nos": adm_nos, "fields": "name,uploads"})
+    body = resp.get_json()
+    assert len(calls) == 3 and sum(calls) == len(known)
+    assert [len(chunk) for chunk in in_chunks(adm_nos)] == [batch.CHUNK_SIZE, batch.CHUNK_SIZE, 50]
+    assert [record["adm_no"] for record in body["students"]] == known  # request order
+    assert len(body["missing"]) == 450 - len(known)
+
+
+def test_fetch_uploads_keeps_the_newest_per_student_and_kind(database):
+    rows = [
+        ("A1", "gallery", "2026-01-01 00:00:00", None), ("A1", "gallery", "2026-01-03 00:00:00", None),
+        ("A1", "gallery", "2026-01-02 00:00:00", None), ("A1", "gallery", "2026-01-04 00:00:00", "2026-02-01 00:00:00"),
+        ("A1", "letter", "2026-01-01 00:00:00", None), ("A2", "gallery", "2026-01-05 00:00:00", None),
+        ("A3", "gallery", "2026-01-06 00:00:00", None),
+    ]
+    for i, (adm_no, kind, created_at, deleted_at) in enumerate(rows):
+        database.execute(
+            "INSERT INTO uploads (adm_no, kind, url, public_id, created_at, deleted_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (adm_no, kind, f"/files/{i}", f"{kind}/{adm_no}/{i}", created_at, deleted_at),
+        )
+    grouped, more = fetch_uploads(database, ["A1", "A2"], ("gallery",), limit=2)
+    assert [str(row["created_at"]) for row in grouped["A1"]["gallery"]] == ["2026-01-03 00:00:00", "2026-01-02 00:00:00"]
+    assert [row["public_id"] for row in grouped["A2"]["gallery"]] == ["gallery/A2/5"]
+    assert more == {("A1", "gallery")}
+    assert "A3" not in grouped and "letter" not in grouped["A1"]
+
+    grouped, more = fetch_uploads(database, ["A1"], ("gallery", "letter"))
+    assert len(grouped["A1"]["gallery"]) == 3 and len(grouped["A1"]["letter"]) == 1 and not more
+
+
+def test_ndjson_streams_one_student_per_line(app_module, client):
+    first, second = sorted(app_module.students_data)[:2]
+    url = f"/api/students/batch?adm_no={second},NOPE,{first}&fields=name"
+    for path, headers in ((url + "&format=ndjson", {}), (url, {"Accept": "application/x-ndjson"})):
+        resp = client.get(path, headers=headers)
+        assert resp.mimetype == "application/x-ndjson" and resp.is_streamed
+        lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+        assert [line["adm_no"] for line in lines] == [second, "NOPE", first]
+        assert lines[1] == {"adm_no": "NOPE", "error": "Student not found"}
+
+
+def test_bulk_biographies(app_module, client):
+    first, second = sorted(app_module.students_data)[-2:]
+    assert client.post("/api/biographies", json={"biographies": {first: "x"}}).status_code == 403
+
+    payload = {"biographies": [
+        {"adm_no": first.lower(), "biography": "First bulk bio."},
+        {"adm_no": second, "biography": "Second bulk bio."},
+        {"adm_no": "NOPE", "biography": "Nobody."},
+        {"adm_no": second, "biography": ""},
+    ]}
+    dry = client.post("/api/biographies?dry_run=1", headers=ADMIN, json=payload).get_json()
+    assert (dry["updated"], dry["dry_run"]) == (2, True)
+    assert app_module.get_bio(first) != "First bulk bio."
+
+    report = client.post("/api/biographies", headers=ADMIN, json=payload).get_json()
+    assert (report["updated"], report["unchanged"]) == (2, 0)
+    assert report["skipped"] == [
+        {"adm_no": "NOPE", "reason": "Student not found"}, {"adm_no": second, "reason": "Missing data"},
+    ]
+    assert (app_module.get_bio(first), app_module.get_bio(second)) == ("First bulk bio.", "Second bulk bio.")
+
+    again = client.post("/api/biographies", headers=ADMIN,
+                        json={"biographies": {first: "First bulk bio.", second: "Edited."}}).get_json()
+    assert (again["updated"], again["unchanged"]) == (1, 1)
+    assert again["version"] > report["version"]
@@ -0,0 +1,25 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from stats import percentile, regressions, summarize  # noqa: E402
+
+
+def test_summary_uses_nearest_rank_percentiles_in_ms():
+    summary = summarize([i / 1000 for i in range(1, 101)])
+    assert (summary["count"], summary["p50"], summary["p90"], summary["p99"], summary["max"]) == (100, 50, 90, 99, 100)
+    assert summary["mean"] == 50.5
+    assert summarize([]) == {"count": 0}
+    assert percentile([], 50) == 0.0
+
+
+def test_regressions_respect_direction_and_threshold():
+    baseline = {"profile": {"p99": 10.0, "rps": 200.0, "count": 5}, "gone": {"p99": 1.0}}
+    report = {"profile": {"p99": 12.5, "rps": 150.0, "count": 50}, "new": {"p99": 99.0}}
+    keys = {"p99": "lower", "rps": "higher"}
+    assert regressions(report, baseline, keys, threshold=1.2) == [
+        "profile.p99: 10.000 -> 12.500 (1.25x worse)",
+        "profile.rps: 200.000 -> 150.000 (1.33x worse)",
+    ]
+    assert regressions(report, baseline, keys, threshold=1.5) == []
@@ -0,0 +1,49 @@
+import time
+
+from biographies import BiographyCache, upsert_biographies
+
+
+def stored(database):
+    return {adm_no: (bio, version) for adm_no, bio, version in
+            database.query("SELECT adm_no, biography, version FROM biographies")}
+
+
+def test_bulk_upsert_stamps_one_version_and_skips_unchanged_rows(database):
+    first = upsert_biographies(database, [("A1", "one"), ("A2", "two")])
+    assert stored(database) == {"A1": ("one", first), "A2": ("two", first)}
+
+    second = upsert_biographies(database, [("A1", "one"), ("A2", "two, edited"), ("A3", "three")])
+    assert second == first + 1
+    assert stored(database) == {"A1": ("one", first), "A2": ("two, edited", second), "A3": ("three", second)}
+    assert upsert_biographies(database, []) == 0
+
+
+def test_other_workers_fetch_only_what_changed(database):
+    upsert_biographies(database, [("A1", "one"), ("A2", "two")])
+    writer, reader = BiographyCache(database), BiographyCache(database, check_interval=3600)
+    writer.load()
+    reader.load()
+    heard = []
+    reader.subscribe(heard.append)
+
+    writer.save("A2", "two, edited")
+    assert writer.get("A2") == "two, edited"
+    assert reader.get("A2") == "two"  # until it catches up
+
+    upsert_biographies(database, [("A1", ""), ("A3", "three")])
+    assert reader.refresh() == {"A2": "two, edited", "A1": "", "A3": "three"}
+    assert heard == [{"A2": "two, edited", "A1": "", "A3": "three"}]
+    assert reader.all() == {"A2": "two, edited", "A3": "three"}
+    assert reader.refresh() == {} and len(heard) == 1
+
+
+def test_maybe_refresh_is_throttled(database):
+    cache = BiographyCache(database, check_interval=3600)
+    cache.load()
+    cache.maybe_refresh()  # checks now, then not again for an hour
+    upsert_biographies(database, [("A1", "one")])
+    cache.maybe_refresh()
+    assert cache.get("A1") is None
+    cache._last_check = time.monotonic() - 3600
+    cache.maybe_refresh()
+    assert cache.get("A1") == "one"
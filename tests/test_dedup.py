@@ -0,0 +1,114 @@
+import io
+import os
+
+import pytest
+
+from dedup import backfill, duplicate_groups, hamming, open_stored_file, perceptual_hash
+
+Image = pytest.importorskip("PIL.Image")
+ImageDraw = pytest.importorskip("PIL.ImageDraw")
+
+ADM_NO = "GER002"
+
+
+def picture(seed: int) -> Image.Image:
+    im = Image.new("RGB", (640, 480))
+    draw = ImageDraw.Draw(im)
+    for x in range(0, 640, 16):
+        draw.rectangle([x, 0, x + 15, 479], fill=((x * seed) % 256, (x * 3) % 256, (255 - x) % 256))
+    draw.ellipse([120 + seed * 20, 80, 420, 400], fill=(250, 240, 30 * seed % 256))
+    return im
+
+
+def jpeg(im: Image.Image, quality: int) -> bytes:
+    out = io.BytesIO()
+    im.save(out, "JPEG", quality=quality)
+    return out.getvalue()
+
+
+def post(client, data: bytes, filename: str):
+    resp = client.post(f"/gallery/{ADM_NO}", data={"gallery_file": (io.BytesIO(data), filename)},
+                       content_type="multipart/form-data", headers={"Accept": "application/json"})
+    return resp.get_json()["job_id"]
+
+
+def test_resent_and_reencoded_photos_are_skipped(app_module, client, wait_for_job):
+    original = picture(1)
+    first = jpeg(original, 90)
+    assert wait_for_job(app_module.upload_jobs, post(client, first, "first.jpg"))["completed"] == 1
+    before = len(app_module.get_uploads(ADM_NO, "gallery"))
+
+    # Same bytes: caught by SHA-256 before anything is spooled to storage
+    status = wait_for_job(app_module.upload_jobs, post(client, first, "again.jpg"))
+    assert (status["completed"], status["duplicates"]) == (0, 1)
+    # Same picture, different bytes (re-compressed, e.g. forwarded on a phone): caught by dHash
+    status = wait_for_job(app_module.upload_jobs, post(client, jpeg(original, 40), "forwarded.jpg"))
+    assert (status["completed"], status["duplicates"]) == (0, 1)
+    # A different picture still goes through
+    status = wait_for_job(app_module.upload_jobs, post(client, jpeg(picture(5), 90), "other.jpg"))
+    assert (status["completed"], status["duplicates"]) == (1, 0)
+    assert len(app_module.get_uploads(ADM_NO, "gallery")) == before + 1
+
+
+def test_perceptual_hash_tolerates_recompression(tmp_path):
+    paths = {}
+    for name, data in {"a": jpeg(picture(1), 90), "b": jpeg(picture(1), 40), "c": jpeg(picture(5), 90)}.items():
+        paths[name] = tmp_path / f"{name}.jpg"
+        paths[name].write_bytes(data)
+    (tmp_path / "junk.jpg").write_bytes(b"not an image")
+    a, b, c = (perceptual_hash(str(paths[name])) for name in "abc")
+    assert hamming(a, b) <= 6 < hamming(a, c)
+    assert perceptual_hash(str(tmp_path / "junk.jpg")) is None
+
+
+def test_backfill_hashes_old_rows_and_reports_duplicates(database, tmp_path):
+    from storage import LocalStorage
+
+    storage = LocalStorage(str(tmp_path / "uploads"))
+    source = tmp_path / "photo.jpg"
+    source.write_bytes(os.urandom(2048))
+    # The same file uploaded twice before hashes were recorded, under two folders
+    stored = [storage.upload(str(source), folder=folder) for folder in ("gallery/GER002/", "gallery/GER002/old/")]
+    for upload in stored:
+        database.execute(
+            "INSERT INTO uploads (adm_no, kind, url, public_id) VALUES (?, 'gallery', ?, ?)",
+            (ADM_NO, upload["url"], upload["public_id"]),
+        )
+
+    assert backfill(database, open_stored_file(storage)) == {"hashed": 2, "failed": []}
+    (group,) = duplicate_groups(database)
+    assert group["public_ids"] == [upload["public_id"] for upload in stored]
+
+
+def result_slip(term: int) -> Image.Image:
+    im = Image.new("RGB", (640, 900), "white")
+    draw = ImageDraw.Draw(im)
+    draw.rectangle([40, 40, 600, 120], fill=(20, 60, 140))
+    for row in range(10):
+        y = 180 + row * 60
+        draw.line([40, y, 600, y], fill="black", width=2)
+        draw.text((60, y + 20), f"Subject {row}", fill="black")
+        draw.text((480, y + 20), f"{(row * 7 + term * 13) % 100:>3}", fill="black")
+    draw.text((60, 820), f"Term {term}", fill="black")
+    return im
+
+
+def test_same_layout_result_slips_are_both_stored(app_module, client, wait_for_job, tmp_path):
+    first, second = jpeg(result_slip(1), 90), jpeg(result_slip(2), 90)
+    # Next term's slip for the same student: a different document, yet a near-identical dHash
+    (tmp_path / "1.jpg").write_bytes(first)
+    (tmp_path / "2.jpg").write_bytes(second)
+    assert hamming(perceptual_hash(str(tmp_path / "1.jpg")), perceptual_hash(str(tmp_path / "2.jpg"))) <= 6
+
+    def post_slip(data, filename):
+        resp = client.post(f"/upload_result_file/{ADM_NO}", data={"result_file": (io.BytesIO(data), filename)},
+                           content_type="multipart/form-data", headers={"Accept": "application/json"})
+        return wait_for_job(app_module.upload_jobs, resp.get_json()["job_id"])
+
+    before = len(app_module.get_uploads(ADM_NO, "result"))
+    assert post_slip(first, "term1.jpg")["completed"] == 1
+    status = post_slip(second, "term2.jpg")
+    assert (status["completed"], status["duplicates"]) == (1, 0)
+    assert len(app_module.get_uploads(ADM_NO, "result")) == before + 2
+    # Exact re-sends of a slip are still skipped
+    assert post_slip(first, "term1-again.jpg")["duplicates"] == 1
@@ -0,0 +1,146 @@
+import time
+
+import pytest
+
+from deletions import RECONCILE_LEASE, DeletionQueue
+from storage import MemoryStorage
+
+NOW = 1_000_000.0
+
+
+@pytest.fixture
+def storage():
+    return MemoryStorage()
+
+
+def make_queue(database, storage, **options):
+    queue = DeletionQueue(database, storage, backoff=5.0, lease=300.0, **options)
+    queue.wake = lambda: None  # the tests drain by hand
+    return queue
+
+
+def add_row(database, public_id, deleted=False):
+    database.execute(
+        "INSERT INTO uploads (adm_no, kind, url, public_id, deleted_at) VALUES (?, ?, ?, ?, ?)",
+        ("GER001", "gallery", f"memory://{public_id}", public_id, "2026-01-01 00:00:00" if deleted else None),
+    )
+
+
+def store(storage, public_id, created=0.0):
+    storage.objects[public_id] = ("image", b"x")
+    storage.created[public_id] = created
+
+
+def test_soft_delete_then_drain_destroys_asset_and_row(database, storage):
+    queue = make_queue(database, storage)
+    add_row(database, "gallery/GER001/a")
+    store(storage, "gallery/GER001/a")
+    assert queue.soft_delete("gallery/GER001/a", kind="gallery") == "GER001"
+    assert queue.soft_delete("gallery/GER001/a") is None  # already hidden
+    assert queue.drain(now=NOW) == {"deleted": 1, "failed": 0}
+    assert "gallery/GER001/a" not in storage.objects
+    assert database.query_one("SELECT 1 FROM uploads WHERE public_id='gallery/GER001/a'") is None
+
+
+def test_claimed_entries_are_leased_from_other_workers(database, storage):
+    first, second = make_queue(database, storage), make_queue(database, storage)
+    add_row(database, "gallery/GER001/a")
+    first.soft_delete("gallery/GER001/a")
+    assert first._claim(NOW) == [("gallery/GER001/a", "image", 0)]
+    assert second._claim(NOW) == []
+    # A worker that died mid-batch gives the entry up when the lease runs out
+    assert second._claim(NOW + 300) == [("gallery/GER001/a", "image", 0)]
+
+
+def test_failed_destroy_backs_off_exponentially(database, storage):
+    queue = make_queue(database, storage)
+    add_row(database, "gallery/GER001/a")
+    queue.soft_delete("gallery/GER001/a")
+    storage.fail_next = 2
+    started = time.time()
+    assert queue.drain() == {"deleted": 0, "failed": 1}
+    attempts, due = database.query_one("SELECT attempts, next_attempt_at FROM storage_deletions")
+    assert attempts == 1 and due >= started + 5
+
+    assert queue.drain() == {"deleted": 0, "failed": 0}  # not due yet
+    retried = time.time()
+    assert queue.drain(now=due) == {"deleted": 0, "failed": 1}
+    attempts, due = database.query_one("SELECT attempts, next_attempt_at FROM storage_deletions")
+    assert attempts == 2 and due >= retried + 10  # 5s, then 10s
+    assert queue.drain(now=due)["deleted"] == 1
+    assert queue.pending()["queued"] == 0
+
+
+def test_reconcile_repair_only_touches_upload_folders(database, storage):
+    queue = make_queue(database, storage)
+    add_row(database, "gallery/GER001/kept")
+    store(storage, "gallery/GER001/kept")
+    add_row(database, "gallery/GER001/gone")              # asset missing
+    add_row(database, "legacy/imported-result")           # outside the listed folders
+    store(storage, "letters/GER001/orphan", created=0.0)  # no row
+
+    report = queue.reconcile(repair=True)
+    assert report["missing_assets"] == ["gallery/GER001/gone"]
+    assert report["orphaned_assets"] == ["letters/GER001/orphan"]
+    remaining = {row[0] for row in database.query("SELECT public_id FROM uploads")}
+    assert remaining == {"gallery/GER001/kept", "legacy/imported-result"}
+    assert database.query_one("SELECT 1 FROM storage_deletions WHERE public_id='letters/GER001/orphan'")
+
+
+def test_reconcile_lease_lets_one_process_run_per_interval(database, storage):
+    first, second = make_queue(database, storage), make_queue(database, storage)
+    assert first.take_lease(RECONCILE_LEASE, 3600, now=NOW)
+    assert not second.take_lease(RECONCILE_LEASE, 3600, now=NOW + 10)
+    assert second.take_lease(RECONCILE_LEASE, 3600, now=NOW + 3600)
+    assert not first.take_lease(RECONCILE_LEASE, 3600, now=NOW + 3601)
+
+
+def test_reconcile_repair_reports_affected_students(database, storage):
+    queue = make_queue(database, storage)
+    heard = []
+    queue.subscribe(heard.append)
+    add_row(database, "gallery/GER001/gone")
+    assert queue.reconcile()["students"] == ["GER001"]
+    assert heard == []  # a dry run changes nothing
+    assert queue.reconcile(repair=True)["students"] == ["GER001"]
+    assert heard == [["GER001"]]
+
+
+def test_periodic_repair_invalidates_pages(app_module, client, no_deletion_worker, tmp_path):
+    adm_no = sorted(app_module.students_data)[0]
+    source = tmp_path / "letter.jpg"
+    source.write_bytes(b"not really a jpeg")
+    upload = app_module.storage.upload(str(source), folder=f"letters/{adm_no}/")
+    app_module.add_upload(adm_no, "letter", upload["url"], upload["public_id"], filename="letter.jpg")
+    assert upload["public_id"] in client.get(f"/letter/{adm_no}").get_data(as_text=True)  # now cached
+
+    app_module.storage.destroy(upload["public_id"])  # the asset vanishes behind the app's back
+    report = app_module.deletions.reconcile(repair=True)
+    assert report["students"] == [adm_no]
+    assert app_module.database.query_one(
+        "SELECT 1 FROM response_cache_scopes WHERE scope=?", (adm_no,)
+    )
+    assert upload["public_id"] not in client.get(f"/letter/{adm_no}").get_data(as_text=True)
+
+
+def test_claimed_destroy_skips_rows_revived_meanwhile(database, storage):
+    queue = make_queue(database, storage)
+    for public_id in ("gallery/GER001/revived", "gallery/GER001/stale-entry", "gallery/GER001/deleted"):
+        add_row(database, public_id)
+        store(storage, public_id)
+        queue.soft_delete(public_id)
+    batch = queue._claim(NOW)
+    assert len(batch) == 3
+
+    # While the batch is claimed, the same files are uploaded again: add_upload
+    # revives the rows and drops their entries (or, for an older revive, only the row)
+    database.execute("UPDATE uploads SET deleted_at=NULL WHERE public_id IN "
+                     "('gallery/GER001/revived', 'gallery/GER001/stale-entry')")
+    database.execute("DELETE FROM storage_deletions WHERE public_id='gallery/GER001/revived'")
+
+    assert queue._process(batch) == (1, 0)
+    assert set(storage.objects) == {"gallery/GER001/revived", "gallery/GER001/stale-entry"}
+    assert {row[0] for row in database.query("SELECT public_id FROM uploads")} == {
+        "gallery/GER001/revived", "gallery/GER001/stale-entry",
+    }
+    assert queue.pending()["queued"] == 0
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from conftest import wait_for
+from derivatives import Derivatives
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    os.makedirs(tmp_path / "images" / "GER")
+    Image.new("RGB", (800, 600), "teal").save(tmp_path / "images" / "GER" / "GER001.jpg")
+    (tmp_path / "images" / "GER" / "broken.jpg").write_bytes(b"not a jpeg")
+    return str(tmp_path)
+
+
+def url_for(endpoint, filename):
+    return f"/static/{filename}"
+
+
+def test_lookup_serves_original_and_encodes_in_background(static_dir):
+    derivatives = Derivatives(static_dir)
+    key, entry = derivatives.lookup("static/images/GER/GER001.jpg")
+    assert (key, entry) == ("images/GER/GER001.jpg", None)
+    assert 'src="/static/images/GER/GER001.jpg"' in derivatives.picture("images/GER/GER001.jpg", url_for)
+
+    entry = wait_for(lambda: derivatives.lookup("images/GER/GER001.jpg")[1])
+    assert sorted(entry["variants"]["jpeg"]) == ["160", "320", "640"]
+    assert "<picture>" in derivatives.picture("images/GER/GER001.jpg", url_for)
+
+
+def test_unreadable_photo_is_not_requeued(static_dir):
+    derivatives = Derivatives(static_dir)
+    derivatives.lookup("images/GER/broken.jpg")
+    wait_for(lambda: "images/GER/broken.jpg" in derivatives._missing)
+    derivatives.lookup("images/GER/broken.jpg")
+    assert derivatives._queue.empty()
+    assert "images/GER/broken.jpg" not in derivatives._queued
+
+
+def test_without_on_demand_only_build_encodes(static_dir):
+    derivatives = Derivatives(static_dir, on_demand=False)
+    assert derivatives.lookup("images/GER/GER001.jpg")[1] is None
+    assert derivatives._thread is None
+    assert derivatives.build() == (1, 0)  # broken.jpg is reported and skipped
+    assert derivatives.lookup("images/GER/GER001.jpg")[1]
@@ -0,0 +1,137 @@
+import json
+import threading
+import time
+import uuid
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+
+from direct_uploads import (
+    DirectUploadError,
+    DirectUploads,
+    StandInServer,
+    api_sign,
+    decode_context,
+    encode_context,
+    notification_signature,
+)
+
+FOLDERS = {"gallery": "gallery/{adm_no}/", "letter": "letters/{adm_no}/"}
+
+
+@pytest.fixture
+def standin(tmp_path):
+    server = StandInServer(("127.0.0.1", 0), "key", "secret", str(tmp_path / "standin"))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def uploads(standin):
+    base = "http://127.0.0.1:%d" % standin.server_address[1]
+    return DirectUploads("key", "secret", "token-secret", FOLDERS,
+                         upload_url=base + "/{resource_type}/upload",
+                         delivery_url=base + "/{resource_type}/upload/v{version}/{public_id}")
+
+
+def post_file(url: str, fields: dict, filename: str, content: bytes):
+    boundary = uuid.uuid4().hex
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    ]
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n".encode() + content + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode())
+    request = Request(url, data=b"".join(parts), method="POST",
+                      headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    try:
+        with urlopen(request) as resp:
+            return resp.status, json.loads(resp.read())
+    except HTTPError as ex:
+        return ex.code, json.loads(ex.read())
+
+
+def test_context_round_trips_escaped_values():
+    values = {"adm_no": "GER001", "note": "a=b|c", "filename": ""}
+    assert decode_context(encode_context(values)) == values
+
+
+def test_signed_upload_is_accepted_and_verified(uploads):
+    signed = uploads.sign("GER001", "gallery", "image", filename="cat.jpg", note="a=b|c")
+    assert signed["fields"]["folder"] == "gallery/GER001"
+    status, result = post_file(signed["upload_url"], signed["fields"], "cat.jpg", b"\xff\xd8jpeg")
+    assert status == 200
+
+    upload = uploads.verify_completion(signed["token"], result)
+    assert (upload.adm_no, upload.kind, upload.filename, upload.note) == ("GER001", "gallery", "cat.jpg", "a=b|c")
+    assert upload.public_id == result["public_id"] and upload.public_id.startswith("gallery/GER001/")
+    with urlopen(upload.url) as resp:
+        assert resp.read() == b"\xff\xd8jpeg"
+
+
+def test_storage_refuses_altered_fields(uploads):
+    signed = uploads.sign("GER001", "gallery", "image", filename="cat.jpg")
+    status, result = post_file(signed["upload_url"], dict(signed["fields"], folder="gallery/GER002"), "cat.jpg", b"x")
+    assert status == 401 and result["error"]["message"] == "Invalid Signature"
+
+
+def test_completion_rejects_forged_or_foreign_results(uploads):
+    token = uploads.sign("GER001", "gallery", "image")["token"]
+
+    def result(public_id, version=1, secret="secret"):
+        return {"public_id": public_id, "version": version,
+                "signature": api_sign({"public_id": public_id, "version": version}, secret)}
+
+    with pytest.raises(DirectUploadError, match="signature"):
+        uploads.verify_completion(token, result("gallery/GER001/x", secret="guess"))
+    with pytest.raises(DirectUploadError, match="outside"):
+        uploads.verify_completion(token, result("gallery/GER002/x"))
+    with pytest.raises(DirectUploadError, match="token"):
+        uploads.verify_completion(token + "x", result("gallery/GER001/x"))
+    uploads.ttl = -1
+    with pytest.raises(DirectUploadError, match="expired"):
+        uploads.verify_completion(token, result("gallery/GER001/x"))
+
+
+def test_notification_signature_and_age_are_checked(uploads):
+    payload = {
+        "notification_type": "upload", "public_id": "letters/GER001/abc", "version": 7, "resource_type": "raw",
+        "context": {"custom": {"adm_no": "GER001", "kind": "letter", "filename": "l.pdf", "note": ""}},
+    }
+    body = json.dumps(payload).encode()
+    now = int(time.time())
+    signature = notification_signature(body, now, "secret")
+
+    upload = uploads.verify_notification(body, str(now), signature)
+    assert (upload.kind, upload.public_id, upload.resource_type) == ("letter", "letters/GER001/abc", "raw")
+    assert upload.url.endswith("/raw/upload/v7/letters/GER001/abc")
+
+    with pytest.raises(DirectUploadError, match="signature"):
+        uploads.verify_notification(body.replace(b"GER001", b"GER002"), str(now), signature)
+    with pytest.raises(DirectUploadError, match="too old"):
+        uploads.verify_notification(body, str(now), signature, now=now + 3 * 3600)
+
+    other = json.dumps(dict(payload, context={})).encode()
+    assert uploads.verify_notification(other, str(now), notification_signature(other, now, "secret")) is None
+
+
+@pytest.mark.parametrize("body", [b"not json", b"[1, 2]", b'{"notification_type": "upload", "context": "x"}'])
+def test_signed_notification_that_isnt_an_object_is_rejected(uploads, body):
+    now = int(time.time())
+    with pytest.raises(DirectUploadError, match="body"):
+        uploads.verify_notification(body, str(now), notification_signature(body, now, "secret"))
+
+
+def test_notify_route_answers_4xx_for_a_malformed_body(app_module, client, uploads, monkeypatch):
+    monkeypatch.setattr(app_module, "direct_uploads", uploads)
+    now = int(time.time())
+    resp = client.post("/direct_uploads/notify", data=b"not json", headers={
+        "X-Cld-Timestamp": str(now), "X-Cld-Signature": notification_signature(b"not json", now, "secret"),
+    })
+    assert resp.status_code == 401 and resp.get_json()["error"] == "Invalid notification body"
@@ -0,0 +1,22 @@
+import json
+
+from export import build_pack
+
+STUDENT = {"Admission Number": "GER001", "Full Name": "Test Student", "Small Biography": "From the roster."}
+
+
+def pack_files(bio):
+    _, files = build_pack({"student": STUDENT, "bio": bio, "generated": "2026-01-01 00:00"})
+    return {name: data for name, data, _ in files}
+
+
+def test_report_falls_back_to_roster_biography():
+    files = pack_files(None)
+    assert "From the roster." in files["report.html"].decode("utf-8")
+    assert json.loads(files["profile.json"])["biography"] == "From the roster."
+
+
+def test_report_prefers_edited_biography():
+    files = pack_files("Edited text.")
+    assert "Edited text." in files["report.html"].decode("utf-8")
+    assert json.loads(files["profile.json"])["biography"] == "Edited text."
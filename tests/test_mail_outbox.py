@@ -0,0 +1,81 @@
+import time
+
+from mail_outbox import MailOutbox, SmtpSender
+
+LATER = 10 ** 6  # a drain "now" past every backoff
+
+
+def make_outbox(database, smtp_server, **options):
+    host, port = smtp_server.server_address
+    sender = SmtpSender(host, port, use_ssl=False, timeout=5)
+    options.setdefault("backoff", 30.0)
+    return MailOutbox(database, sender, **options)
+
+
+def queue(outbox, *bodies):
+    for body in bodies:
+        # Straight to the table: enqueue() would also start the worker thread
+        outbox.database.execute(
+            "INSERT INTO mail_outbox (mail_from, mail_to, subject, body) VALUES (?, ?, ?, ?)",
+            ("portal@example.org", "office@example.org", "Contact", body),
+        )
+
+
+def test_batch_goes_out_over_one_connection(database, smtp_server):
+    outbox = make_outbox(database, smtp_server)
+    queue(outbox, "one", "two", "three")
+    assert outbox.drain() == {"sent": 3, "retrying": 0, "failed": 0}
+    queue(outbox, "four")
+    assert outbox.drain()["sent"] == 1
+    outbox.sender.close()
+    assert len(smtp_server.messages) == 4
+    assert smtp_server.connections == 1
+    assert outbox.pending()["sent"] == 4
+
+
+def test_transient_failure_is_retried_after_backoff(database, smtp_server):
+    outbox = make_outbox(database, smtp_server)
+    smtp_server.fail_next = 1
+    queue(outbox, "transient", "fine")
+    assert outbox.drain() == {"sent": 1, "retrying": 1, "failed": 0}
+    # Backed off: not due again yet
+    assert outbox.drain()["sent"] == 0
+    row = database.query_one("SELECT attempts, next_attempt_at FROM mail_outbox WHERE body='transient'")
+    assert row[0] == 1 and row[1] >= time.time() + 25
+    assert outbox.drain(now=time.time() + LATER)["sent"] == 1
+    outbox.sender.close()
+    assert len(smtp_server.messages) == 2
+
+
+def test_permanent_refusal_and_max_attempts_mark_failed(database, smtp_server):
+    outbox = make_outbox(database, smtp_server, max_attempts=2)
+    smtp_server.reject_next = 1
+    queue(outbox, "rejected")
+    assert outbox.drain()["failed"] == 1
+
+    smtp_server.fail_next = 2
+    queue(outbox, "flaky")
+    assert outbox.drain()["retrying"] == 1
+    assert outbox.drain(now=time.time() + LATER)["failed"] == 1
+    outbox.sender.close()
+    assert outbox.pending() == {"queued": 0, "max_attempts": 0, "failed": 2, "sent": 0}
+
+
+def test_dropped_connection_retries_rest_of_batch(database, smtp_server):
+    outbox = make_outbox(database, smtp_server)
+    smtp_server.drop_next = 1
+    queue(outbox, "a", "b", "c")
+    assert outbox.drain() == {"sent": 0, "retrying": 3, "failed": 0}
+    assert outbox.drain(now=time.time() + LATER)["sent"] == 3
+    outbox.sender.close()
+    assert smtp_server.connections == 2
+
+
+def test_contact_refuses_without_smtp_password(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "EMAIL_FROM", "portal@example.org")
+    monkeypatch.setattr(app_module, "EMAIL_TO", "office@example.org")
+    monkeypatch.setattr(app_module, "EMAIL_PASS", "")
+    before = app_module.outbox.pending()["queued"]
+    resp = client.post("/contact", data={"email": "v@example.org", "message": "hello"})
+    assert b"Email not configured" in resp.data
+    assert app_module.outbox.pending()["queued"] == before
@@ -0,0 +1,46 @@
+import sys
+
+import pytest
+from flask import Flask
+
+import metrics
+
+
+def make_app(**options):
+    app = Flask(__name__)
+    metrics.init_app(app, **options)
+
+    @app.route("/ok")
+    def ok():
+        return "ok"
+
+    @app.route("/boom")
+    def boom():
+        raise RuntimeError("boom")
+
+    return app
+
+
+def test_metrics_endpoint_is_off_without_token():
+    assert make_app().test_client().get("/metrics").status_code == 404
+
+
+def test_metrics_endpoint_requires_bearer_token():
+    client = make_app(token="s3cret").test_client()
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 403
+    resp = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert resp.status_code == 200
+    assert b"http_request_duration_seconds" in resp.data
+
+
+def test_profiler_is_stopped_when_view_raises():
+    app = make_app(slow_ms=1, profile_rate=1.0)
+    app.testing = True  # the exception propagates, so after_request never runs
+    client = app.test_client()
+    with pytest.raises(RuntimeError):
+        client.get("/boom")
+    # A profiler left running on this thread would make the next one fail to start
+    assert sys.getprofile() is None
+    assert client.get("/ok").status_code == 200
+    assert sys.getprofile() is None
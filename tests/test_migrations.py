@@ -0,0 +1,93 @@
+import pytest
+
+import migrate_bio
+import roster_io
+from database import Database
+from migrations import MIGRATIONS, applied_versions
+
+
+@pytest.fixture
+def cli_db(tmp_path, monkeypatch):
+    db_path = tmp_path / "cli.db"
+    monkeypatch.setenv("DB_PATH", str(db_path))
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    return db_path
+
+
+def versions(db_path):
+    database = Database(f"sqlite:///{db_path}")
+    try:
+        with database.connection():
+            return applied_versions(database)
+    finally:
+        database.dispose()
+
+
+def test_clis_create_the_versioned_schema(cli_db, tmp_path, monkeypatch):
+    every_version = {version for version, _, _ in MIGRATIONS}
+    assert roster_io.main(["export", str(tmp_path / "roster.csv")]) == 0
+    assert versions(cli_db) == every_version
+
+    other = tmp_path / "bio.db"
+    monkeypatch.setattr(migrate_bio, "DB_PATH", str(other))
+    migrate_bio.init_db()
+    assert versions(other) == every_version
+
+
+def test_migrations_apply_in_order_once(tmp_path, monkeypatch):
+    import migrations
+
+    ran = []
+
+    def step(name, fail=False):
+        def apply(database, c):
+            c.execute(f"CREATE TABLE {name} (x INTEGER)")
+            if fail:
+                raise RuntimeError("boom")
+            ran.append(name)
+        return apply
+
+    database = Database(f"sqlite:///{tmp_path / 'order.db'}")
+    monkeypatch.setattr(migrations, "MIGRATIONS", ((1, "one", step("one")), (2, "two", step("two", fail=True))))
+    with pytest.raises(RuntimeError):
+        migrations.migrate(database)
+    # The failed step rolled back with its schema_migrations row; the one before it stuck
+    assert applied_versions(database) == {1}
+    assert database.query_one("SELECT name FROM sqlite_master WHERE name='two'") is None
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", ((1, "one", step("one")), (2, "two", step("two")),
+                                                   (3, "three", step("three"))))
+    assert migrations.migrate(database) == ["2_two", "3_three"]
+    assert migrations.migrate(database) == []
+    assert ran == ["one", "two", "three"]
+    database.dispose()
+
+
+def test_startup_work_runs_once_under_the_lock(tmp_path):
+    import threading
+    import time
+
+    from migrations import run_startup
+
+    database = Database(f"sqlite:///{tmp_path / 'startup.db'}")
+    lock_path = str(tmp_path / "startup.lock")
+    inside, overlaps, results = [], [], []
+
+    def task():
+        inside.append(1)
+        if len(inside) > 1:
+            overlaps.append(1)
+        time.sleep(0.05)
+        inside.pop()
+
+    def boot():
+        results.append(run_startup(database, lock_path, tasks=(task,)))
+
+    workers = [threading.Thread(target=boot) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert overlaps == []
+    assert sorted(map(len, results)) == [0, 0, 0, len(MIGRATIONS)]  # one worker migrated, the rest found nothing
+    database.dispose()
@@ -0,0 +1,61 @@
+from response_cache import CachedPage, MemoryPageStore, invalidate_pages
+
+PAGE = CachedPage(b"<html>old</html>", "text/html", "etag")
+
+
+def test_memory_store_sees_invalidation_from_another_worker(database):
+    worker_a = MemoryPageStore(database=database)
+    worker_b = MemoryPageStore(database=database)
+    for store in (worker_a, worker_b):
+        store.set("GER001|/profile/GER001?", "GER001", PAGE, store.now())
+        assert store.get("GER001|/profile/GER001?") == PAGE
+
+    worker_a.invalidate("GER001")
+    assert worker_b.get("GER001|/profile/GER001?") is None
+
+
+def test_memory_store_sees_clear_and_cli_invalidation(database):
+    store = MemoryPageStore(database=database)
+    store.set("a|/profile/a?", "a", PAGE, store.now())
+    store.set("b|/profile/b?", "b", PAGE, store.now())
+
+    invalidate_pages(database, ["a"])
+    assert store.get("a|/profile/a?") is None
+    assert store.get("b|/profile/b?") == PAGE
+
+    MemoryPageStore(database=database).clear()
+    assert store.get("b|/profile/b?") is None
+
+
+def test_render_started_before_invalidation_is_not_served(database):
+    store = MemoryPageStore(database=database)
+    started = store.now()
+    MemoryPageStore(database=database).invalidate("GER001")  # lands while the page renders
+    store.set("GER001|/profile/GER001?", "GER001", PAGE, started)
+    assert store.get("GER001|/profile/GER001?") is None
+
+
+def test_forget_drops_local_pages_without_stamping(database):
+    store = MemoryPageStore(database=database)
+    started = store.now()
+    store.set("a|/profile/a?", "a", PAGE, started)
+    store.forget(["a"])
+    assert store.get("a|/profile/a?") is None
+    store.set("a|/profile/a?", "a", PAGE, started)  # a render from before the catch-up
+    assert store.get("a|/profile/a?") is None
+    assert database.query("SELECT scope FROM response_cache_scopes") == []
+
+
+def test_bio_catch_up_is_local_and_bulk_write_stamps_once(app_module, client):
+    adm_nos = sorted(app_module.students_data)[:5]
+    scopes = "SELECT scope, invalidated_at FROM response_cache_scopes WHERE scope IN (%s)" % ",".join("?" * 5)
+    before = app_module.database.query(scopes, adm_nos)
+    app_module.install_bios({adm_no: "Caught up." for adm_no in adm_nos})
+    assert app_module.database.query(scopes, adm_nos) == before
+
+    resp = client.post("/api/biographies", headers={"X-Admin-Token": "test-admin-token"},
+                       json={"biographies": {adm_no: f"Bulk bio {adm_no}." for adm_no in adm_nos}})
+    assert resp.get_json()["updated"] == 5
+    stamps = app_module.database.query(scopes, adm_nos)
+    assert sorted(scope for scope, _ in stamps) == adm_nos
+    assert len({at for _, at in stamps}) == 1  # one transaction, one timestamp
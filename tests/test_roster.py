@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from roster import CsvRosterSource, RosterStore
+
+HEADER = "Admission Number,Full Name,Department,Class\n"
+
+
+def write(path, rows, mtime=None):
+    path.write_text(HEADER + "".join(f"{','.join(row)}\n" for row in rows), encoding="utf-8")
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def roster_csv(tmp_path):
+    path = tmp_path / "students.csv"
+    write(path, [("ger001", "Anna", "Germans", "4"), ("ITA001", "Luca", "Italians", "5")], mtime=1_000_000)
+    return path
+
+
+def test_reload_swaps_in_a_new_snapshot_and_tells_listeners(roster_csv):
+    store = RosterStore(CsvRosterSource(str(roster_csv)))
+    heard = []
+    store.subscribe(lambda snapshot, diff: heard.append((snapshot, diff)))
+
+    first = store.reload()
+    assert first["initial"] and first["added"] == ["GER001", "ITA001"]
+    before = store.snapshot
+    assert heard == [(before, first)]
+    assert before.index.lookup("department", "germans") == ["GER001"]
+
+    write(roster_csv, [("GER001", "Anna", "Italians", "4"), ("EDU001", "Zawadi", "Germans", "1")], mtime=1_000_010)
+    diff = store.reload()
+    assert (diff["added"], diff["removed"], diff["changed"], diff["initial"]) == (["EDU001"], ["ITA001"], ["GER001"], False)
+    assert heard[-1] == (store.snapshot, diff)
+    # Readers still holding the old snapshot see it whole; nothing was mutated in place
+    assert set(before.students) == {"GER001", "ITA001"}
+    assert before.students["GER001"]["Department"] == "Germans"
+    assert store.snapshot.index.counts("department") == {"Italians": 1, "Germans": 1}
+
+
+def test_unchanged_or_missing_source_keeps_the_snapshot(roster_csv):
+    store = RosterStore(CsvRosterSource(str(roster_csv)))
+    store.reload()
+    snapshot = store.snapshot
+    calls = []
+    store.subscribe(lambda *args: calls.append(args))
+
+    assert store.reload() is None  # same stat
+    os.utime(roster_csv, (1_000_050, 1_000_050))
+    assert store.reload() is None  # touched, same bytes
+    os.remove(roster_csv)
+    assert store.reload() is None  # gone mid-deploy: keep serving the last good roster
+    assert store.snapshot is snapshot and calls == []
+    assert store.reload(force=True) is None
@@ -0,0 +1,84 @@
+import csv
+import io
+
+from roster import DbRosterSource
+from roster_io import CSV_HEADERS, export_roster, import_roster
+
+
+def sheet(*rows, header=CSV_HEADERS):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow([row.get(h, "") for h in header])
+    return io.StringIO(out.getvalue())
+
+
+def student(adm_no, name, **extra):
+    return {"Admission Number": adm_no, "Full Name": name, "Department": "Germans", "Sex": "F", "Age": "7", **extra}
+
+
+def version(database):
+    row = database.query_one("SELECT version FROM roster_meta WHERE id=1")
+    return row[0] if row else None
+
+
+def test_import_writes_only_new_or_changed_rows(database):
+    report = import_roster(database, sheet(student("ger001", "Anna"), student("GER002", "Beth")))
+    assert (report["inserted"], report["updated"], report["unchanged"]) == (2, 0, 0)
+    first = version(database)
+
+    report = import_roster(database, sheet(student("GER001", "Anna"), student("GER002", "Beth")))
+    assert (report["inserted"], report["updated"], report["unchanged"]) == (0, 0, 2)
+    assert version(database) == first  # a no-op import doesn't make workers reload
+
+    report = import_roster(database, sheet(student("GER001", "Anna Maria"), student("GER002", "Beth"),
+                                           student("GER003", "Cleo")))
+    assert (report["inserted"], report["updated"], report["unchanged"]) == (1, 1, 1)
+    assert version(database) != first
+    students = DbRosterSource(database).load().students
+    assert students["GER001"]["Full Name"] == "Anna Maria" and set(students) == {"GER001", "GER002", "GER003"}
+
+
+def test_import_validates_rows_and_reports_problems(database):
+    source = sheet(
+        student("GER001", "Anna"),
+        student("GER001", "Anna again"),
+        student("", "Nobody"),
+        student("GER002", ""),
+        student("GER003", "Cleo", Sex="x", Age="seven", Department="Martians"),
+        header=CSV_HEADERS + ("Shoe Size",),
+    )
+    report = import_roster(database, source)
+    assert report["rows"] == 5 and report["inserted"] == 2
+    assert [(s["line"], s["errors"][0]) for s in report["skipped"]] == [
+        (3, "duplicate Admission Number GER001 (first seen on line 2)"),
+        (4, "missing Admission Number"),
+        (5, "missing Full Name"),
+    ]
+    assert report["warnings"][0] == {"line": 1, "messages": ["ignored column(s): Shoe Size"]}
+    assert report["warnings"][1]["messages"] == [
+        "unexpected Sex 'x'", "non-numeric Age 'seven'", "unknown Department 'Martians'",
+    ]
+
+
+def test_dry_run_and_prune(database):
+    import_roster(database, sheet(student("GER001", "Anna"), student("GER002", "Beth")))
+    before = version(database)
+
+    report = import_roster(database, sheet(student("GER001", "Anna")), prune=True, dry_run=True)
+    assert (report["removed"], report["dry_run"]) == (1, True)
+    assert version(database) == before and len(database.query("SELECT 1 FROM roster")) == 2
+
+    assert import_roster(database, sheet(student("GER001", "Anna")), prune=True)["removed"] == 1
+    assert [row[0] for row in database.query("SELECT adm_no FROM roster")] == ["GER001"]
+    assert version(database) != before
+
+
+def test_export_round_trips(database):
+    import_roster(database, sheet(student("GER001", "Anna", **{"Place of Residence": "Kakamega, Kenya"})))
+    out = io.StringIO()
+    assert export_roster(database, out) == 1
+    out.seek(0)
+    report = import_roster(database, out)
+    assert (report["unchanged"], report["skipped"]) == (1, [])
@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip("pandas")
+
+import scores  # noqa: E402
+from database import Database  # noqa: E402
+from response_cache import CachedPage, MemoryPageStore  # noqa: E402
+from static_snapshot import StaticSnapshot  # noqa: E402
+
+PAGE = CachedPage(b"<html>old scores</html>", "text/html", "etag")
+
+
+def test_cli_import_invalidates_cached_pages_and_snapshot(tmp_path, monkeypatch):
+    db_path = tmp_path / "scores.db"
+    monkeypatch.setenv("DB_PATH", str(db_path))
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setenv("STATIC_SNAPSHOT_DIR", str(tmp_path / "site"))
+    sheet = tmp_path / "term1.csv"
+    sheet.write_text("Admission Number,Term,Subject,Score\nGER001,2026 Term 1,Maths,71\n")
+
+    # A worker's cached results page and a pre-rendered profile, both from before the import
+    scores.main(["import", str(sheet), "--dry-run"])  # creates the tables, writes nothing
+    database = Database(f"sqlite:///{db_path}")
+    worker = MemoryPageStore(database=database)
+    worker.set("GER001|/results/GER001?", "GER001", PAGE, worker.now())
+    snapshot = StaticSnapshot(str(tmp_path / "site"))
+    snapshot.build({"/profile/GER001": "v1"}, lambda url_path: b"<html>old</html>")
+    assert worker.get("GER001|/results/GER001?") == PAGE
+    assert snapshot.path_for("/profile/GER001")
+
+    assert scores.main(["import", str(sheet)]) == 0
+    assert worker.get("GER001|/results/GER001?") is None
+    assert snapshot.path_for("/profile/GER001") is None
+    database.dispose()
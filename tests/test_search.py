@@ -0,0 +1,28 @@
+from search import SearchIndex
+
+STUDENTS = {
+    "GER001": {"Full Name": "Gladwell Andati", "Place of Residence": "Kakamega", "career": "Artist", "Sex": "F"},
+    "GER002": {"Full Name": "Brian Masinde", "Place of Residence": "Bungoma", "career": "Pilot", "Sex": "M"},
+}
+
+
+def adm_nos(index, query, **options):
+    return [result["adm_no"] for result in index.search(query, **options)]
+
+
+def test_typos_match_by_trigram_similarity():
+    index = SearchIndex()
+    index.rebuild(STUDENTS)
+    assert adm_nos(index, "Kakamenga", prefix=False) == ["GER001"]
+    assert adm_nos(index, "the Masinde boy", prefix=False) == ["GER002"]
+    assert adm_nos(index, "pilott", prefix=False) == ["GER002"]  # the career column
+
+
+def test_fuzzy_matching_follows_updates_and_removals():
+    index = SearchIndex()
+    index.rebuild(STUDENTS)
+    index.update("GER002", dict(STUDENTS["GER002"], **{"Place of Residence": "Eldoret"}))
+    assert adm_nos(index, "Bungomma", prefix=False) == []
+    assert adm_nos(index, "Eldorett", prefix=False) == ["GER002"]
+    index.remove("GER001")
+    assert adm_nos(index, "Kakamenga", prefix=False) == []
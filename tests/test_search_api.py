@@ -0,0 +1,15 @@
+def search(client, **params):
+    resp = client.get("/api/search", query_string=params)
+    assert resp.status_code == 200
+    return resp.get_json()["results"]
+
+
+def test_department_filter_takes_the_slug(app_module, client):
+    student = next(s for s in app_module.students_data.values() if s.get("Department") == "Education for Generations")
+    surname = student["Full Name"].split()[-1]
+
+    by_slug = search(client, q=surname, department="education")
+    assert by_slug and {r["department"] for r in by_slug} == {"Education for Generations"}
+    assert search(client, q=surname, department="Education for Generations") == by_slug
+    assert student["Admission Number"] in {r["adm_no"] for r in by_slug}
+    assert all(r["department"] != "Education for Generations" for r in search(client, q=surname, department="germans"))
@@ -0,0 +1,118 @@
+import os
+import time
+
+import pytest
+
+from static_snapshot import BUILD_ENVIRON_KEY, StaticSnapshot, page_file
+
+PAGES = {"/": "home-v1", "/profile/GER001": "ger001-v1", "/profile/GER002": "ger002-v1"}
+
+
+class Renderer:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, url_path):
+        self.calls.append(url_path)
+        return f"<html>{url_path} #{len(self.calls)}</html>".encode()
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    return StaticSnapshot(str(tmp_path / "site"))
+
+
+def read(snapshot, url_path):
+    with open(snapshot.path_for(url_path), "rb") as f:
+        return f.read()
+
+
+def test_page_file_keeps_to_the_output_directory():
+    assert page_file("/") == "index.html"
+    assert page_file("/profile/GER001") == os.path.join("profile", "GER001.html")
+    assert page_file("/students_chart.svg") == "students_chart.svg"
+    for url_path in ("/profile/../manifest", "/.retired/profile/GER001", "/profile/a\\b"):
+        assert page_file(url_path) is None
+
+
+def test_build_only_renders_pages_whose_digest_moved(snapshot):
+    render = Renderer()
+    assert snapshot.build(PAGES, render)["rendered"] == 3
+
+    render.calls.clear()
+    report = snapshot.build(PAGES, render)
+    assert (report["rendered"], report["unchanged"], render.calls) == (0, 3, [])
+
+    changed = dict(PAGES, **{"/profile/GER001": "ger001-v2"})
+    del changed["/profile/GER002"]
+    report = snapshot.build(changed, render)
+    assert render.calls == ["/profile/GER001"]
+    assert (report["rendered"], report["unchanged"], report["removed"]) == (1, 1, ["/profile/GER002"])
+    assert snapshot.path_for("/profile/GER002") is None
+    assert set(snapshot.load_manifest()["pages"]) == set(changed)
+
+
+def test_invalidated_pages_are_restored_or_rerendered(snapshot):
+    render = Renderer()
+    snapshot.build(PAGES, render)
+    before = read(snapshot, "/profile/GER001")
+    snapshot.clear()
+    assert all(snapshot.path_for(url_path) is None for url_path in PAGES)  # served live meanwhile
+
+    render.calls.clear()
+    report = snapshot.build(dict(PAGES, **{"/": "home-v2"}), render, since=time.time() + 1)
+    assert render.calls == ["/"]
+    assert (report["rendered"], report["restored"]) == (1, 2)
+    assert read(snapshot, "/profile/GER001") == before
+    assert not os.listdir(os.path.join(snapshot.retired_dir, "profile"))
+
+
+def test_pages_retired_after_the_digests_were_taken_are_rerendered(snapshot):
+    render = Renderer()
+    snapshot.build(PAGES, render)
+    since = time.time() - 1  # digests computed, then a write lands before the build runs
+    snapshot.invalidate(["/profile/GER001"])
+    render.calls.clear()
+    assert snapshot.build(PAGES, render, since=since)["rendered"] == 1
+    assert render.calls == ["/profile/GER001"]
+
+
+def test_roster_change_reaches_students_and_their_departments(app_module):
+    old = {"A1": {"Department": "Germans"}, "A2": {"Department": "Italians"}, "A3": {"Department": "Germans"}}
+    new = {"A1": {"Department": " assisted group "}, "A3": {"Department": "Germans"}, "A4": {"Department": ""}}
+    diff = {"added": ["A4"], "removed": ["A2"], "changed": ["A1"]}
+    scopes = app_module.roster_change_scopes(old, new, diff)
+    assert scopes[:3] == ["A4", "A2", "A1"]
+    assert sorted(scopes[3:]) == ["department:assisted", "department:germans", "department:italians"]
+
+
+@pytest.fixture
+def served(app_module, tmp_path, monkeypatch):
+    snapshot = StaticSnapshot(str(tmp_path / "served"))
+    snapshot.build({"/about": "v1", "/department/germans": "v1", "/profile/GER001": "v1"},
+                   lambda url_path: f"<html>pre-rendered {url_path}</html>".encode())
+    monkeypatch.setattr(app_module, "static_snapshot", snapshot)
+    return snapshot
+
+
+def test_snapshot_is_served_only_for_plain_reads(app_module, client, served):
+    def pre_rendered(resp):
+        return b"pre-rendered" in resp.get_data()
+
+    assert pre_rendered(client.get("/about"))
+    assert not pre_rendered(client.get("/about?preview=1"))
+    assert not pre_rendered(client.get("/about", environ_overrides={BUILD_ENVIRON_KEY: True}))
+    assert not pre_rendered(client.post("/department/germans", data={"adm_no": "nobody"}))
+    with client.session_transaction() as session:
+        session["_flashes"] = [("error", "Student not found")]
+    assert not pre_rendered(client.get("/about"))
+
+
+def test_page_cache_invalidation_retires_snapshot_pages(app_module, served):
+    app_module.drop_snapshot_pages("GER001")
+    app_module.drop_snapshot_pages("department:germans")
+    assert served.path_for("/profile/GER001") is None
+    assert served.path_for("/department/germans") is None
+    assert served.path_for("/about")
+    app_module.drop_snapshot_pages(None)
+    assert served.path_for("/about") is None
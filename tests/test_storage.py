@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from storage import LocalStorage, StorageError
+
+
+@pytest.fixture
+def local(tmp_path):
+    return LocalStorage(str(tmp_path / "store"))
+
+
+def source(tmp_path, data=b"photo bytes"):
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(data)
+    return str(path)
+
+
+def blobs(storage):
+    return [os.path.join(d, name) for d, _, names in os.walk(storage.objects_dir) for name in names]
+
+
+def test_blob_goes_with_its_last_link(local, tmp_path):
+    first = local.upload(source(tmp_path), folder="gallery/GER001/")
+    second = local.upload(source(tmp_path), folder="gallery/GER002/")
+    assert len(blobs(local)) == 1
+    local.destroy(first["public_id"])
+    assert len(blobs(local)) == 1 and local.blob_path(second["public_id"])
+    local.destroy(second["public_id"])
+    assert blobs(local) == []
+
+
+def test_upload_refuses_filesystem_without_hard_links(local, tmp_path, monkeypatch):
+    def no_links(src, dst):
+        raise PermissionError("Operation not permitted")
+
+    monkeypatch.setattr(os, "link", no_links)
+    with pytest.raises(StorageError, match="hard links"):
+        local.upload(source(tmp_path), folder="gallery/GER001/")
+    assert blobs(local) == []
@@ -0,0 +1,76 @@
+import io
+import os
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from storage import MemoryStorage
+from upload_jobs import UploadJobs
+
+
+@pytest.fixture
+def storage():
+    return MemoryStorage()
+
+
+@pytest.fixture
+def recorded():
+    return []
+
+
+@pytest.fixture
+def jobs(database, storage, recorded, tmp_path):
+    def record(adm_no, kind, url, public_id, **details):
+        recorded.append((adm_no, kind, public_id, details))
+
+    jobs = UploadJobs(database, storage, record, str(tmp_path / "spool"), max_workers=2, retries=2, backoff=0)
+    yield jobs
+    jobs.shutdown()
+
+
+def files(*items):
+    return [(FileStorage(io.BytesIO(data), name), "image") for name, data in items]
+
+
+def uploads(storage):
+    return [call for call in storage.calls if call[0] == "upload"]
+
+
+def test_transient_storage_errors_are_retried(jobs, storage, recorded, wait_for_job, tmp_path):
+    storage.fail_next = 2  # the first two attempts fail, the third (last retry) succeeds
+    job_id = jobs.submit("GER001", "gallery", files(("a.jpg", b"photo-a")), folder="gallery/GER001/", note="hi")
+    status = wait_for_job(jobs, job_id)
+    assert (status["status"], status["completed"], status["failed"]) == ("done", 1, 0)
+    assert len(uploads(storage)) == 3
+    ((adm_no, kind, public_id, details),) = recorded
+    assert (adm_no, kind, details["note"], details["filename"]) == ("GER001", "gallery", "hi", "a.jpg")
+    assert public_id in storage.objects
+    assert not os.path.exists(tmp_path / "spool" / job_id)  # spooled files cleaned up
+
+
+def test_job_fails_once_retries_run_out(jobs, storage, recorded, wait_for_job):
+    storage.fail_next = 3
+    job_id = jobs.submit("GER001", "gallery", files(("a.jpg", b"photo-a")), folder="gallery/GER001/")
+    status = wait_for_job(jobs, job_id)
+    assert (status["status"], status["completed"], status["failed"]) == ("failed", 0, 1)
+    assert status["error"] == "a.jpg: injected failure"
+    assert len(uploads(storage)) == 3 and recorded == []
+
+
+def test_same_bytes_twice_in_one_job_upload_once(jobs, storage, wait_for_job):
+    job_id = jobs.submit("GER001", "gallery", files(("a.jpg", b"same"), ("copy.jpg", b"same")),
+                         folder="gallery/GER001/")
+    status = wait_for_job(jobs, job_id)
+    assert (status["total"], status["completed"], status["duplicates"]) == (2, 1, 1)
+    assert len(uploads(storage)) == 1
+
+
+def test_status_is_served_over_http(app_module, client, wait_for_job):
+    resp = client.post("/gallery/GER001", data={"gallery_file": (io.BytesIO(os.urandom(64)), "x.jpg")},
+                       content_type="multipart/form-data", headers={"Accept": "application/json"})
+    assert resp.status_code == 202
+    job_id = resp.get_json()["job_id"]
+    wait_for_job(app_module.upload_jobs, job_id)
+    body = client.get(resp.get_json()["status_url"]).get_json()
+    assert (body["id"], body["status"], body["completed"]) == (job_id, "done", 1)
+    assert client.get("/upload_jobs/nope").status_code == 404
@@ -0,0 +1,49 @@
+ADM_NO = "PAGE01"
+
+
+def insert(app_module, rows):
+    for i, (created_at, deleted) in enumerate(rows):
+        app_module.database.execute(
+            "INSERT INTO uploads (adm_no, kind, url, public_id, created_at, deleted_at) VALUES (?, 'gallery', ?, ?, ?, ?)",
+            (ADM_NO, f"/files/image/{i}", f"gallery/{ADM_NO}/page-{i}", created_at,
+             "2026-03-01 00:00:00" if deleted else None),
+        )
+
+
+def test_keyset_pages_walk_every_live_upload_once(app_module, client):
+    # Several rows share a timestamp: the id breaks the tie, so no page repeats or skips one
+    stamps = ["2026-01-01 10:00:00"] * 4 + ["2026-01-02 10:00:00"] * 3 + ["2026-01-03 10:00:00"]
+    insert(app_module, [(stamp, i == 5) for i, stamp in enumerate(stamps)])
+    expected = [
+        row[0] for row in app_module.database.query(
+            "SELECT id FROM uploads WHERE adm_no=? AND deleted_at IS NULL ORDER BY created_at DESC, id DESC", (ADM_NO,)
+        )
+    ]
+    assert len(expected) == 7
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        resp = client.get(f"/uploads/{ADM_NO.lower()}/gallery", query_string={"limit": 3, "cursor": cursor or ""})
+        body = resp.get_json()
+        seen.extend(item["id"] for item in body["items"])
+        pages += 1
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected and pages == 3
+
+
+def test_bad_cursor_or_kind_is_rejected(client):
+    assert client.get(f"/uploads/{ADM_NO}/gallery?cursor=%%%").status_code == 400
+    assert client.get(f"/uploads/{ADM_NO}/photos").status_code == 400
+
+
+def test_page_query_walks_the_partial_index(app_module):
+    plan = app_module.database.query(
+        "EXPLAIN QUERY PLAN SELECT id FROM uploads WHERE adm_no=? AND kind=? AND deleted_at IS NULL "
+        "AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT 25",
+        (ADM_NO, "gallery", "2026-01-02 10:00:00", 10),
+    )
+    details = " ".join(str(row[-1]) for row in plan)
+    assert "idx_uploads_live_student_kind_created" in details
+    assert "TEMP B-TREE" not in details  # no sort step
@@ -0,0 +1,67 @@
+import io
+import os
+
+from werkzeug.datastructures import FileStorage
+
+from storage import MemoryStorage
+from upload_jobs import UploadJobs
+
+ADM_NO = "GER001"
+
+
+def post_gallery(client, data: bytes, filename: str = "photo.jpg"):
+    resp = client.post(
+        f"/gallery/{ADM_NO}",
+        data={"gallery_file": (io.BytesIO(data), filename)},
+        content_type="multipart/form-data",
+        headers={"Accept": "application/json"},
+    )
+    assert resp.status_code == 202
+    return resp.get_json()["job_id"]
+
+
+def live_row(app_module, public_id):
+    return app_module.database.query_one(
+        "SELECT deleted_at FROM uploads WHERE public_id=? AND deleted_at IS NULL", (public_id,)
+    )
+
+
+def test_reupload_of_soft_deleted_file_revives_row(app_module, client, wait_for_job, no_deletion_worker):
+    data = os.urandom(4096)
+    assert wait_for_job(app_module.upload_jobs, post_gallery(client, data))["completed"] == 1
+    (upload,) = [u for u in app_module.get_uploads(ADM_NO, "gallery") if u["filename"] == "photo.jpg"]
+    public_id = upload["public_id"]
+
+    resp = client.post("/delete_file", json={"public_id": public_id, "type": "gallery"})
+    assert resp.get_json()["success"]
+    assert live_row(app_module, public_id) is None
+
+    # Same bytes again: the local backend hands back the same public_id
+    status = wait_for_job(app_module.upload_jobs, post_gallery(client, data))
+    assert (status["completed"], status["duplicates"], status["failed"]) == (1, 0, 0)
+    assert live_row(app_module, public_id) is not None
+    assert app_module.database.query_one(
+        "SELECT 1 FROM storage_deletions WHERE public_id=?", (public_id,)
+    ) is None
+
+    # The queued destroy is gone, so draining leaves both row and file alone
+    no_deletion_worker.drain()
+    assert live_row(app_module, public_id) is not None
+    assert app_module.storage.blob_path(public_id, "image")
+
+
+def test_add_upload_reports_live_conflict(app_module):
+    args = (ADM_NO, "gallery", "/files/image/x", "gallery/GER001/conflict-test.jpg")
+    assert app_module.add_upload(*args) is True
+    assert app_module.add_upload(*args) is False
+
+
+def test_job_counts_unstored_record_as_duplicate(database, tmp_path, wait_for_job):
+    jobs = UploadJobs(database, MemoryStorage(), lambda *a, **kw: False, str(tmp_path / "spool"), backoff=0)
+    try:
+        job_id = jobs.submit(ADM_NO, "gallery", [(FileStorage(io.BytesIO(b"abc"), "a.jpg"), "image")],
+                             folder="gallery/GER001/")
+        status = wait_for_job(jobs, job_id)
+    finally:
+        jobs.shutdown()
+    assert (status["completed"], status["duplicates"], status["status"]) == (0, 1, "done")
@@ -0,0 +1,188 @@
+# upload_jobs.py
+"""Background upload pipeline for gallery photos, result slips and letters.
+
+A POST only spools the files to local temp storage and records a job row;
+a bounded thread pool pushes each file to the storage backend (with retry
+and backoff) and records it via ``add_upload`` as it completes.  Files the
+student already has (same SHA-256, or a near-identical perceptual hash)
+are counted as duplicates and never uploaded; see dedup.py.  Job
+progress lives in the ``upload_jobs`` table, so any gunicorn worker can
+answer the status poll, not just the one running the job.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.utils import secure_filename
+
+from dedup import perceptual_hash, save_hashed
+
+
+class SpooledFile:
+    def __init__(self, path: str, filename: str, resource_type: str, content_hash: str = None):
+        self.path = path
+        self.filename = filename
+        self.resource_type = resource_type
+        self.content_hash = content_hash
+        self.phash = None
+
+
+class UploadJobs:
+    def __init__(self, database, storage, record, spool_dir: str,
+                 max_workers: int = 4, retries: int = 3, backoff: float = 0.5,
+                 find_duplicate=None, phash_kinds=()):
+        """``record(adm_no, kind, url, public_id, note=, filename=, resource_type=, content_hash=, phash=)``
+        stores a finished upload and returns False if nothing was stored; ``find_duplicate(adm_no, kind, content_hash=, phash=)`` returns the
+        public_id of a matching upload the student already has, or None.  Images of a kind in
+        ``phash_kinds`` are also matched by perceptual hash; other kinds only by exact bytes."""
+        self.database = database
+        self.storage = storage
+        self.record = record
+        self.find_duplicate = find_duplicate
+        self.phash_kinds = frozenset(phash_kinds)
+        self.spool_dir = spool_dir
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    def executor(self) -> ThreadPoolExecutor:
+        # Created on first use (and again after a fork) so a preloaded
+        # gunicorn parent never hands dead threads to its workers
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="upload")
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+    # ------------------------------------------------------------------
+    # Request side
+    # ------------------------------------------------------------------
+    def submit(self, adm_no: str, kind: str, files, folder: str, note: str = "") -> str:
+        """Spool ``files`` [(FileStorage, resource_type), ...] and queue them; returns the job id."""
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.spool_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        spooled = []
+        duplicates = 0
+        seen = set()
+        for i, (file, resource_type) in enumerate(files):
+            filename = secure_filename(file.filename or "") or f"upload-{i}"
+            path = os.path.join(job_dir, f"{i}-{filename}")
+            # Copied in chunks (never the whole file in memory), hashed on the way
+            content_hash = save_hashed(file, path)
+            if content_hash in seen or (
+                self.find_duplicate and self.find_duplicate(adm_no, kind, content_hash=content_hash)
+            ):
+                duplicates += 1
+                os.remove(path)
+                continue
+            seen.add(content_hash)
+            spooled.append(SpooledFile(path, filename, resource_type, content_hash))
+        if not spooled:
+            os.rmdir(job_dir)
+
+        self.database.execute(
+            "INSERT INTO upload_jobs (id, adm_no, kind, total, duplicates, status) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, adm_no, kind, len(spooled) + duplicates, duplicates, "queued" if spooled else "done"),
+        )
+        pool = self.executor()
+        for item in spooled:
+            pool.submit(self._run, job_id, adm_no, kind, folder, note, item)
+        return job_id
+
+    def status(self, job_id: str):
+        row = self.database.query_one(
+            "SELECT id, adm_no, kind, status, total, completed, failed, last_error, duplicates "
+            "FROM upload_jobs WHERE id=?",
+            (job_id,),
+        )
+        if not row:
+            return None
+        return {
+            "id": row[0],
+            "adm_no": row[1],
+            "kind": row[2],
+            "status": row[3],
+            "total": row[4],
+            "completed": row[5],
+            "failed": row[6],
+            "error": row[7] or "",
+            "duplicates": row[8] or 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Worker side
+    # ------------------------------------------------------------------
+    def _upload_with_retry(self, item: SpooledFile, folder: str) -> dict:
+        attempt = 0
+        while True:
+            try:
+                return self.storage.upload(item.path, folder=folder, resource_type=item.resource_type)
+            except Exception:
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+                time.sleep(self.backoff * (2 ** (attempt - 1)))
+
+    def _run(self, job_id, adm_no, kind, folder, note, item: SpooledFile):
+        with self.database.connection():
+            self.database.execute(
+                "UPDATE upload_jobs SET status='running', updated_at=CURRENT_TIMESTAMP WHERE id=? AND status='queued'",
+                (job_id,),
+            )
+            try:
+                if kind in self.phash_kinds and item.resource_type == "image":
+                    # Same picture re-encoded (e.g. forwarded on WhatsApp): different bytes, same dHash
+                    item.phash = perceptual_hash(item.path)
+                    if item.phash and self.find_duplicate and self.find_duplicate(adm_no, kind, phash=item.phash):
+                        self._finish_one(job_id, column="duplicates")
+                        return
+                upload = self._upload_with_retry(item, folder)
+                stored = self.record(adm_no, kind, upload["url"], upload["public_id"], note=note,
+                                     filename=item.filename, resource_type=item.resource_type,
+                                     content_hash=item.content_hash, phash=item.phash)
+                if stored is False:
+                    # A live row already has this public_id (the same file, sent by a concurrent job)
+                    self._finish_one(job_id, column="duplicates")
+                    return
+            except Exception as ex:
+                self._finish_one(job_id, column="failed", error=f"{item.filename}: {ex}")
+            else:
+                self._finish_one(job_id)
+            finally:
+                self._cleanup(job_id, item)
+
+    def _finish_one(self, job_id: str, column: str = "completed", error: str = None):
+        with self.database.transaction() as c:
+            c.execute(
+                f"UPDATE upload_jobs SET {column} = {column} + 1, last_error = COALESCE(?, last_error), "
+                "updated_at = CURRENT_TIMESTAMP WHERE id=?",
+                (error, job_id),
+            )
+            c.execute(
+                "UPDATE upload_jobs SET status = CASE WHEN failed > 0 THEN 'failed' ELSE 'done' END "
+                "WHERE id=? AND completed + failed + duplicates >= total",
+                (job_id,),
+            )
+
+    def _cleanup(self, job_id: str, item: SpooledFile):
+        try:
+            os.remove(item.path)
+        except OSError:
+            pass
+        job_dir = os.path.join(self.spool_dir, job_id)
+        try:
+            os.rmdir(job_dir)  # only succeeds once the job's last file is gone
+        except OSError:
+            pass